@@ -1,11 +1,313 @@
 """Contains components for processing AnnotationSet."""
 
+import bisect
+import dataclasses
+import operator
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+
 import docdeid as dd
 from docdeid import AnnotationSet
 from frozendict import frozendict
 
+_SORT_KEY_EXCLUDED_FIELDS = {"start_token", "end_token", "_key_cache"}
+"""Annotation fields that ``dd.Annotation.get_sort_key`` does not use for breaking
+ties."""
+
+_POSITION_SORT_KEY = operator.attrgetter(
+    "start_char", "end_char", "length", "priority", "tag", "text"
+)
+"""Equivalent to ``dd.Annotation.get_sort_key(by=("start_char",))``."""
+
+
+class AnnotationListProcessor(dd.process.AnnotationProcessor, ABC):
+    """
+    Annotation processor that processes a list of annotations, rather than an
+    ``AnnotationSet``. Consecutive list processors in a ``DeduceProcessorGroup`` are
+    run as a single stage, that passes a list from one processor to the next, so that
+    an ``AnnotationSet`` is only built at the end of the stage.
+    """
+
+    @abstractmethod
+    def process_annotation_list(
+        self, annotations: list[dd.Annotation], text: str
+    ) -> list[dd.Annotation]:
+        """
+        Process a list of annotations.
+
+        Args:
+            annotations: The input annotations, that is not empty.
+            text: The corresponding text.
+
+        Returns:
+            The processed annotations.
+        """
+
+    def process_annotations(
+        self, annotations: AnnotationSet, text: str
+    ) -> AnnotationSet:
+        return AnnotationSet(self.process_annotation_list(list(annotations), text))
+
+
+class DeduceProcessorGroup(dd.process.DocProcessorGroup):
+    """
+    A group of document processors, that executes the containing processors in order,
+    like ``docdeid.process.DocProcessorGroup``. Consecutive annotation list processors
+    (see ``AnnotationListProcessor``) are run as a single stage, e.g. removing and
+    cleaning tags, or resolving overlap and merging adjacent annotations.
+    """
+
+    @staticmethod
+    def _is_list_processor(processor: object) -> bool:
+        """Whether the processor can be run as part of a stage."""
+
+        return (
+            isinstance(processor, AnnotationListProcessor)
+            and type(processor).process_annotations  # not overridden
+            is AnnotationListProcessor.process_annotations
+        )
+
+    @staticmethod
+    def _run_stage(
+        annotations: list[dd.Annotation],
+        text: str,
+        stage: list[AnnotationListProcessor],
+    ) -> list[dd.Annotation]:
+        """Run annotation list processors on a list, as if running each in order."""
+
+        for processor in stage:
+            if len(annotations) == 0:
+                break
+
+            annotations = processor.process_annotation_list(annotations, text)
+
+        return annotations
+
+    def _process_stage(
+        self, doc: dd.Document, stage: list[AnnotationListProcessor]
+    ) -> None:
+        """Run annotation list processors on the annotations of a document."""
+
+        if len(stage) == 0 or len(doc.annotations) == 0:
+            return
+
+        doc.annotations = AnnotationSet(
+            self._run_stage(list(doc.annotations), doc.text, stage)
+        )
+
+    def _select(
+        self, enabled: Optional[set[str]], disabled: Optional[set[str]]
+    ) -> list:
+        """Get the processors to run, in order."""
+
+        if (enabled is not None) and (disabled is not None):
+            raise RuntimeError("Cannot use enabled and disabled simultaneously")
+
+        return [
+            processor
+            for name, processor in self._processors.items()
+            if (enabled is None or name in enabled)
+            and (disabled is None or name not in disabled)
+        ]
+
+    def _process_until_last_stage(
+        self,
+        doc: dd.Document,
+        processors: list,
+        enabled: Optional[set[str]],
+        disabled: Optional[set[str]],
+    ) -> list[AnnotationListProcessor]:
+        """
+        Run processors on a document, except for the annotation list processors at the
+        end, that are returned as the last stage.
+        """
+
+        stage = []
+
+        for processor in processors:
+            if self._is_list_processor(processor):
+                stage.append(processor)
+                continue
+
+            self._process_stage(doc, stage)
+            stage = []
+
+            if isinstance(processor, dd.process.DocProcessor):
+                processor.process(doc)
+            elif isinstance(processor, dd.process.DocProcessorGroup):
+                processor.process(doc, enabled=enabled, disabled=disabled)
+
+        return stage
+
+    def process(
+        self,
+        doc: dd.Document,
+        enabled: Optional[set[str]] = None,
+        disabled: Optional[set[str]] = None,
+    ) -> None:
+        processors = self._select(enabled, disabled)
+
+        self._process_stage(
+            doc, self._process_until_last_stage(doc, processors, enabled, disabled)
+        )
+
+    def process_to_list(
+        self,
+        doc: dd.Document,
+        enabled: Optional[set[str]] = None,
+        disabled: Optional[set[str]] = None,
+    ) -> list[dd.Annotation]:
+        """
+        Process a document like :meth:`DeduceProcessorGroup.process`, but return the
+        resulting annotations as a list. The result of the last stage (also of a
+        nested group at the end) is not set on the document, so that no
+        ``AnnotationSet`` is built for it.
+
+        Args:
+            doc: The document.
+            enabled: The processors to run, if not all.
+            disabled: The processors not to run, if any.
+
+        Returns:
+            The annotations.
+        """
+
+        processors = self._select(enabled, disabled)
+
+        if len(processors) > 0 and isinstance(processors[-1], DeduceProcessorGroup):
+            self._process_stage(
+                doc,
+                self._process_until_last_stage(doc, processors[:-1], enabled, disabled),
+            )
 
-class DeduceMergeAdjacentAnnotations(dd.process.MergeAdjacentAnnotations):
+            return processors[-1].process_to_list(
+                doc, enabled=enabled, disabled=disabled
+            )
+
+        stage = self._process_until_last_stage(doc, processors, enabled, disabled)
+
+        return self._run_stage(list(doc.annotations), doc.text, stage)
+
+
+class DeduceOverlapResolver(AnnotationListProcessor, dd.process.OverlapResolver):
+    """
+    Resolves overlap in the same way as ``docdeid.process.OverlapResolver``, with
+    identical results, but faster on documents with many (overlapping) annotations.
+    The sort key of each annotation is computed once, directly from its attributes,
+    and the characters covered so far are kept as a sorted list of disjoint intervals,
+    rather than as a mask that is checked character by character.
+
+    Args:
+        sort_by: A list of :class:`.Annotation` attributes to use for sorting.
+        sort_by_callbacks: A mapping from class attribute (by string) to a callable,
+            to influence sort order (e.g. reverse with ``lambda x: -x``).
+    """
+
+    def __init__(
+        self,
+        sort_by: tuple,
+        sort_by_callbacks: Optional[frozendict[str, Callable]] = None,
+    ) -> None:
+        super().__init__(sort_by=sort_by, sort_by_callbacks=sort_by_callbacks)
+
+        fields = {field.name for field in dataclasses.fields(dd.Annotation)}
+        attrs = tuple(sort_by) + tuple(
+            sorted(fields - set(sort_by) - _SORT_KEY_EXCLUDED_FIELDS)
+        )
+
+        self._get_attrs = (
+            operator.attrgetter(*attrs)
+            if set(attrs) <= fields
+            else lambda annotation: tuple(
+                getattr(annotation, attr, 0) for attr in attrs
+            )
+        )
+        self._callbacks = tuple(
+            (i, callback)
+            for i, callback in enumerate(
+                (sort_by_callbacks or {}).get(attr) for attr in sort_by
+            )
+            if callback is not None
+        )
+
+    def _sort_key(self, annotation: dd.Annotation) -> tuple:
+        """
+        Equivalent to ``annotation.get_sort_key``, with ``deterministic=True``. The
+        attributes are retrieved at once, and only the callbacks are applied one by
+        one.
+        """
+
+        key = self._get_attrs(annotation)
+
+        if len(self._callbacks) > 0:
+            key = list(key)
+
+            for i, callback in self._callbacks:
+                key[i] = callback(key[i])
+
+        return tuple(key)
+
+    def process_annotation_list(
+        self, annotations: list[dd.Annotation], text: str
+    ) -> list[dd.Annotation]:
+        processed_annotations = []
+
+        # Disjoint intervals of characters covered so far, sorted by start
+        starts: list[int] = []
+        ends: list[int] = []
+
+        for annotation in sorted(annotations, key=self._sort_key):
+            start_char, end_char = annotation.start_char, annotation.end_char
+
+            if start_char >= end_char:
+                processed_annotations.append(annotation)
+                continue
+
+            first = bisect.bisect_right(ends, start_char)
+            last = bisect.bisect_left(starts, end_char, lo=first)
+
+            if first == last:  # no overlap
+                processed_annotations.append(annotation)
+                starts.insert(first, start_char)
+                ends.insert(first, end_char)
+                continue
+
+            pos = start_char
+
+            for i in range(first, last):
+                if starts[i] > pos:
+                    processed_annotations.append(
+                        dd.Annotation(
+                            text=annotation.text[
+                                pos - start_char : starts[i] - start_char
+                            ],
+                            start_char=pos,
+                            end_char=starts[i],
+                            tag=annotation.tag,
+                        )
+                    )
+
+                pos = ends[i]
+
+            if pos < end_char:
+                processed_annotations.append(
+                    dd.Annotation(
+                        text=annotation.text[pos - start_char :],
+                        start_char=pos,
+                        end_char=end_char,
+                        tag=annotation.tag,
+                    )
+                )
+
+            starts[first:last] = [min(start_char, starts[first])]
+            ends[first:last] = [max(end_char, ends[last - 1])]
+
+        return processed_annotations
+
+
+class DeduceMergeAdjacentAnnotations(
+    AnnotationListProcessor, dd.process.MergeAdjacentAnnotations
+):
     """Merge adjacent tags, according to deduce logic: adjacent annotations with mixed
     patient/person tags are replaced with a patient annotation, in other cases only
     annotations with equal tags are considered adjacent."""
@@ -53,8 +355,37 @@ class DeduceMergeAdjacentAnnotations(dd.process.MergeAdjacentAnnotations):
             tag=replacement_tag,
         )
 
+    def process_annotation_list(
+        self, annotations: list[dd.Annotation], text: str
+    ) -> list[dd.Annotation]:
+        annotations = sorted(annotations, key=_POSITION_SORT_KEY)
+
+        if self.check_overlap and any(
+            annotation.end_char > next_annotation.start_char
+            for annotation, next_annotation in zip(annotations, annotations[1:])
+        ):
+            raise ValueError(
+                f"{self.__class__} received input with overlapping annotations."
+            )
+
+        processed_annotations = []
+        annotation = annotations[0]
 
-class PersonAnnotationConverter(dd.process.AnnotationProcessor):
+        for next_annotation in annotations[1:]:
+            if self._are_adjacent_annotations(annotation, next_annotation, text):
+                annotation = self._adjacent_annotations_replacement(
+                    annotation, next_annotation, text
+                )
+            else:
+                processed_annotations.append(annotation)
+                annotation = next_annotation
+
+        processed_annotations.append(annotation)
+
+        return processed_annotations
+
+
+class PersonAnnotationConverter(AnnotationListProcessor):
     """
     Responsible for processing the annotations produced by all name annotators (regular
     and context-based).
@@ -74,22 +405,22 @@ class PersonAnnotationConverter(dd.process.AnnotationProcessor):
 
             return 2
 
-        self._overlap_resolver = dd.process.OverlapResolver(
+        self._overlap_resolver = DeduceOverlapResolver(
             sort_by=("tag", "length"),
             sort_by_callbacks=frozendict(
                 tag=map_tag_to_prio,
-                length=lambda x: -x,
+                length=operator.neg,
             ),
         )
 
-    def process_annotations(
-        self, annotations: dd.AnnotationSet, text: str
-    ) -> dd.AnnotationSet:
-        new_annotations = self._overlap_resolver.process_annotations(
+    def process_annotation_list(
+        self, annotations: list[dd.Annotation], text: str
+    ) -> list[dd.Annotation]:
+        new_annotations = self._overlap_resolver.process_annotation_list(
             annotations, text=text
         )
 
-        return dd.AnnotationSet(
+        return [
             dd.Annotation(
                 text=annotation.text,
                 start_char=annotation.start_char,
@@ -98,35 +429,35 @@ class PersonAnnotationConverter(dd.process.AnnotationProcessor):
             )
             for annotation in new_annotations
             if ("pseudo" not in annotation.tag and len(annotation.text.strip()) != 0)
-        )
+        ]
 
 
-class RemoveAnnotations(dd.process.AnnotationProcessor):
+class RemoveAnnotations(AnnotationListProcessor):
     """Removes all annotations with corresponding tags."""
 
     def __init__(self, tags: list[str]) -> None:
         self.tags = tags
 
-    def process_annotations(
-        self, annotations: AnnotationSet, text: str
-    ) -> AnnotationSet:
-        return AnnotationSet(a for a in annotations if a.tag not in self.tags)
+    def process_annotation_list(
+        self, annotations: list[dd.Annotation], text: str
+    ) -> list[dd.Annotation]:
+        return [a for a in annotations if a.tag not in self.tags]
 
 
-class CleanAnnotationTag(dd.process.AnnotationProcessor):
+class CleanAnnotationTag(AnnotationListProcessor):
     """Cleans annotation tags based on the corresponding mapping."""
 
     def __init__(self, tag_map: dict[str, str]) -> None:
         self.tag_map = tag_map
 
-    def process_annotations(
-        self, annotations: AnnotationSet, text: str
-    ) -> AnnotationSet:
-        new_annotations = AnnotationSet()
+    def process_annotation_list(
+        self, annotations: list[dd.Annotation], text: str
+    ) -> list[dd.Annotation]:
+        new_annotations = []
 
         for annotation in annotations:
             if annotation.tag in self.tag_map:
-                new_annotations.add(
+                new_annotations.append(
                     dd.Annotation(
                         start_char=annotation.start_char,
                         end_char=annotation.end_char,
@@ -138,6 +469,6 @@ class CleanAnnotationTag(dd.process.AnnotationProcessor):
                     )
                 )
             else:
-                new_annotations.add(annotation)
+                new_annotations.append(annotation)
 
         return new_annotations
@@ -1,14 +1,19 @@
+# pylint: disable=C0302
 """Contains components for annotating."""
 
+import functools
+import json
 import re
 import warnings
-from typing import Literal, Optional
+import weakref
+from typing import Callable, Iterable, Literal, Optional, Union
 
 import docdeid as dd
 from docdeid import Annotation, Document, Tokenizer
-from docdeid.process import RegexpAnnotator
 
-from deduce.utils import str_match
+from deduce.person import Person
+from deduce.prefilter import RegexpPrefilter
+from deduce.utils import FuzzyStringIndex, str_match
 
 warnings.simplefilter(action="default")
 
@@ -26,21 +31,245 @@ _DIRECTION_MAP = {
 }
 
 
-class _PatternPositionMatcher:  # pylint: disable=R0903
+class _TokenFeatures:
+    """
+    Features of the tokens of a single document, e.g. whether a token is like a name.
+    Features only depend on the token text, so they are computed at most once for each
+    distinct token text, and then shared by all pattern annotators processing the same
+    document. The boolean features of a token text are stored together in a bitmask.
+
+    When obtained for a document, this also allows moving through the tokens of the
+    document by index. For each set of token texts to skip, a mask of the tokens to
+    keep is computed once, from which the index of the next and previous kept token
+    are derived, so that moving to the next token is an array lookup.
+
+    Args:
+        doc: The document, for moving through its tokens by index.
+    """
+
+    IS_INITIAL = 1
+    IS_INITIALS = 2
+    LIKE_NAME = 4
+
+    _by_doc: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def __init__(self, doc: Optional[dd.Document] = None) -> None:
+        self._masks: dict[str, int] = {}
+        self._casefolded: dict[str, str] = {}
+
+        self._doc_ref = weakref.ref(doc) if doc is not None else None
+        self._tokens: Optional[list[dd.Token]] = None
+        self._token_indices: dict[int, int] = {}
+        self._steps: dict[tuple[str, frozenset], list[int]] = {}
+
+    @classmethod
+    def of(cls, doc: dd.Document) -> "_TokenFeatures":
+        """
+        Get the token features of a document, which are kept as long as the document
+        exists.
+
+        Args:
+            doc: The document.
+
+        Returns:
+            The token features of the document.
+        """
+
+        features = cls._by_doc.get(doc)
+
+        if features is None:
+            features = cls._by_doc[doc] = cls(doc)
+
+        return features
+
+    @classmethod
+    def _compute_mask(cls, text: str) -> int:
+        mask = 0
+
+        if (len(text) == 1 and text[0].isupper()) or text in {"Ch", "Chr", "Ph", "Th"}:
+            mask |= cls.IS_INITIAL
+
+        if len(text) <= 4 and text.isupper():
+            mask |= cls.IS_INITIALS
+
+        if len(text) >= 3 and text.istitle() and not any(ch.isdigit() for ch in text):
+            mask |= cls.LIKE_NAME
+
+        return mask
+
+    def mask(self, text: str) -> int:
+        """Get the bitmask of features of a token text."""
+
+        mask = self._masks.get(text)
+
+        if mask is None:
+            mask = self._masks[text] = self._compute_mask(text)
+
+        return mask
+
+    def casefold(self, text: str) -> str:
+        """Get the casefolded (lowercase) form of a token text."""
+
+        casefolded = self._casefolded.get(text)
+
+        if casefolded is None:
+            casefolded = self._casefolded[text] = text.casefold()
+
+        return casefolded
+
+    @property
+    def tokens(self) -> Optional[list[dd.Token]]:
+        """The tokens of the document, or ``None`` without a document."""
+
+        if self._tokens is None and self._doc_ref is not None:
+            doc = self._doc_ref()
+
+            if doc is not None:
+                self._tokens = list(doc.get_tokens())
+                self._token_indices = {
+                    id(token): i for i, token in enumerate(self._tokens)
+                }
+
+        return self._tokens
+
+    def token_index(self, token: dd.Token) -> Optional[int]:
+        """Get the index of a token of the document, or ``None`` if not available."""
+
+        if self.tokens is None:
+            return None
+
+        return self._token_indices.get(id(token))
+
+    def steps(self, direction: Literal["left", "right"], skip: frozenset) -> list[int]:
+        """
+        Get, for each token index, the index of the previous (left) or next (right)
+        token of which the text is not in skip, or -1 if there is none.
+        """
+
+        steps = self._steps.get((direction, skip))
+
+        if steps is None:
+            keep = [token.text not in skip for token in self.tokens]
+            steps = [-1] * len(keep)
+            nearest = -1
+
+            if direction == "right":
+                indices: Iterable[int] = range(len(keep) - 1, -1, -1)
+            else:
+                indices = range(len(keep))
+
+            for i in indices:
+                steps[i] = nearest
+
+                if keep[i]:
+                    nearest = i
+
+            self._steps[(direction, skip)] = steps
+
+        return steps
+
+    def chained_token(
+        self, token: dd.Token, direction: Literal["left", "right"], skip: frozenset
+    ) -> Optional[dd.Token]:
+        """Get the previous (left) or next (right) token that is not skipped."""
+
+        index = self.token_index(token)
+
+        if index is None:
+            return TokenPatternAnnotator._get_chained_token(  # pylint: disable=W0212
+                token, _DIRECTION_MAP[direction]["attr"], skip
+            )
+
+        index = self.steps(direction, skip)[index]
+
+        return self.tokens[index] if index >= 0 else None
+
+
+TokenMatcher = Callable[[dd.Token, _TokenFeatures], bool]
+SequenceMatcher = Callable[[str, dd.Token, _TokenFeatures], Optional[dd.Annotation]]
+
+
+class _PatternPositionMatcher:
     """Checks if a token matches against a single pattern."""
 
+    @staticmethod
+    def _feature_matcher(feature: int, value: object) -> TokenMatcher:
+        """Matches when the presence of a token feature equals value."""
+
+        if value is True:
+            return lambda token, features: features.mask(token.text) & feature != 0
+
+        if value is False:
+            return lambda token, features: features.mask(token.text) & feature == 0
+
+        return (
+            lambda token, features: (features.mask(token.text) & feature != 0) == value
+        )
+
+    @staticmethod
+    def _raising_matcher(exception: Exception) -> TokenMatcher:
+        """Raises when matching, so that invalid patterns only fail when used."""
+
+        def matcher(token: dd.Token, features: _TokenFeatures) -> bool:
+            raise exception
+
+        return matcher
+
     @classmethod
-    def match(cls, pattern_position: dict, **kwargs) -> bool:  # pylint: disable=R0911
+    def _lookup_matcher(  # pylint: disable=R0911
+        cls, ds: Optional[dd.ds.DsCollection], name: str, negate: bool
+    ) -> TokenMatcher:
+        """Matches when the token text is (not) in the lookup structure."""
+
+        if ds is None:
+            return cls._raising_matcher(
+                RuntimeError(
+                    f"Created pattern with lookup of '{name}', but no lookup "
+                    f"structures provided."
+                )
+            )
+
+        lookup = ds[name]
+
+        if isinstance(lookup, dd.ds.LookupSet):
+            pipeline = lookup.matching_pipeline or []
+            items = lookup.items()
+
+            if len(pipeline) == 0:
+                if negate:
+                    return lambda token, features: token.text not in items
+
+                return lambda token, features: token.text in items
+
+            if all(isinstance(p, dd.str.LowercaseString) for p in pipeline):
+                if negate:
+                    return lambda token, features: (
+                        features.casefold(token.text) not in items
+                    )
+
+                return lambda token, features: features.casefold(token.text) in items
+
+        if negate:
+            return lambda token, features: token.text not in lookup
+
+        return lambda token, features: token.text in lookup
+
+    @classmethod
+    def compile(  # pylint: disable=R0911
+        cls, pattern_position: dict, ds: Optional[dd.ds.DsCollection] = None
+    ) -> TokenMatcher:
         """
-        Matches a pattern position (a dict with one key). Other information should be
-        presented as kwargs.
+        Compiles a pattern position (a dict with one key) into a function, that checks
+        whether a token matches. Lookup structures are resolved and regexps are
+        compiled once, rather than for each token.
 
         Args:
             pattern_position: A dictionary with a single key, e.g. {'is_initial': True}
-            kwargs: Any other information, like the token or ds
+            ds: Any datastructures, that can be used for lookup
 
         Returns:
-            True if the pattern position matches, false otherwise.
+            A function that takes a token, and returns True if the pattern position
+            matches, False otherwise.
         """
 
         if len(pattern_position) > 1:
@@ -48,12 +277,16 @@ class _PatternPositionMatcher:  # pylint: disable=R0903
                 f"Cannot parse token pattern ({pattern_position}) with more than 1 key"
             )
 
+        if len(pattern_position) == 0:
+            return lambda token, features: True
+
         func, value = next(iter(pattern_position.items()))
 
         if func == "equal":
-            return kwargs.get("token").text == value
+            return lambda token, features: token.text == value
         if func == "re_match":
-            return re.match(value, kwargs.get("token").text) is not None
+            regexp = re.compile(value)
+            return lambda token, features: regexp.match(token.text) is not None
         if func == "is_initial":
 
             warnings.warn(
@@ -62,43 +295,161 @@ class _PatternPositionMatcher:  # pylint: disable=R0903
                 DeprecationWarning,
             )
 
-            return (
-                (
-                    len(kwargs.get("token").text) == 1
-                    and kwargs.get("token").text[0].isupper()
-                )
-                or kwargs.get("token").text in {"Ch", "Chr", "Ph", "Th"}
-            ) == value
+            return cls._feature_matcher(_TokenFeatures.IS_INITIAL, value)
         if func == "is_initials":
-            return (
-                len(kwargs.get("token").text) <= 4
-                and kwargs.get("token").text.isupper()
-            ) == value
+            return cls._feature_matcher(_TokenFeatures.IS_INITIALS, value)
         if func == "like_name":
-            return (
-                len(kwargs.get("token").text) >= 3
-                and kwargs.get("token").text.istitle()
-                and not any(ch.isdigit() for ch in kwargs.get("token").text)
-            ) == value
+            return cls._feature_matcher(_TokenFeatures.LIKE_NAME, value)
         if func == "lookup":
-            return kwargs.get("token").text in kwargs.get("ds")[value]
+            return cls._lookup_matcher(ds, value, negate=False)
         if func == "neg_lookup":
-            return kwargs.get("token").text not in kwargs.get("ds")[value]
-        if func == "and":
-            return all(
-                _PatternPositionMatcher.match(pattern_position=x, **kwargs)
-                for x in value
-            )
-        if func == "or":
-            return any(
-                _PatternPositionMatcher.match(pattern_position=x, **kwargs)
-                for x in value
+            return cls._lookup_matcher(ds, value, negate=True)
+        if func in ("and", "or"):
+            matchers = tuple(cls.compile(x, ds=ds) for x in value)
+
+            if len(matchers) == 1:
+                return matchers[0]
+
+            if func == "and":
+                return lambda token, features: all(
+                    matcher(token, features) for matcher in matchers
+                )
+
+            return lambda token, features: any(
+                matcher(token, features) for matcher in matchers
             )
 
-        raise NotImplementedError(f"No known logic for pattern {func}")
+        return cls._raising_matcher(
+            NotImplementedError(f"No known logic for pattern {func}")
+        )
+
+    @classmethod
+    def match(cls, pattern_position: dict, **kwargs) -> bool:
+        """
+        Matches a pattern position (a dict with one key). Other information should be
+        presented as kwargs. Compiles the pattern position for each call, so prefer
+        :meth:`_PatternPositionMatcher.compile` when matching many tokens.
+
+        Args:
+            pattern_position: A dictionary with a single key, e.g. {'is_initial': True}
+            kwargs: Any other information, like the token or ds
+
+        Returns:
+            True if the pattern position matches, false otherwise.
+        """
+
+        return cls.compile(pattern_position, ds=kwargs.get("ds"))(
+            kwargs.get("token"), _TokenFeatures()
+        )
 
 
-class TokenPatternAnnotator(dd.process.Annotator):
+class TokenPatternEngine:
+    """
+    Matches the patterns of multiple token pattern annotators in a single sweep over the
+    tokens of a document. Patterns are indexed by their first position, so that each
+    distinct first position (e.g. a lookup of prefixes) is checked only once per token
+    text, and only the patterns starting at that token are matched further. The first
+    annotator that annotates a document triggers the sweep, the others obtain their
+    annotations from the result. A single instance is typically shared among all token
+    pattern annotators.
+    """
+
+    def __init__(self) -> None:
+        self._index: dict[str, tuple[TokenMatcher, list[int]]] = {}
+        self._sequence_matchers: list[SequenceMatcher] = []
+        self._last_sweep: tuple[Optional[weakref.ref], list[list[dd.Annotation]]] = (
+            None,
+            [],
+        )
+
+    def add_pattern(
+        self,
+        first_position: dict,
+        first_matcher: TokenMatcher,
+        sequence_matcher: SequenceMatcher,
+    ) -> int:
+        """
+        Add a pattern to this engine.
+
+        Args:
+            first_position: The first position of the pattern, used for indexing.
+            first_matcher: The compiled first position of the pattern.
+            sequence_matcher: A function that matches the full pattern at a token, and
+                returns an annotation if it matches.
+
+        Returns:
+            The identifier of the pattern, to be passed to
+            :meth:`TokenPatternEngine.annotations`.
+        """
+
+        pattern_id = len(self._sequence_matchers)
+        self._sequence_matchers.append(sequence_matcher)
+
+        key = json.dumps(first_position, sort_keys=True, default=str)
+
+        if key not in self._index:
+            self._index[key] = (first_matcher, [])
+
+        self._index[key][1].append(pattern_id)
+
+        return pattern_id
+
+    def _sweep(self, doc: dd.Document) -> list[list[dd.Annotation]]:
+        results: list[list[dd.Annotation]] = [[] for _ in self._sequence_matchers]
+        features = _TokenFeatures.of(doc)
+        candidates: dict[str, list[int]] = {}
+
+        for token in doc.get_tokens():
+            pattern_ids = candidates.get(token.text)
+
+            if pattern_ids is None:
+                pattern_ids = candidates[token.text] = [
+                    pattern_id
+                    for first_matcher, group in self._index.values()
+                    if first_matcher(token, features)
+                    for pattern_id in group
+                ]
+
+            for pattern_id in pattern_ids:
+                annotation = self._sequence_matchers[pattern_id](
+                    doc.text, token, features
+                )
+
+                if annotation is not None:
+                    results[pattern_id].append(annotation)
+
+        return results
+
+    def annotations(self, pattern_id: int, doc: dd.Document) -> list[dd.Annotation]:
+        """
+        Get the annotations of a single pattern. The document is swept once, and the
+        result is reused for all patterns added to this engine.
+
+        Args:
+            pattern_id: The identifier, as returned by
+                :meth:`TokenPatternEngine.add_pattern`.
+            doc: The document.
+
+        Returns:
+            The annotations of the pattern.
+        """
+
+        doc_ref, results = self._last_sweep
+
+        if doc_ref is None or doc_ref() is not doc:
+            results = self._sweep(doc)
+            self._last_sweep = (weakref.ref(doc), results)
+
+        return list(results[pattern_id])
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_last_sweep"] = (None, [])
+
+        return state
+
+
+class TokenPatternAnnotator(dd.process.Annotator):  # pylint: disable=R0902
     """
     Annotates based on token patterns, which should be provided as a list of dicts. Each
     position in the list denotes a token position, e.g.: [{'is_initial': True},
@@ -109,19 +460,25 @@ class TokenPatternAnnotator(dd.process.Annotator):
         pattern: The pattern
         ds: Any datastructures, that can be used for lookup or other logic
         skip: Any string values that should be skipped in matching (e.g. periods)
+        pattern_engine: A :class:`.TokenPatternEngine`, for matching this pattern
+            along with the patterns of other annotators in a single sweep.
     """
 
-    def __init__(
+    def __init__(  # pylint: disable=R0913
         self,
         pattern: list[dict],
         *args,
         ds: Optional[dd.ds.DsCollection] = None,
         skip: Optional[list[str]] = None,
+        pattern_engine: Optional[TokenPatternEngine] = None,
         **kwargs,
     ) -> None:
         self.pattern = pattern
         self.ds = ds
-        self.skip = set(skip or [])
+        self.skip = frozenset(skip or [])
+
+        self._pattern_engine = pattern_engine
+        self._pattern_id: Optional[int] = None
 
         self._start_words = None
         self._matching_pipeline = None
@@ -144,8 +501,33 @@ class TokenPatternAnnotator(dd.process.Annotator):
             self._start_words = lookup_list.items()
             self._matching_pipeline = lookup_list.matching_pipeline
 
+        self._init_matchers()
+
         super().__init__(*args, **kwargs)
 
+    def _init_matchers(self) -> None:
+        """Compile the pattern, and add it to the pattern engine (if any)."""
+
+        self._matchers = self._compile_pattern(self.pattern)
+
+        if self._pattern_engine is not None and len(self.pattern) > 0:
+            self._pattern_id = self._pattern_engine.add_pattern(
+                self.pattern[0], self._matchers[0], self._match_at
+            )
+
+    def _match_at(
+        self, text: str, token: dd.Token, features: _TokenFeatures
+    ) -> Optional[dd.Annotation]:
+        return self._match_compiled_sequence(
+            text, self._matchers, token, skip=self.skip, features=features
+        )
+
+    def _compile_pattern(self, pattern: list[dict]) -> list[TokenMatcher]:
+        return [
+            _PatternPositionMatcher.compile(pattern_position, ds=self.ds)
+            for pattern_position in pattern
+        ]
+
     @staticmethod
     def _get_chained_token(
         token: dd.Token, attr: str, skip: set[str]
@@ -158,6 +540,50 @@ class TokenPatternAnnotator(dd.process.Annotator):
 
         return token
 
+    def _match_linked_tokens(  # pylint: disable=R0913
+        self,
+        matchers: Iterable[TokenMatcher],
+        start_token: dd.Token,
+        attr: str,
+        skip: frozenset,
+        features: _TokenFeatures,
+    ) -> Optional[dd.Token]:
+        """Match against the linked tokens, and return the last matched token."""
+
+        current_token = start_token
+        end_token = start_token
+
+        for matcher in matchers:
+            if current_token is None or not matcher(current_token, features):
+                return None
+
+            end_token = current_token
+            current_token = self._get_chained_token(current_token, attr, skip)
+
+        return end_token
+
+    @staticmethod
+    def _match_indexed_tokens(
+        matchers: Iterable[TokenMatcher],
+        start_index: int,
+        steps: list[int],
+        features: _TokenFeatures,
+    ) -> Optional[dd.Token]:
+        """Match against the tokens by index, and return the last matched token."""
+
+        tokens = features.tokens
+        index = start_index
+        end_index = start_index
+
+        for matcher in matchers:
+            if index < 0 or not matcher(tokens[index], features):
+                return None
+
+            end_index = index
+            index = steps[index]
+
+        return tokens[end_index]
+
     def _match_sequence(  # pylint: disable=R0913
         self,
         text: str,
@@ -176,194 +602,672 @@ class TokenPatternAnnotator(dd.process.Annotator):
             direction: The direction to match, choice of "left" or "right".
             skip: Any string values that should be skipped in matching.
 
-        Returns:
-              An Annotation if matching is possible, None otherwise.
-        """
+        Returns:
+              An Annotation if matching is possible, None otherwise.
+        """
+
+        return self._match_compiled_sequence(
+            text,
+            self._compile_pattern(pattern),
+            start_token,
+            direction=direction,
+            skip=skip,
+        )
+
+    def _match_compiled_sequence(  # pylint: disable=R0913
+        self,
+        text: str,
+        matchers: list[TokenMatcher],
+        start_token: dd.tokenizer.Token,
+        *,
+        direction: Literal["left", "right"] = "right",
+        skip: Optional[set[str]] = None,
+        features: Optional[_TokenFeatures] = None,
+    ) -> Optional[dd.Annotation]:
+        """
+        Sequentially match a compiled pattern against a specified start_token.
+
+        Args:
+            text: The original document text.
+            matchers: The compiled pattern to match.
+            start_token: The start token to match.
+            direction: The direction to match, choice of "left" or "right".
+            skip: Any string values that should be skipped in matching.
+            features: The token features of the document, if available.
+
+        Returns:
+              An Annotation if matching is possible, None otherwise.
+        """
+
+        skip = frozenset(skip or ())
+
+        if features is None:
+            features = _TokenFeatures()
+
+        matchers = _DIRECTION_MAP[direction]["order"](matchers)
+        index = features.token_index(start_token)
+
+        if index is None:
+            end_token = self._match_linked_tokens(
+                matchers, start_token, _DIRECTION_MAP[direction]["attr"], skip, features
+            )
+        else:
+            end_token = self._match_indexed_tokens(
+                matchers, index, features.steps(direction, skip), features
+            )
+
+        if end_token is None:
+            return None
+
+        start_token, end_token = _DIRECTION_MAP[direction]["order"](
+            (start_token, end_token)
+        )
+
+        return dd.Annotation(
+            text=text[start_token.start_char : end_token.end_char],
+            start_char=start_token.start_char,
+            end_char=end_token.end_char,
+            tag=self.tag,
+            priority=self.priority,
+            start_token=start_token,
+            end_token=end_token,
+        )
+
+    def annotate(self, doc: dd.Document) -> list[dd.Annotation]:
+        """
+        Annotate the document, by matching the pattern against all tokens.
+
+        Args:
+            doc: The document being processed.
+
+        Returns:
+            A list of Annotation.
+        """
+
+        if self._pattern_id is not None:
+            return self._pattern_engine.annotations(self._pattern_id, doc)
+
+        annotations = []
+
+        tokens = doc.get_tokens()
+        features = _TokenFeatures.of(doc)
+
+        if self._start_words is not None:
+            tokens = tokens.token_lookup(
+                lookup_values=self._start_words,
+                matching_pipeline=self._matching_pipeline,
+            )
+
+        for token in tokens:
+
+            annotation = self._match_compiled_sequence(
+                doc.text,
+                self._matchers,
+                token,
+                direction="right",
+                skip=self.skip,
+                features=features,
+            )
+
+            if annotation is not None:
+                annotations.append(annotation)
+
+        return annotations
+
+
+class _ContextTagIndex:
+    """
+    The annotations a :class:`.ContextAnnotator` is extending, indexed by their first
+    and last tag, so that a context pattern only visits annotations of which the tag
+    matches its ``pre_tag``. Also keeps track of which annotations were added, rather
+    than present initially.
+    """
+
+    def __init__(self, annotations: Iterable[dd.Annotation]) -> None:
+        self._added: dict[dd.Annotation, bool] = {}
+        self._removed: set[dd.Annotation] = set()
+        self._by_tag: dict[str, dict[str, dict[int, dd.Annotation]]] = {
+            "left": {},
+            "right": {},
+        }
+
+        self._tags: dict[str, tuple[str, str]] = {}
+
+        for annotation in annotations:
+            self._insert(annotation, added=False)
+
+    def _first_and_last_tag(self, tag: str) -> tuple[str, str]:
+        tags = self._tags.get(tag)
+
+        if tags is None:
+            parts = tag.split("+")
+            tags = self._tags[tag] = (parts[0], parts[-1])
+
+        return tags
+
+    def _insert(self, annotation: dd.Annotation, added: bool) -> None:
+        if annotation in self._added:
+            return
+
+        first_tag, last_tag = self._first_and_last_tag(annotation.tag)
+
+        self._added[annotation] = added
+        self._by_tag["left"].setdefault(first_tag, {})[id(annotation)] = annotation
+        self._by_tag["right"].setdefault(last_tag, {})[id(annotation)] = annotation
+
+    def candidates(
+        self, direction: Literal["left", "right"], pre_tag: Union[str, list[str]]
+    ) -> list[dd.Annotation]:
+        """
+        Get the annotations that a context pattern should be applied to.
+
+        Args:
+            direction: The direction of the context pattern, annotations are selected
+                on their first tag (left) or last tag (right).
+            pre_tag: The tag(s) that annotations should have.
+
+        Returns:
+            The annotations with a matching tag.
+        """
+
+        return [
+            annotation
+            for tag, annotations in self._by_tag[direction].items()
+            if tag in pre_tag
+            for annotation in annotations.values()
+        ]
+
+    def replace(self, annotation: dd.Annotation, new_annotation: dd.Annotation) -> None:
+        """
+        Replace an annotation by an extended annotation.
+
+        Args:
+            annotation: The annotation to remove.
+            new_annotation: The annotation to add, unless an equal one is present.
+        """
+
+        if not self._added.pop(annotation):
+            self._removed.add(annotation)
+
+        first_tag, last_tag = self._first_and_last_tag(annotation.tag)
+
+        del self._by_tag["left"][first_tag][id(annotation)]
+        del self._by_tag["right"][last_tag][id(annotation)]
+
+        self._insert(new_annotation, added=new_annotation not in self._removed)
+
+    def annotations(self, added: Optional[bool] = None) -> list[dd.Annotation]:
+        """
+        Get the annotations.
+
+        Args:
+            added: If ``True``, only annotations that were added. If ``False``, only
+                annotations that were present initially. If ``None``, all annotations.
+
+        Returns:
+            The annotations.
+        """
+
+        if added is None:
+            return list(self._added)
+
+        return [
+            annotation
+            for annotation, is_added in self._added.items()
+            if is_added == added
+        ]
+
+
+class ContextAnnotator(TokenPatternAnnotator):
+    """
+    Extends existing annotations to the left or right, based on specified patterns.
+
+    Args:
+        ds: Any datastructures, that can be used for lookup or other logic
+        iterative: Whether the extension process should repeat, or stop after one
+        iteration.
+    """
+
+    def __init__(
+        self,
+        *args,
+        ds: Optional[dd.ds.DsCollection] = None,
+        iterative: bool = True,
+        **kwargs,
+    ) -> None:
+        self.iterative = iterative
+        super().__init__(*args, **kwargs, ds=ds, tag="_")
+
+    def _init_matchers(self) -> None:
+        """Compile the pattern of each context pattern."""
+
+        self._matchers = [
+            self._compile_pattern(context_pattern["pattern"])
+            for context_pattern in self.pattern
+        ]
+
+    def _apply_context_pattern(  # pylint: disable=R0913
+        self,
+        text: str,
+        annotations: dd.AnnotationSet,
+        context_pattern: dict,
+        *,
+        matchers: Optional[list[TokenMatcher]] = None,
+        features: Optional[_TokenFeatures] = None,
+    ) -> dd.AnnotationSet:
+
+        index = _ContextTagIndex(annotations)
+
+        self._apply_context_pattern_to_index(
+            text, index, context_pattern, matchers=matchers, features=features
+        )
+
+        return dd.AnnotationSet(index.annotations())
+
+    def _apply_context_pattern_to_index(  # pylint: disable=R0913
+        self,
+        text: str,
+        index: _ContextTagIndex,
+        context_pattern: dict,
+        *,
+        matchers: Optional[list[TokenMatcher]] = None,
+        features: Optional[_TokenFeatures] = None,
+        match_cache: Optional[dict[int, Optional[dd.Annotation]]] = None,
+    ) -> None:
+        """
+        Apply a context pattern to the annotations in the index, replacing each
+        annotation that can be extended by the extended annotation.
+
+        Args:
+            text: The input text.
+            index: The index of annotations.
+            context_pattern: The context pattern.
+            matchers: The compiled pattern of the context pattern, if available.
+            features: The token features of the document, if available.
+            match_cache: The result of matching this context pattern next to a token,
+                by token id. Extending an annotation only depends on the token at its
+                boundary, so this can be reused while the tokens exist.
+        """
+
+        if matchers is None:
+            matchers = self._compile_pattern(context_pattern["pattern"])
+
+        if match_cache is None:
+            match_cache = {}
+
+        direction = context_pattern["direction"]
+        skip = frozenset(context_pattern.get("skip", []))
+
+        if features is None:
+            features = _TokenFeatures()
+
+        for annotation in index.candidates(direction, context_pattern["pre_tag"]):
+
+            boundary_token = _DIRECTION_MAP[direction]["start_token"](annotation)
+
+            try:
+                new_annotation = match_cache[id(boundary_token)]
+            except KeyError:
+                new_annotation = match_cache[id(boundary_token)] = (
+                    self._match_compiled_sequence(
+                        text,
+                        matchers,
+                        features.chained_token(boundary_token, direction, skip),
+                        direction=direction,
+                        skip=skip,
+                        features=features,
+                    )
+                )
+
+            if new_annotation:
+                left_ann, right_ann = _DIRECTION_MAP[direction]["order"](
+                    (annotation, new_annotation)
+                )
+
+                merged_annotation = dd.Annotation(
+                    text=text[left_ann.start_char : right_ann.end_char],
+                    start_char=left_ann.start_char,
+                    end_char=right_ann.end_char,
+                    start_token=left_ann.start_token,
+                    end_token=right_ann.end_token,
+                    tag=context_pattern["tag"].format(tag=annotation.tag),
+                    priority=annotation.priority,
+                )
+
+                index.replace(annotation, merged_annotation)
+
+    def _annotate(
+        self,
+        text: str,
+        annotations: dd.AnnotationSet,
+        features: Optional[_TokenFeatures] = None,
+    ) -> dd.AnnotationSet:
+        """
+        Does the annotation, by applying each context pattern to the annotations. If
+        iterative, this is repeated for the annotations that were extended, until no
+        annotation changes. Annotations that were not extended are final, so they are
+        not processed again.
+
+        Args:
+            text: The input text.
+            annotations: The input annotations.
+            features: The token features of the document, if available.
+
+        Returns:
+            An extended set of annotations, based on the patterns provided.
+        """
+
+        if features is None:
+            features = _TokenFeatures()
+
+        result = dd.AnnotationSet()
+        worklist: Iterable[dd.Annotation] = annotations
+        match_caches: list[dict] = [{} for _ in self.pattern]
+
+        while True:
+            index = _ContextTagIndex(worklist)
+
+            for context_pattern, matchers, match_cache in zip(
+                self.pattern, self._matchers, match_caches
+            ):
+                self._apply_context_pattern_to_index(
+                    text,
+                    index,
+                    context_pattern,
+                    matchers=matchers,
+                    features=features,
+                    match_cache=match_cache,
+                )
+
+            if not self.iterative:
+                result.update(index.annotations())
+                break
+
+            result.update(index.annotations(added=False))
+            worklist = index.annotations(added=True)
+
+            if len(worklist) == 0:
+                break
+
+        return result
+
+    def annotate(self, doc: dd.Document) -> list[dd.Annotation]:
+        """
+        Wrapper for annotating.
+
+        Args:
+            doc: The document to process.
+
+        Returns:
+            An empty list, as annotations are modified and not added.
+        """
+
+        doc.annotations = self._annotate(
+            doc.text, doc.annotations, _TokenFeatures.of(doc)
+        )
+        return []
+
+
+class _PersonMatcher:
+    """
+    Matches the names of a single person against tokens. Everything that only depends
+    on the person (the fuzzy index of first names, initials of first names and the
+    tokenized surname) is derived once, so that it can be reused for all documents of
+    the same person.
+
+    Args:
+        first_names: The first names of the person, if any.
+        initials: The initials of the person, if any.
+        surname_pattern: The tokenized surname of the person, if any.
+    """
+
+    def __init__(
+        self,
+        first_names: Optional[tuple[str, ...]],
+        initials: Optional[str],
+        surname_pattern: Optional[dd.tokenizer.TokenList],
+    ) -> None:
+        self.first_names = first_names
+        self.initials = initials
+        self.surname_pattern = surname_pattern
+
+        self._first_name_index = FuzzyStringIndex(first_names or [])
+        self._first_name_initials = {first_name[0] for first_name in first_names or []}
+        self._surname_index = (
+            FuzzyStringIndex([surname_pattern[0].text])
+            if surname_pattern is not None
+            else None
+        )
+
+    def match_first_names(self, token: dd.Token) -> Optional[tuple[dd.Token, dd.Token]]:
+        """Match any of the first names, allowing a typo in longer tokens."""
+
+        if self._first_name_index.match(token.text) or (
+            len(token.text) > 3 and self._first_name_index.match(token.text, 1)
+        ):
+            return token, token
+
+        return None
+
+    def match_initial_from_name(
+        self, token: dd.Token
+    ) -> Optional[tuple[dd.Token, dd.Token]]:
+        """Match the initial of any of the first names, including a trailing period."""
+
+        if token.text in self._first_name_initials:
+            next_token = token.next()
+
+            if (next_token is not None) and str_match(next_token.text, "."):
+                return token, next_token
+
+            return token, token
+
+        return None
+
+    def match_initials(self, token: dd.Token) -> Optional[tuple[dd.Token, dd.Token]]:
+        """Match the initials."""
+
+        if str_match(token.text, self.initials):
+            return token, token
+
+        return None
 
-        skip = skip or set()
+    def match_surname(
+        self,
+        token: dd.Token,
+        next_with_skip: Callable[[dd.Token], Optional[dd.Token]],
+    ) -> Optional[tuple[dd.Token, dd.Token]]:
+        """Match the (possibly multi token) surname, allowing a typo in each token."""
 
-        attr = _DIRECTION_MAP[direction]["attr"]
-        pattern = _DIRECTION_MAP[direction]["order"](pattern)
+        if not self._surname_index.match(token.text, 1):
+            return None
 
-        current_token = start_token
-        end_token = start_token
+        surname_token = self.surname_pattern[0]
+        start_token = token
 
-        for pattern_position in pattern:
-            if current_token is None or not _PatternPositionMatcher.match(
-                pattern_position=pattern_position, token=current_token, ds=self.ds
-            ):
+        while True:
+            if not str_match(surname_token.text, token.text, max_edit_distance=1):
                 return None
 
-            end_token = current_token
-            current_token = self._get_chained_token(current_token, attr, skip)
+            match_end_token = token
 
-        start_token, end_token = _DIRECTION_MAP[direction]["order"](
-            (start_token, end_token)
-        )
+            surname_token = next_with_skip(surname_token)
+            token = next_with_skip(token)
 
-        return dd.Annotation(
-            text=text[start_token.start_char : end_token.end_char],
-            start_char=start_token.start_char,
-            end_char=end_token.end_char,
-            tag=self.tag,
-            priority=self.priority,
-            start_token=start_token,
-            end_token=end_token,
-        )
+            if surname_token is None:
+                return start_token, match_end_token  # end of pattern
 
-    def annotate(self, doc: dd.Document) -> list[dd.Annotation]:
-        """
-        Annotate the document, by matching the pattern against all tokens.
+            if token is None:
+                return None  # end of tokens
 
-        Args:
-            doc: The document being processed.
 
-        Returns:
-            A list of Annotation.
-        """
+def _compile_person_matcher(
+    tokenizer: Tokenizer,
+    first_names: Optional[tuple[str, ...]],
+    initials: Optional[str],
+    surname: Optional[str],
+) -> _PersonMatcher:
+    return _PersonMatcher(
+        first_names=first_names,
+        initials=initials,
+        surname_pattern=tokenizer.tokenize(surname) if surname is not None else None,
+    )
 
-        annotations = []
 
-        tokens = doc.get_tokens()
+class _TokenTrie:
+    """
+    A trie over token texts, with fuzzy transitions. The texts of the children of each
+    node are indexed, so that the children matching a token are found without comparing
+    the token to each of them.
+    """
 
-        if self._start_words is not None:
-            tokens = tokens.token_lookup(
-                lookup_values=self._start_words,
-                matching_pipeline=self._matching_pipeline,
-            )
+    def __init__(self) -> None:
+        self.children: dict[str, _TokenTrie] = {}
+        self.is_end = False
+        self._child_index: Optional[FuzzyStringIndex] = None
 
-        for token in tokens:
+    def add(self, texts: Iterable[str]) -> None:
+        """Add a sequence of token texts to the trie."""
 
-            annotation = self._match_sequence(
-                doc.text, self.pattern, token, direction="right", skip=self.skip
-            )
+        node = self
 
-            if annotation is not None:
-                annotations.append(annotation)
+        for text in texts:
+            node._child_index = None  # pylint: disable=W0212
+            node = node.children.setdefault(text, _TokenTrie())
 
-        return annotations
+        node.is_end = True
+
+    def next_nodes(self, text: str) -> list["_TokenTrie"]:
+        """
+        Get the children with a text matching the token text, allowing a typo in
+        tokens longer than 3 chars. Shorter tokens must match exactly, as a typo in a
+        short token would match many common words.
+        """
 
+        if len(text) <= 3:
+            return [self.children[text]] if text in self.children else []
 
-class ContextAnnotator(TokenPatternAnnotator):
+        if len(self.children) == 0:
+            return []
+
+        if self._child_index is None:
+            self._child_index = FuzzyStringIndex(self.children)
+
+        return [self.children[child] for child in self._child_index.find(text, 1)]
+
+
+class _PersonsMatcher:
     """
-    Extends existing annotations to the left or right, based on specified patterns.
+    Matches the names of any number of persons against tokens. The first names and
+    initials of all persons are indexed together, and all surnames are combined in a
+    single token trie. Matching a token is therefore a matter of a few lookups,
+    regardless of the number of persons.
 
     Args:
-        ds: Any datastructures, that can be used for lookup or other logic
-        iterative: Whether the extension process should repeat, or stop after one
-        iteration.
+        persons: For each person, the first names, initials and tokenized surname.
     """
 
     def __init__(
         self,
-        *args,
-        ds: Optional[dd.ds.DsCollection] = None,
-        iterative: bool = True,
-        **kwargs,
+        persons: Iterable[
+            tuple[Optional[tuple[str, ...]], Optional[str], Optional[list[str]]]
+        ],
     ) -> None:
-        self.iterative = iterative
-        super().__init__(*args, **kwargs, ds=ds, tag="_")
+        first_names = set()
+        self._initials = set()
+        self._surnames = _TokenTrie()
 
-    def _apply_context_pattern(
-        self, text: str, annotations: dd.AnnotationSet, context_pattern: dict
-    ) -> dd.AnnotationSet:
+        for person_first_names, initials, surname_texts in persons:
+            first_names.update(person_first_names or [])
 
-        direction = context_pattern["direction"]
-        skip = set(context_pattern.get("skip", []))
+            if initials is not None:
+                self._initials.add(initials)
 
-        for annotation in annotations.copy():
+            if surname_texts:
+                self._surnames.add(surname_texts)
 
-            tag = list(_DIRECTION_MAP[direction]["order"](annotation.tag.split("+")))[
-                -1
-            ]
+        self._first_name_index = FuzzyStringIndex(first_names)
 
-            if tag not in context_pattern["pre_tag"]:
-                continue
+    def match_first_names(self, token: dd.Token) -> Optional[tuple[dd.Token, dd.Token]]:
+        """Match the first name of any person, allowing a typo in longer tokens."""
 
-            attr = _DIRECTION_MAP[direction]["attr"]
-            start_token = self._get_chained_token(
-                _DIRECTION_MAP[direction]["start_token"](annotation), attr, skip
-            )
-            new_annotation = self._match_sequence(
-                text,
-                context_pattern["pattern"],
-                start_token,
-                direction=direction,
-                skip=skip,
-            )
+        if self._first_name_index.match(token.text) or (
+            len(token.text) > 3 and self._first_name_index.match(token.text, 1)
+        ):
+            return token, token
 
-            if new_annotation:
-                left_ann, right_ann = _DIRECTION_MAP[direction]["order"](
-                    (annotation, new_annotation)
-                )
+        return None
 
-                merged_annotation = dd.Annotation(
-                    text=text[left_ann.start_char : right_ann.end_char],
-                    start_char=left_ann.start_char,
-                    end_char=right_ann.end_char,
-                    start_token=left_ann.start_token,
-                    end_token=right_ann.end_token,
-                    tag=context_pattern["tag"].format(tag=annotation.tag),
-                    priority=annotation.priority,
-                )
+    def match_initials(self, token: dd.Token) -> Optional[tuple[dd.Token, dd.Token]]:
+        """Match the initials of any person."""
 
-                annotations.remove(annotation)
-                annotations.add(merged_annotation)
+        if token.text in self._initials:
+            return token, token
 
-        return annotations
+        return None
 
-    def _annotate(self, text: str, annotations: dd.AnnotationSet) -> dd.AnnotationSet:
+    def match_surnames(
+        self,
+        token: dd.Token,
+        next_with_skip: Callable[[dd.Token], Optional[dd.Token]],
+    ) -> list[tuple[dd.Token, dd.Token]]:
         """
-        Does the annotation, by calling _apply_context_pattern, and then optionally
-        recursing. Also keeps track of the (un)changed annotations, so they are not
-        repeatedly processed.
-
-        Args:
-            text: The input text.
-            annotations: The input annotations.
-
-        Returns:
-            An extended set of annotations, based on the patterns provided.
+        Match the (possibly multi token) surname of any person, allowing a typo in each
+        token longer than 3 chars. All surnames are matched simultaneously, by walking
+        the trie.
         """
 
-        original_annotations = annotations.copy()
-
-        for context_pattern in self.pattern:
-            annotations = self._apply_context_pattern(
-                text, annotations, context_pattern
-            )
-
-        if self.iterative:
-
-            changed = dd.AnnotationSet(annotations.difference(original_annotations))
-            annotations = dd.AnnotationSet(
-                annotations.intersection(original_annotations)
-            )
-
-            if changed:
-                annotations.update(self._annotate(text, changed))
+        matches = []
+        start_token = token
+        nodes = [self._surnames]
 
-        return annotations
+        while True:
+            nodes = [child for node in nodes for child in node.next_nodes(token.text)]
 
-    def annotate(self, doc: dd.Document) -> list[dd.Annotation]:
-        """
-        Wrapper for annotating.
+            if len(nodes) == 0:
+                return matches
 
-        Args:
-            doc: The document to process.
+            if any(node.is_end for node in nodes):
+                matches.append((start_token, token))
 
-        Returns:
-            An empty list, as annotations are modified and not added.
-        """
+            token = next_with_skip(token)
 
-        doc.annotations = self._annotate(doc.text, doc.annotations)
-        return []
+            if token is None:
+                return matches
+
+
+def _compile_persons_matcher(
+    tokenizer: Tokenizer, persons: Iterable[Person]
+) -> _PersonsMatcher:
+    return _PersonsMatcher(
+        (
+            person.first_names,
+            person.initials,
+            (
+                [token.text for token in tokenizer.tokenize(person.surname)]
+                if person.surname is not None
+                else None
+            ),
+        )
+        for person in persons
+    )
 
 
 class PatientNameAnnotator(dd.process.Annotator):
     """
     Annotates patient names, based on information present in document metadata. This
-    class implements logic for detecting first name(s), initials and surnames.
+    class implements logic for detecting first name(s), initials and surnames. The
+    patient names are prepared for matching once per patient, and reused for all
+    documents with the same patient (as long as it remains in a LRU cache).
+
+    Other known persons (e.g. relatives or staff) can be supplied as a list of
+    ``Person`` in the ``persons`` metadata key. Their names are matched all at once,
+    so that supplying many persons does not slow down annotation. The matcher of the
+    last list of persons is kept, and reused as long as the same list (of the same
+    length) is supplied, e.g. a roster of all staff. Their names are tagged
+    ``voornaam_persoon``, ``initiaal_persoon`` and ``achternaam_persoon``. Unlike for
+    the patient, single initials derived from their first names are not matched, as
+    with many persons nearly every capital letter would match.
 
     Args:
         tokenizer: A tokenizer, that is used for breaking up the patient surname
@@ -374,49 +1278,49 @@ class PatientNameAnnotator(dd.process.Annotator):
 
         self.tokenizer = tokenizer
         self.skip = [".", "-", " "]
+        self._person_matchers = functools.lru_cache(maxsize=256)(
+            functools.partial(_compile_person_matcher, tokenizer)
+        )
+        self._persons_matcher: Optional[tuple[list[Person], int, _PersonsMatcher]] = (
+            None
+        )
 
         super().__init__(*args, **kwargs)
 
-    @staticmethod
-    def _match_first_names(
-        doc: dd.Document, token: dd.Token
-    ) -> Optional[tuple[dd.Token, dd.Token]]:
+    def _get_person_matcher(self, doc: dd.Document) -> _PersonMatcher:
+        """
+        Get the matcher for the patient in the document metadata. If the metadata
+        contains a ``surname_pattern``, it is used rather than tokenizing the surname.
+        """
 
-        for first_name in doc.metadata["patient"].first_names:
+        patient = doc.metadata["patient"] or Person()
+        first_names = (
+            tuple(patient.first_names) if patient.first_names is not None else None
+        )
 
-            if str_match(token.text, first_name) or (
-                len(token.text) > 3
-                and str_match(token.text, first_name, max_edit_distance=1)
-            ):
-                return token, token
+        if doc.metadata["surname_pattern"] is not None:
+            return _PersonMatcher(
+                first_names=first_names,
+                initials=patient.initials,
+                surname_pattern=doc.metadata["surname_pattern"],
+            )
 
-        return None
+        return self._person_matchers(first_names, patient.initials, patient.surname)
 
-    @staticmethod
-    def _match_initial_from_name(
-        doc: dd.Document, token: dd.Token
+    def _match_first_names(
+        self, doc: dd.Document, token: dd.Token
     ) -> Optional[tuple[dd.Token, dd.Token]]:
+        return self._get_person_matcher(doc).match_first_names(token)
 
-        for _, first_name in enumerate(doc.metadata["patient"].first_names):
-            if str_match(token.text, first_name[0]):
-                next_token = token.next()
-
-                if (next_token is not None) and str_match(next_token.text, "."):
-                    return token, next_token
-
-                return token, token
-
-        return None
+    def _match_initial_from_name(
+        self, doc: dd.Document, token: dd.Token
+    ) -> Optional[tuple[dd.Token, dd.Token]]:
+        return self._get_person_matcher(doc).match_initial_from_name(token)
 
-    @staticmethod
     def _match_initials(
-        doc: dd.Document, token: dd.Token
+        self, doc: dd.Document, token: dd.Token
     ) -> Optional[tuple[dd.Token, dd.Token]]:
-
-        if str_match(token.text, doc.metadata["patient"].initials):
-            return token, token
-
-        return None
+        return self._get_person_matcher(doc).match_initials(token)
 
     def next_with_skip(self, token: dd.Token) -> Optional[dd.Token]:
         """Find the next token, while skipping certain punctuation."""
@@ -432,31 +1336,67 @@ class PatientNameAnnotator(dd.process.Annotator):
     def _match_surname(
         self, doc: dd.Document, token: dd.Token
     ) -> Optional[tuple[dd.Token, dd.Token]]:
+        return self._get_person_matcher(doc).match_surname(token, self.next_with_skip)
 
-        if doc.metadata["surname_pattern"] is None:
-            doc.metadata["surname_pattern"] = self.tokenizer.tokenize(
-                doc.metadata["patient"].surname
-            )
+    def _get_persons_matcher(self, doc: dd.Document) -> _PersonsMatcher:
+        """
+        Get the matcher for the other persons in the document metadata. The list of
+        persons is kept along with its matcher, so that it cannot be replaced by
+        another list with the same id.
+        """
 
-        surname_pattern = doc.metadata["surname_pattern"]
+        persons = doc.metadata["persons"]
 
-        surname_token = surname_pattern[0]
-        start_token = token
+        if self._persons_matcher is not None:
+            cached_persons, n_persons, matcher = self._persons_matcher
 
-        while True:
-            if not str_match(surname_token.text, token.text, max_edit_distance=1):
-                return None
+            if persons is cached_persons and len(persons) == n_persons:
+                return matcher
 
-            match_end_token = token
+        matcher = _compile_persons_matcher(self.tokenizer, persons)
+        self._persons_matcher = (persons, len(persons), matcher)
 
-            surname_token = self.next_with_skip(surname_token)
-            token = self.next_with_skip(token)
+        return matcher
 
-            if surname_token is None:
-                return start_token, match_end_token  # end of pattern
+    def _annotate_persons(self, doc: Document) -> list[Annotation]:
+        """Annotates the names of the other persons in the document metadata."""
 
-            if token is None:
-                return None  # end of tokens
+        persons_matcher = self._get_persons_matcher(doc)
+
+        matchers = [
+            (persons_matcher.match_first_names, "voornaam_persoon"),
+            (persons_matcher.match_initials, "initiaal_persoon"),
+        ]
+
+        annotations = []
+
+        for token in doc.get_tokens():
+
+            matches = [
+                (match, "achternaam_persoon")
+                for match in persons_matcher.match_surnames(token, self.next_with_skip)
+            ]
+
+            for matcher, tag in matchers:
+                match = matcher(token)
+
+                if match is not None:
+                    matches.append((match, tag))
+
+            for (start_token, end_token), tag in matches:
+                annotations.append(
+                    dd.Annotation(
+                        text=doc.text[start_token.start_char : end_token.end_char],
+                        start_char=start_token.start_char,
+                        end_char=end_token.end_char,
+                        tag=tag,
+                        priority=self.priority,
+                        start_token=start_token,
+                        end_token=end_token,
+                    )
+                )
+
+        return annotations
 
     def annotate(self, doc: Document) -> list[Annotation]:
         """
@@ -468,14 +1408,32 @@ class PatientNameAnnotator(dd.process.Annotator):
         Returns: A document with any relevant Annotations added.
         """
 
-        if doc.metadata is None or doc.metadata["patient"] is None:
+        if doc.metadata is None:
+            return []
+
+        if doc.metadata["persons"]:
+            return self._annotate_patient(doc) + self._annotate_persons(doc)
+
+        return self._annotate_patient(doc)
+
+    def _annotate_patient(self, doc: Document) -> list[Annotation]:
+        """Annotates the names of the patient in the document metadata."""
+
+        if doc.metadata["patient"] is None:
             return []
 
+        person_matcher = self._get_person_matcher(doc)
+
         matcher_to_attr = {
-            self._match_first_names: ("first_names", "voornaam_patient"),
-            self._match_initial_from_name: ("first_names", "initiaal_patient"),
-            self._match_initials: ("initials", "initiaal_patient"),
-            self._match_surname: ("surname", "achternaam_patient"),
+            person_matcher.match_first_names: ("first_names", "voornaam_patient"),
+            person_matcher.match_initial_from_name: (
+                "first_names",
+                "initiaal_patient",
+            ),
+            person_matcher.match_initials: ("initials", "initiaal_patient"),
+            functools.partial(
+                person_matcher.match_surname, next_with_skip=self.next_with_skip
+            ): ("surname", "achternaam_patient"),
         }
 
         matchers = []
@@ -491,7 +1449,7 @@ class PatientNameAnnotator(dd.process.Annotator):
 
             for matcher, tag in matchers:
 
-                match = matcher(doc, token)
+                match = matcher(token)
 
                 if match is None:
                     continue
@@ -513,6 +1471,126 @@ class PatientNameAnnotator(dd.process.Annotator):
         return annotations
 
 
+class NestedMatchPruning:
+    """
+    Keeps track of the document for which lookup annotators may prune nested matches,
+    i.e. the document that is currently being processed, if its overlap will be
+    resolved afterwards. A single instance is shared among all lookup annotators.
+    """
+
+    def __init__(self) -> None:
+        self._doc_ref: Optional[weakref.ref] = None
+
+    def enable(self, doc: Document) -> None:
+        """
+        Allow pruning nested matches for a document.
+
+        Args:
+            doc: The document.
+        """
+
+        self._doc_ref = weakref.ref(doc)
+
+    def is_enabled(self, doc: Document) -> bool:
+        """
+        Check whether pruning nested matches is allowed for a document.
+
+        Args:
+            doc: The document.
+
+        Returns:
+            ``True`` if pruning is allowed, ``False`` otherwise.
+        """
+
+        return self._doc_ref is not None and self._doc_ref() is doc
+
+    def __getstate__(self) -> dict:
+        return {"_doc_ref": None}
+
+
+class DeduceMultiTokenLookupAnnotator(dd.process.MultiTokenLookupAnnotator):
+    """
+    Matches lookup values against tokens, like the docdeid
+    ``MultiTokenLookupAnnotator``, optionally pruning nested matches as soon as they
+    are produced.
+
+    With ``overlapping=True``, a long lookup value (e.g. an institution name) also
+    produces matches for the shorter lookup values that are nested in it. As all
+    matches of an annotator have the same tag and priority, a nested match is certain
+    to be removed when overlap is resolved by priority and length (longest first).
+    Pruning should therefore only be used in that case, and when no other processor
+    uses the nested matches before overlap is resolved (e.g. a ``ContextAnnotator``
+    with the tag in its ``pre_tag``).
+
+    Args:
+        prune_nested: Whether to remove matches that are nested in another match of
+            this annotator.
+        nested_match_pruning: If provided, nested matches are only pruned for the
+            documents for which it is enabled, e.g. only when overlap will be resolved.
+    """
+
+    def __init__(
+        self,
+        *args,
+        prune_nested: bool = False,
+        nested_match_pruning: Optional[NestedMatchPruning] = None,
+        **kwargs,
+    ) -> None:
+        self.prune_nested = prune_nested
+        self.nested_match_pruning = nested_match_pruning
+        super().__init__(*args, **kwargs)
+
+    def annotate(self, doc: Document) -> list[Annotation]:
+        annotations = super().annotate(doc)
+
+        if not self.prune_nested or (
+            self.nested_match_pruning is not None
+            and not self.nested_match_pruning.is_enabled(doc)
+        ):
+            return annotations
+
+        pruned_annotations = []
+        max_end_char = -1
+
+        # Matches are produced by start token, so a match is nested in a preceding
+        # match if it does not extend beyond all of them.
+        for annotation in annotations:
+            if annotation.end_char > max_end_char:
+                pruned_annotations.append(annotation)
+                max_end_char = annotation.end_char
+
+        return pruned_annotations
+
+
+class RegexpAnnotator(dd.process.RegexpAnnotator):
+    """
+    Regexp annotator that skips documents in which its regexp cannot match. The literals
+    (or digits) required for a match are derived automatically from the regexp, and
+    checked once per text for all annotators using the same prefilter.
+
+    Args:
+        regexp_prefilter: The prefilter, that is typically shared among all regexp
+            annotators. A new one is created when none is provided.
+    """
+
+    def __init__(
+        self,
+        *args,
+        regexp_prefilter: Optional[RegexpPrefilter] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.regexp_prefilter = regexp_prefilter or RegexpPrefilter()
+        self._requirement = self.regexp_prefilter.add_regexp(self.regexp_pattern)
+
+    def annotate(self, doc: Document) -> list[Annotation]:
+        if not self.regexp_prefilter.may_match(self._requirement, doc):
+            return []
+
+        return super().annotate(doc)
+
+
 class RegexpPseudoAnnotator(RegexpAnnotator):
     """
     Regexp annotator that filters out matches preceded or followed by certain terms.
@@ -523,6 +1601,7 @@ class RegexpPseudoAnnotator(RegexpAnnotator):
         pre_pseudo: A list of strings that invalidate a match when preceding it
         post_pseudo: A list of strings that invalidate a match when following it
         lowercase: Whether to match lowercase
+        regexp_prefilter: The prefilter, see ``RegexpAnnotator``.
     """
 
     def __init__(
@@ -531,6 +1610,7 @@ class RegexpPseudoAnnotator(RegexpAnnotator):
         pre_pseudo: Optional[list[str]] = None,
         post_pseudo: Optional[list[str]] = None,
         lowercase: bool = True,
+        regexp_prefilter: Optional[RegexpPrefilter] = None,
         **kwargs,
     ) -> None:
 
@@ -538,7 +1618,7 @@ class RegexpPseudoAnnotator(RegexpAnnotator):
         self.post_pseudo = set(post_pseudo or [])
         self.lowercase = lowercase
 
-        super().__init__(*args, **kwargs)
+        super().__init__(*args, regexp_prefilter=regexp_prefilter, **kwargs)
 
     @staticmethod
     def _is_word_char(char: str) -> bool:
@@ -555,7 +1635,8 @@ class RegexpPseudoAnnotator(RegexpAnnotator):
 
     def _get_previous_word(self, char_index: int, text: str) -> str:
         """
-        Get the previous word starting at some character index.
+        Get the previous word starting at some character index. Only the whitespace and
+        word directly preceding the index are scanned, without copying the text.
 
         Args:
             char_index: The character index to start searching.
@@ -564,21 +1645,22 @@ class RegexpPseudoAnnotator(RegexpAnnotator):
         Returns: The previous word, or an empty string if at beginning of text.
         """
 
-        text = text[:char_index].strip()
-        result = ""
+        end = char_index
 
-        for ch in text[::-1]:
+        while end > 0 and text[end - 1].isspace():
+            end -= 1
 
-            if not self._is_word_char(ch):
-                break
+        start = end
 
-            result = ch + result
+        while start > 0 and self._is_word_char(text[start - 1]):
+            start -= 1
 
-        return result.strip()
+        return text[start:end].strip()
 
     def _get_next_word(self, char_index: int, text: str) -> str:
         """
-        Get the next word starting at some character index.
+        Get the next word starting at some character index. Only the whitespace and word
+        directly following the index are scanned, without copying the text.
 
         Args:
             char_index: The character index to start searching.
@@ -587,17 +1669,17 @@ class RegexpPseudoAnnotator(RegexpAnnotator):
         Returns: The next word, or an empty string if at end of text.
         """
 
-        text = text[char_index:].strip()
-        result = ""
+        start = char_index
 
-        for ch in text:
+        while start < len(text) and text[start].isspace():
+            start += 1
 
-            if not self._is_word_char(ch):
-                break
+        end = start
 
-            result = result + ch
+        while end < len(text) and self._is_word_char(text[end]):
+            end += 1
 
-        return result
+        return text[start:end]
 
     def _validate_match(self, match: re.Match, doc: Document) -> bool:
         """
@@ -0,0 +1,154 @@
+"""Contains logic for processing long texts in windows."""
+
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Union
+
+import docdeid as dd
+
+from deduce.utils import find_split
+
+
+@dataclass(frozen=True)
+class TextWindow:
+    """
+    A window of a longer text, along with some context on both sides.
+
+    Args:
+        text: The text of the window, including the context.
+        context_start: The position of the context in the full text.
+        start: The start of the window in the full text.
+        end: The end of the window in the full text.
+    """
+
+    text: str
+    context_start: int
+    start: int
+    end: int
+
+
+def check_window_args(window_size: int, margin: int) -> None:
+    """
+    Check the arguments for splitting a text in windows.
+
+    Args:
+        window_size: The max number of chars of a window.
+        margin: The number of chars of context on both sides of a window.
+
+    Raises:
+        ValueError: If the window size is not positive, or the margin is negative.
+    """
+
+    if window_size <= 0:
+        raise ValueError(f"The window size should be positive, got {window_size}.")
+
+    if margin < 0:
+        raise ValueError(f"The margin should not be negative, got {margin}.")
+
+
+def text_windows(
+    text: Union[str, Iterable[str]], window_size: int, margin: int
+) -> Iterator[TextWindow]:
+    """
+    Split a text in consecutive windows. Windows end at a blank line or line end where
+    possible (see :func:`deduce.utils.find_split`), and include ``margin`` chars of
+    context on both sides. Only the current window and its margins are kept in memory.
+
+    Args:
+        text: The text, or an iterable of consecutive chunks of it.
+        window_size: The max number of chars of a window.
+        margin: The number of chars of context on both sides of a window.
+
+    Returns:
+        An iterator over the windows.
+
+    Raises:
+        ValueError: If the window size is not positive, or the margin is negative.
+    """
+
+    check_window_args(window_size, margin)
+
+    chunks = iter([text] if isinstance(text, str) else text)
+
+    buffer = ""
+    buffer_start = 0
+    window_start = 0
+    exhausted = False
+
+    while True:
+        pieces = [buffer]
+        buffer_end = buffer_start + len(buffer)
+
+        while not exhausted and buffer_end < window_start + window_size + margin:
+            try:
+                pieces.append(next(chunks))
+                buffer_end += len(pieces[-1])
+            except StopIteration:
+                exhausted = True
+
+        buffer = "".join(pieces)
+
+        if exhausted and buffer_end <= window_start + window_size:
+            window_end = buffer_end
+        else:
+            window_end = buffer_start + find_split(
+                buffer,
+                window_start + window_size // 2 - buffer_start,
+                window_start + window_size - buffer_start,
+            )
+
+        context_start = max(buffer_start, window_start - margin)
+        context_end = min(buffer_end, window_end + margin)
+
+        yield TextWindow(
+            text=buffer[context_start - buffer_start : context_end - buffer_start],
+            context_start=context_start,
+            start=window_start,
+            end=window_end,
+        )
+
+        if window_end >= buffer_end and exhausted:
+            return
+
+        window_start = window_end
+
+        if window_start - margin > buffer_start:
+            buffer = buffer[window_start - margin - buffer_start :]
+            buffer_start = window_start - margin
+
+
+def stitch_annotations(
+    windows: Iterable[tuple[TextWindow, Iterable[dd.Annotation]]],
+) -> Iterator[dd.Annotation]:
+    """
+    Stitch the annotations of consecutive windows, by moving them to their position
+    in the full text. Annotations that start in the context of a window rather than in
+    the window itself, or that overlap an annotation of a preceding window, are
+    dropped.
+
+    Args:
+        windows: The windows, in order, each with the annotations of its text.
+
+    Returns:
+        An iterator over the annotations, in order of their position, without
+        tokens.
+    """
+
+    emitted_end = 0
+
+    for window, annotations in windows:
+        for annotation in sorted(annotations, key=lambda a: (a.start_char, a.end_char)):
+            start_char = window.context_start + annotation.start_char
+            end_char = window.context_start + annotation.end_char
+
+            if window.start <= start_char < window.end and (
+                start_char >= emitted_end or start_char == end_char
+            ):
+                emitted_end = max(emitted_end, end_char)
+
+                yield dd.Annotation(
+                    text=annotation.text,
+                    start_char=start_char,
+                    end_char=end_char,
+                    tag=annotation.tag,
+                    priority=annotation.priority,
+                )
@@ -1,31 +1,46 @@
+# pylint: disable=C0302
 """Loads Deduce and all its components."""
 
+import contextlib
+import functools
 import importlib.metadata
 import itertools
 import json
 import logging
+import operator
 import os
+import pickle
 import sys
 import warnings
 from pathlib import Path
-from typing import Any, Optional, Union
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, Literal, Optional, Union
 
 import docdeid as dd
 from deprecated import deprecated
 from frozendict import frozendict
 
-from deduce import utils
+from deduce import chunking, parallel, serialization, utils
 from deduce.annotation_processor import (
     CleanAnnotationTag,
     DeduceMergeAdjacentAnnotations,
+    DeduceOverlapResolver,
+    DeduceProcessorGroup,
     PersonAnnotationConverter,
     RemoveAnnotations,
 )
-from deduce.annotator import ContextAnnotator, TokenPatternAnnotator
+from deduce.annotator import (
+    ContextAnnotator,
+    DeduceMultiTokenLookupAnnotator,
+    NestedMatchPruning,
+    TokenPatternAnnotator,
+    TokenPatternEngine,
+)
 from deduce.lookup_struct_loader import load_interfix_lookup, load_prefix_lookup
 from deduce.lookup_structs import get_lookup_structs, load_raw_itemsets
+from deduce.prefilter import RegexpPrefilter
 from deduce.redactor import DeduceRedactor
-from deduce.tokenizer import DeduceTokenizer
+from deduce.tokenizer import DeduceTokenizer, PretokenizedTokenizer
 from deduce.data.lookup.src import all_lists
 
 __version__ = importlib.metadata.version(__package__ or __name__)
@@ -40,7 +55,7 @@ logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 warnings.simplefilter(action="default")
 
 
-class Deduce(dd.DocDeid):  # pylint: disable=R0903
+class Deduce(dd.DocDeid):  # pylint: disable=R0902,R0903
     """
     Main class for de-identifiation.
 
@@ -87,6 +102,12 @@ class Deduce(dd.DocDeid):  # pylint: disable=R0903
 
             config = config_file
 
+        self._init_kwargs = {
+            "load_base_config": load_base_config,
+            "config": config,
+            "lookup_data_path": lookup_data_path,
+        }
+
         self.config = self._initialize_config(
             load_base_config=load_base_config, user_config=config
         )
@@ -97,7 +118,12 @@ class Deduce(dd.DocDeid):  # pylint: disable=R0903
         else:
             self.lookup_data_path = Path(self._initialize_lookup_data_path(lookup_data_path))
         logging.info("Loading lookup data structures from: '" + str(self.lookup_data_path.absolute()) + "'.")
-        self.tokenizers = {"default": self._initialize_tokenizer(self.lookup_data_path)}
+        self.tokenizers = {
+            "default": self._initialize_tokenizer(
+                self.lookup_data_path,
+                engine=self.config.get("tokenizer_engine", "regexp"),
+            )
+        }
         
         if "all_lists" in self.config.keys():
             all_lists=self.config["all_lists"]
@@ -115,12 +141,558 @@ class Deduce(dd.DocDeid):  # pylint: disable=R0903
             build=build_lookup_structs,
         )
 
-        extras = {"tokenizer": self.tokenizers["default"], "ds": self.lookup_structs}
+        extras = {
+            "tokenizer": self.tokenizers["default"],
+            "ds": self.lookup_structs,
+            "regexp_prefilter": RegexpPrefilter(),
+            "pattern_engine": TokenPatternEngine(),
+            "nested_match_pruning": NestedMatchPruning(),
+        }
+
+        self._nested_match_pruning = extras["nested_match_pruning"]
 
         self.processors = _DeduceProcessorLoader().load(
             config=self.config, extras=extras
         )
 
+        self._components = self._get_components()
+
+    def _get_components(self) -> tuple:
+        """
+        Get the identity of the tokenizers and (nested) processors, to detect whether
+        they were replaced after creating the model.
+        """
+
+        def get_processors(group: dd.process.DocProcessorGroup) -> tuple:
+            return tuple(
+                (
+                    name,
+                    id(group[name]),
+                    (
+                        get_processors(group[name])
+                        if isinstance(group[name], dd.process.DocProcessorGroup)
+                        else None
+                    ),
+                )
+                for name in group.get_names(recursive=False)
+            )
+
+        return (
+            tuple((name, id(tokenizer)) for name, tokenizer in self.tokenizers.items()),
+            id(self.processors),
+            get_processors(self.processors),
+        )
+
+    def __reduce__(self) -> tuple:
+        """
+        Pickle a model by the arguments it was created with, so that it is created
+        again when unpickled (e.g. in a worker process), using the cached lookup
+        structures.
+
+        Raises:
+            pickle.PicklingError: If tokenizers or processors were added, removed or
+                replaced after creating the model, as these changes cannot be
+                pickled.
+        """
+
+        if self._get_components() != self._components:
+            raise pickle.PicklingError(
+                "Cannot pickle a Deduce model of which the tokenizers or processors "
+                "were changed after creating it, as it is pickled by the arguments it "
+                "was created with. Use a worker pool with the fork start method, or "
+                "specify the changes in the config."
+            )
+
+        return functools.partial(Deduce, **self._init_kwargs), ()
+
+    def deidentify(  # pylint: disable=R0913
+        self,
+        text: str,
+        enabled: Optional[set[str]] = None,
+        disabled: Optional[set[str]] = None,
+        metadata: Optional[dict] = None,
+        n_jobs: int = 1,
+        window_size: int = 100_000,
+        margin: int = 1_000,
+        pool: Optional[ProcessPoolExecutor] = None,
+    ) -> dd.Document:
+        """
+        De-identify a text, see ``docdeid.DocDeid.deidentify``. Lookup annotators only
+        prune nested matches (see ``prune_nested_matches`` in the config) when overlap
+        is resolved for this text, so that disabling the overlap resolver still gives
+        all matches.
+
+        With ``n_jobs`` larger than one, a text longer than ``window_size`` is split in
+        windows (see :meth:`Deduce.annotate_stream`), that are annotated on a pool of
+        worker processes. The annotations are then stitched together, and redacted
+        for the full text at once, so that the result is the same as processing the
+        text in one go. A pool created with :func:`deduce.parallel.create_pool` can
+        be passed, so that repeated calls use the same (warm) worker processes,
+        rather than starting a new pool for each text.
+
+        Args:
+            text: The input text, that needs de-identification.
+            enabled: A set of processors names that should be executed for this text.
+                Cannot be used with `disabled`.
+            disabled: A set of processors names that should not be executed for this
+                text. Cannot be used with `enabled`.
+            metadata: A dictionary containing additional information on this text,
+                that is accessible to processors.
+            n_jobs: The number of worker processes for long texts.
+            window_size: The max number of chars of a window, for long texts.
+            margin: The number of chars of context on both sides of a window, which
+                should exceed the length of the longest annotation.
+            pool: A pool of worker processes for this model, to use rather than
+                starting one for this text. It is not shut down afterwards.
+
+        Returns:
+            A ``docdeid.Document`` with the relevant information (e.g. annotations and
+            the deidentified text).
+
+        Raises:
+            ValueError: If ``n_jobs`` or ``window_size`` is not positive, or
+                ``margin`` is negative.
+        """
+
+        if n_jobs < 1:
+            raise ValueError(f"The number of jobs should be positive, got {n_jobs}.")
+
+        chunking.check_window_args(window_size, margin)
+
+        if n_jobs > 1 and len(text) > window_size:
+            return self._deidentify_parallel(
+                text, enabled, disabled, metadata, n_jobs, window_size, margin, pool
+            )
+
+        doc = dd.Document(text, tokenizers=self.tokenizers, metadata=metadata)
+
+        return self._process(doc, enabled, disabled)
+
+    def deidentify_tokens(  # pylint: disable=R0913
+        self,
+        text: str,
+        token_spans: Iterable[tuple[int, int]],
+        enabled: Optional[set[str]] = None,
+        disabled: Optional[set[str]] = None,
+        metadata: Optional[dict] = None,
+        merge_tokens: bool = True,
+    ) -> dd.Document:
+        """
+        De-identify a text that was already tokenized, e.g. by an upstream NLP
+        pipeline, using the precomputed tokens rather than tokenizing the text again.
+        Annotations are only found at token boundaries, so the tokens should split the
+        text at least as finely as the Deduce tokenizer does (i.e. split words from
+        punctuation).
+
+        Args:
+            text: The input text, that needs de-identification.
+            token_spans: The ``(start_char, end_char)`` of each token, in order.
+            enabled: A set of processors names that should be executed for this text.
+                Cannot be used with `disabled`.
+            disabled: A set of processors names that should not be executed for this
+                text. Cannot be used with `enabled`.
+            metadata: A dictionary containing additional information on this text,
+                that is accessible to processors.
+            merge_tokens: Whether to join tokens that form a single Deduce token, e.g.
+                name prefixes like ``van der``, as the Deduce tokenizer does.
+
+        Returns:
+            A ``docdeid.Document`` with the relevant information (e.g. annotations and
+            the deidentified text).
+
+        Raises:
+            ValueError: If the token spans are empty, unordered, overlapping or
+            outside the text.
+        """
+
+        table = self.tokenizers["default"].table_from_spans(
+            text, token_spans, merge=merge_tokens
+        )
+
+        doc = dd.Document(
+            text,
+            tokenizers={"default": PretokenizedTokenizer(text, table)},
+            metadata=metadata,
+        )
+
+        return self._process(doc, enabled, disabled)
+
+    def _process(
+        self,
+        doc: dd.Document,
+        enabled: Optional[set[str]] = None,
+        disabled: Optional[set[str]] = None,
+    ) -> dd.Document:
+        """Run the processors on a document."""
+
+        if self._is_enabled(("post_processing", "overlap_resolver"), enabled, disabled):
+            self._nested_match_pruning.enable(doc)
+
+        self.processors.process(doc, enabled=enabled, disabled=disabled)
+
+        return doc
+
+    @staticmethod
+    def _is_enabled(
+        names: Iterable[str],
+        enabled: Optional[set[str]] = None,
+        disabled: Optional[set[str]] = None,
+    ) -> bool:
+        """Whether all of the (nested) processors with these names will be run."""
+
+        return all(
+            (enabled is None or name in enabled)
+            and (disabled is None or name not in disabled)
+            for name in names
+        )
+
+    @staticmethod
+    def _without_redactor(
+        enabled: Optional[set[str]] = None,
+        disabled: Optional[set[str]] = None,
+    ) -> tuple[Optional[set[str]], Optional[set[str]]]:
+        """Get the enabled and disabled processors, with the redactor disabled."""
+
+        if enabled is not None:
+            return enabled - {"redactor"}, disabled
+
+        return None, {"redactor"} | (disabled or set())
+
+    def _deidentify_parallel(  # pylint: disable=R0913
+        self,
+        text: str,
+        enabled: Optional[set[str]],
+        disabled: Optional[set[str]],
+        metadata: Optional[dict],
+        n_jobs: int,
+        window_size: int,
+        margin: int,
+        pool: Optional[ProcessPoolExecutor],
+    ) -> dd.Document:
+        """De-identify a long text, by annotating windows of it in parallel."""
+
+        windows = list(chunking.text_windows(text, window_size, margin))
+
+        with contextlib.ExitStack() as stack:
+            if pool is None:
+                pool = stack.enter_context(
+                    parallel.create_pool(self, min(n_jobs, len(windows)))
+                )
+
+            results = zip(
+                windows,
+                pool.map(
+                    parallel.annotate_in_worker,
+                    [window.text for window in windows],
+                    itertools.repeat(metadata),
+                    *map(itertools.repeat, self._without_redactor(enabled, disabled)),
+                ),
+            )
+
+            annotations = list(
+                chunking.stitch_annotations(
+                    (window, serialization.decode(result, window.text)[0])
+                    for window, result in results
+                )
+            )
+
+        doc = dd.Document(text, tokenizers=self.tokenizers, metadata=metadata)
+        doc.annotations = dd.AnnotationSet(annotations)
+
+        if self._is_enabled(("post_processing", "redactor"), enabled, disabled):
+            self.processors["post_processing"]["redactor"].process(doc)
+
+        return doc
+
+    def deidentify_batch(  # pylint: disable=R0913
+        self,
+        texts: Iterable[str],
+        metadata: Optional[Union[dict, Iterable[Optional[dict]]]] = None,
+        enabled: Optional[set[str]] = None,
+        disabled: Optional[set[str]] = None,
+        n_jobs: int = 1,
+        chunksize: int = 16,
+        on_error: Literal["raise", "return"] = "raise",
+        shared_memory: bool = True,
+        pool: Optional[ProcessPoolExecutor] = None,
+    ) -> Iterator[Union[dd.Document, Exception]]:
+        """
+        De-identify many texts on a pool of worker processes, that are started once
+        with this model (including its lookup structures) loaded. Texts are read
+        ahead in windows of ``4 * n_jobs * chunksize`` texts, that are scheduled by
+        their estimated cost: large texts are sent to a worker first and on their
+        own, while small texts are packed into units of about equal cost, with a
+        size that is adapted to the measured processing time of previous units. The
+        documents are yielded in the order of the texts as they become available, so
+        that the texts can also be provided as a (lazy) iterable.
+
+        Args:
+            texts: The input texts, that need de-identification.
+            metadata: A dictionary containing additional information that is
+                accessible to processors, either for all texts, or an iterable with a
+                dictionary (or ``None``) for each text.
+            enabled: A set of processors names that should be executed for each text.
+                Cannot be used with `disabled`.
+            disabled: A set of processors names that should not be executed for each
+                text. Cannot be used with `enabled`.
+            n_jobs: The number of worker processes. With ``1``, the texts are
+                de-identified in this process.
+            chunksize: The max number of texts that are sent to a worker at once.
+            on_error: What to do when de-identifying a text raises an exception: with
+                ``raise``, it is raised again after the documents of preceding texts
+                are yielded, with ``return``, the exception is yielded in place of the
+                document and the other texts are still processed.
+            shared_memory: Whether to put the texts of a window in a shared memory
+                block, to which the workers also write their results, rather than
+                sending texts and results between processes.
+            pool: A pool of ``n_jobs`` worker processes for this model (see
+                :func:`deduce.parallel.create_pool`), to use rather than starting
+                one for this batch. It is not shut down afterwards.
+
+        Returns:
+            An iterator over ``docdeid.Document`` with the annotations (without
+            tokens) and deidentified text, in the order of the texts, or an
+            exception for texts that could not be de-identified.
+
+        Raises:
+            ValueError: If ``n_jobs`` or ``chunksize`` is not positive, or if the
+                metadata is an iterable that turns out to differ in length from the
+                texts.
+        """
+
+        if on_error not in ("raise", "return"):
+            raise ValueError(f"Unknown on_error value {on_error}")
+
+        if n_jobs < 1 or chunksize < 1:
+            raise ValueError(
+                f"The number of jobs and the chunk size should be positive, got "
+                f"{n_jobs} and {chunksize}."
+            )
+
+        if metadata is None or isinstance(metadata, dict):
+            items = zip(texts, itertools.repeat(metadata))
+        else:
+            items = self._zip_metadata(texts, metadata)
+
+        if n_jobs == 1:
+            results = self._deidentify_items(items, enabled, disabled)
+        else:
+            results = parallel.BatchRunner(
+                self,
+                n_jobs,
+                chunksize,
+                enabled,
+                disabled,
+                use_shared_memory=shared_memory,
+                pool=pool,
+            ).run(items)
+
+        for (text, doc_metadata), result in results:
+            if isinstance(result, Exception):
+                if on_error == "raise":
+                    raise result
+
+                yield result
+            elif isinstance(result, dd.Document):
+                yield result
+            else:
+                yield self._decode_document(text, doc_metadata, result)
+
+    def _deidentify_items(
+        self,
+        items: Iterable[tuple[str, Optional[dict]]],
+        enabled: Optional[set[str]],
+        disabled: Optional[set[str]],
+    ) -> Iterator[tuple[tuple[str, Optional[dict]], Union[dd.Document, Exception]]]:
+        """De-identify texts in this process, returning the exception if one fails."""
+
+        for item in items:
+            try:
+                yield item, self.deidentify(item[0], enabled, disabled, item[1])
+            except Exception as exception:  # pylint: disable=W0703
+                yield item, exception
+
+    @staticmethod
+    def _zip_metadata(
+        texts: Iterable[str], metadata: Iterable[Optional[dict]]
+    ) -> Iterator[tuple[str, Optional[dict]]]:
+        """Pair each text with its metadata, checking that both are equally long."""
+
+        missing = object()
+
+        for text, doc_metadata in itertools.zip_longest(
+            texts, metadata, fillvalue=missing
+        ):
+            if text is missing or doc_metadata is missing:
+                raise ValueError("The texts and metadata differ in length.")
+
+            yield text, doc_metadata
+
+    def _decode_document(
+        self, text: str, metadata: Optional[dict], result: bytes
+    ) -> dd.Document:
+        """Create a document from the encoded result of a worker."""
+
+        annotations, deidentified_text = serialization.decode(result, text)
+
+        doc = dd.Document(text, tokenizers=self.tokenizers, metadata=metadata)
+        doc.annotations = dd.AnnotationSet(annotations)
+
+        if deidentified_text is not None:
+            doc.set_deidentified_text(deidentified_text)
+
+        return doc
+
+    def _process_to_list(
+        self,
+        text: str,
+        enabled: Optional[set[str]],
+        disabled: Optional[set[str]],
+        metadata: Optional[dict],
+    ) -> list[dd.Annotation]:
+        """
+        Run the processors on a text, and return the resulting annotations as a list,
+        without building an ``AnnotationSet`` after the last post processing stage.
+        """
+
+        doc = dd.Document(text, tokenizers=self.tokenizers, metadata=metadata)
+
+        if self._is_enabled(("post_processing", "overlap_resolver"), enabled, disabled):
+            self._nested_match_pruning.enable(doc)
+
+        return self.processors.process_to_list(doc, enabled=enabled, disabled=disabled)
+
+    def deidentify_offsets(
+        self,
+        text: str,
+        enabled: Optional[set[str]] = None,
+        disabled: Optional[set[str]] = None,
+        metadata: Optional[dict] = None,
+    ) -> list[tuple[int, int, str]]:
+        """
+        De-identify a text, but only return the offsets and tags of the annotations.
+        The redactor is skipped, and the annotations of the last post processing stage
+        are turned into tuples right away, rather than into a document with an
+        ``AnnotationSet``. Nothing that refers to the tokens of the text is retained.
+
+        Args:
+            text: The input text, that needs de-identification.
+            enabled: A set of processors names that should be executed for this text.
+                Cannot be used with `disabled`.
+            disabled: A set of processors names that should not be executed for this
+                text. Cannot be used with `enabled`.
+            metadata: A dictionary containing additional information on this text,
+                that is accessible to processors.
+
+        Returns:
+            The annotations, as ``(start_char, end_char, tag)`` tuples sorted by
+            position.
+        """
+
+        annotations = self._process_to_list(
+            text, *self._without_redactor(enabled, disabled), metadata
+        )
+
+        return sorted(
+            (annotation.start_char, annotation.end_char, annotation.tag)
+            for annotation in annotations
+        )
+
+    def deidentify_text(
+        self,
+        text: str,
+        enabled: Optional[set[str]] = None,
+        disabled: Optional[set[str]] = None,
+        metadata: Optional[dict] = None,
+    ) -> str:
+        """
+        De-identify a text, and only return the de-identified text. The annotations of
+        the last post processing stage are passed to the redactor as a list (see
+        :meth:`DeduceRedactor.redact_to`), rather than set on a document with an
+        ``AnnotationSet``. The redactor should be the last post processor, as it is
+        by default.
+
+        Args:
+            text: The input text, that needs de-identification.
+            enabled: A set of processors names that should be executed for this text.
+                Cannot be used with `disabled`.
+            disabled: A set of processors names that should not be executed for this
+                text. Cannot be used with `enabled`.
+            metadata: A dictionary containing additional information on this text,
+                that is accessible to processors.
+
+        Returns:
+            The de-identified text.
+
+        Raises:
+            ValueError: If the redactor is not executed, so that there is no
+                de-identified text.
+        """
+
+        if not self._is_enabled(("post_processing", "redactor"), enabled, disabled):
+            raise ValueError(
+                "Cannot return the de-identified text, when the redactor is not "
+                "executed."
+            )
+
+        annotations = self._process_to_list(
+            text, *self._without_redactor(enabled, disabled), metadata
+        )
+
+        segments: list[str] = []
+        self.processors["post_processing"]["redactor"].redact_to(
+            text, annotations, segments.append
+        )
+
+        return "".join(segments)
+
+    def annotate_stream(  # pylint: disable=R0913
+        self,
+        text: Union[str, Iterable[str]],
+        metadata: Optional[dict] = None,
+        disabled: Optional[set[str]] = None,
+        window_size: int = 100_000,
+        margin: int = 1_000,
+    ) -> Iterator[dd.Annotation]:
+        """
+        De-identify a (very large) text in windows, and emit the annotations with
+        offsets in the full text as soon as each window is processed. Windows end at a
+        blank line or line end where possible, and are processed along with ``margin``
+        chars of context on both sides, so that lookups and patterns near the edge of
+        a window match as they would in the full text. Only the current window and its
+        margins are kept in memory, so the text can also be provided as an iterable of
+        chunks, e.g. an open file.
+
+        Args:
+            text: The input text, or an iterable of consecutive chunks of it.
+            metadata: A dictionary containing additional information on this text,
+                that is accessible to processors.
+            disabled: A set of processors names that should not be executed for this
+                text. The redactor is always skipped.
+            window_size: The max number of chars of a window.
+            margin: The number of chars of context on both sides of a window, which
+                should exceed the length of the longest annotation.
+
+        Returns:
+            An iterator over the annotations, in order of their position, without
+            tokens.
+
+        Raises:
+            ValueError: If ``window_size`` is not positive, or ``margin`` is negative.
+        """
+
+        disabled = {"redactor"} | (disabled or set())
+
+        yield from chunking.stitch_annotations(
+            (
+                window,
+                self.deidentify(
+                    window.text, disabled=disabled, metadata=metadata
+                ).annotations,
+            )
+            for window in chunking.text_windows(text, window_size, margin)
+        )
+
     @staticmethod
     def _initialize_config(
         load_base_config: bool = True,
@@ -163,7 +735,9 @@ class Deduce(dd.DocDeid):  # pylint: disable=R0903
         return lookup_data_path
 
     @staticmethod
-    def _initialize_tokenizer(lookup_data_path: Path) -> dd.Tokenizer:
+    def _initialize_tokenizer(
+        lookup_data_path: Path, engine: Literal["regexp", "table"] = "regexp"
+    ) -> dd.Tokenizer:
 
         raw_itemsets = load_raw_itemsets(
             base_path=lookup_data_path,
@@ -175,7 +749,7 @@ class Deduce(dd.DocDeid):  # pylint: disable=R0903
 
         merge_terms = itertools.chain(prefix.items(), interfix.items())
 
-        return DeduceTokenizer(merge_terms=merge_terms)
+        return DeduceTokenizer(merge_terms=merge_terms, engine=engine)
 
 
 class _DeduceProcessorLoader:  # pylint: disable=R0903
@@ -202,7 +776,7 @@ class _DeduceProcessorLoader:  # pylint: disable=R0903
                 f"{type(lookup_struct)} to MultiTokenLookupAnnotator"
             )
 
-        return dd.process.MultiTokenLookupAnnotator(**args)
+        return DeduceMultiTokenLookupAnnotator(**args)
 
     @deprecated(
         "The multi_token annotatortype is deprecated and will be removed in a "
@@ -321,13 +895,57 @@ class _DeduceProcessorLoader:  # pylint: disable=R0903
             group = existing_group
 
         else:
-            group = dd.process.DocProcessorGroup()
+            group = DeduceProcessorGroup()
             processors.add_processor(group_name, group)
 
         return group
 
+    @staticmethod
+    def _get_prunable_tags(config: frozendict) -> set[str]:
+        """
+        Get the tags of lookup annotators that may prune nested matches (see
+        ``DeduceMultiTokenLookupAnnotator``). Requires ``prune_nested_matches`` to be
+        enabled, overlap to be resolved by priority and then by length (longest first),
+        and the tag not to be used by any context pattern.
+        """
+
+        if not config.get("prune_nested_matches", False):
+            return set()
+
+        strategy = config["resolve_overlap_strategy"]
+
+        for attr, ascending in zip(strategy["attributes"], strategy["ascending"]):
+            if attr == "length":
+                if ascending:
+                    return set()
+                break
+
+            if attr != "priority":
+                return set()
+        else:
+            return set()
+
+        context_tags = set()
+
+        for annotator_info in config["annotators"].values():
+            patterns = annotator_info["args"].get("pattern")
+
+            if isinstance(patterns, list):
+                for pattern in patterns:
+                    if isinstance(pattern, dict) and "pre_tag" in pattern:
+                        context_tags.update(pattern["pre_tag"])
+
+        return {
+            annotator_info["args"]["tag"]
+            for annotator_info in config["annotators"].values()
+            if "tag" in annotator_info["args"]
+        } - context_tags
+
     def _load_annotators(
-        self, config: frozendict, extras: dict
+        self,
+        config: frozendict,
+        extras: dict,
+        prunable_tags: Optional[set[str]] = None,
     ) -> dd.process.DocProcessorGroup:
 
         annotator_creators = {
@@ -340,7 +958,7 @@ class _DeduceProcessorLoader:  # pylint: disable=R0903
             "custom": self._get_custom_annotator,
         }
 
-        annotators = dd.process.DocProcessorGroup()
+        annotators = DeduceProcessorGroup()
 
         for annotator_name, annotator_info in config.items():
 
@@ -351,6 +969,18 @@ class _DeduceProcessorLoader:  # pylint: disable=R0903
             annotator_type = annotator_info["annotator_type"]
             args = annotator_info["args"]
 
+            if (
+                annotator_type
+                in ("docdeid.process.MultiTokenLookupAnnotator", "multi_token")
+                and args.get("overlapping", False)
+                and args.get("tag") in (prunable_tags or set())
+            ):
+                args = dict(
+                    args,
+                    prune_nested=True,
+                    nested_match_pruning=extras["nested_match_pruning"],
+                )
+
             if annotator_type in annotator_creators:
                 annotator = annotator_creators[annotator_type](args, extras)
             else:
@@ -398,11 +1028,13 @@ class _DeduceProcessorLoader:  # pylint: disable=R0903
 
         for attr, ascending in zip(sort_by_attrs, sort_by_ascending):
             sort_by.append(attr)
-            sort_by_callbacks[attr] = (lambda x: x) if ascending else (lambda y: -y)
+
+            if not ascending:
+                sort_by_callbacks[attr] = operator.neg
 
         post_group.add_processor(
             "overlap_resolver",
-            dd.process.OverlapResolver(
+            DeduceOverlapResolver(
                 sort_by=tuple(sort_by), sort_by_callbacks=frozendict(sort_by_callbacks)
             ),
         )
@@ -436,7 +1068,11 @@ class _DeduceProcessorLoader:  # pylint: disable=R0903
             A docprocessorgroup containing all annotators/processors.
         """
 
-        processors = self._load_annotators(config=config["annotators"], extras=extras)
+        processors = self._load_annotators(
+            config=config["annotators"],
+            extras=extras,
+            prunable_tags=self._get_prunable_tags(config),
+        )
 
         self._load_name_processors(
             name_group=self._get_or_create_annotator_group(
@@ -450,7 +1086,7 @@ class _DeduceProcessorLoader:  # pylint: disable=R0903
             )
         )
 
-        post_group = dd.process.DocProcessorGroup()
+        post_group = DeduceProcessorGroup()
         processors.add_processor("post_processing", post_group)
 
         self._load_post_processors(config=config, post_group=post_group)
@@ -0,0 +1,443 @@
+"""Contains logic for processing texts on a pool of worker processes."""
+
+import contextlib
+import itertools
+import multiprocessing
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Iterator, Optional, Sequence, Union
+
+from deduce import scheduling, serialization
+
+_WORKER_STATE: dict[str, Any] = {}
+"""The state of a worker process, i.e. its ``Deduce`` model."""
+
+_RESULT_OVERHEAD = 1_024
+"""The room for the encoded result of a text in a result slot, apart from its size."""
+
+_ARENAS_IN_USE = 2
+"""The number of arenas used by a pool, i.e. for the window being collected and for
+the next window."""
+
+
+def _init_worker(model: Any) -> None:
+    """Initialize a worker process with the model."""
+
+    _WORKER_STATE["model"] = model
+
+
+def create_pool(
+    model: Any,
+    n_jobs: int,
+    mp_context: Optional[multiprocessing.context.BaseContext] = None,
+) -> ProcessPoolExecutor:
+    """
+    Create a pool of worker processes, that each have the model loaded once. With the
+    fork start method, workers share the lookup structures of the model without
+    copying them. Otherwise, the model is pickled, and created again by each worker
+    from the same arguments (see :meth:`deduce.Deduce.__reduce__`).
+
+    Args:
+        model: The ``Deduce`` model.
+        n_jobs: The number of worker processes.
+        mp_context: The multiprocessing context, that determines how workers are
+            started. By default, the default start method of the platform is used.
+
+    Returns:
+        The pool.
+    """
+
+    return ProcessPoolExecutor(
+        max_workers=n_jobs,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(model,),
+    )
+
+
+def annotate_in_worker(
+    text: str,
+    metadata: Optional[dict],
+    enabled: Optional[set[str]],
+    disabled: Optional[set[str]],
+) -> bytes:
+    """
+    Annotate a text with the model of this worker.
+
+    Args:
+        text: The text.
+        metadata: The metadata of the text.
+        enabled: The processors to run, if not all.
+        disabled: The processors not to run, if any.
+
+    Returns:
+        The annotations, encoded with :func:`deduce.serialization.encode` (without
+        annotation texts).
+    """
+
+    doc = _WORKER_STATE["model"].deidentify(
+        text, enabled=enabled, disabled=disabled, metadata=metadata
+    )
+
+    return serialization.encode(doc.annotations)
+
+
+def deidentify_in_worker(
+    items: list[tuple[str, Optional[dict]]],
+    enabled: Optional[set[str]],
+    disabled: Optional[set[str]],
+) -> tuple[list[Union[bytes, Exception]], float]:
+    """
+    De-identify a chunk of texts with the model of this worker. An exception raised
+    for one of the texts is returned in place of its result, so that the other texts
+    are still processed.
+
+    Args:
+        items: The texts, each with its metadata.
+        enabled: The processors to run, if not all.
+        disabled: The processors not to run, if any.
+
+    Returns:
+        For each text, its annotations and de-identified text encoded with
+        :func:`deduce.serialization.encode` (without annotation texts), or the
+        exception, along with the processing time of the chunk in seconds.
+    """
+
+    start_time = time.perf_counter()
+
+    results = [
+        _deidentify_item(text, metadata, enabled, disabled) for text, metadata in items
+    ]
+
+    return results, time.perf_counter() - start_time
+
+
+def deidentify_shared_in_worker(
+    arena_name: str,
+    items: list[tuple[Any, Optional[dict]]],
+    result_slot: slice,
+    enabled: Optional[set[str]],
+    disabled: Optional[set[str]],
+) -> tuple[list[Union[slice, bytes, Exception]], float]:
+    """
+    De-identify a chunk of texts in a :class:`SharedArena` with the model of this
+    worker. The texts are decoded from the arena, and the encoded results are written
+    to the result slot of the chunk in the arena, as far as they fit.
+
+    Args:
+        arena_name: The name of the shared memory block of the arena.
+        items: The position of each text in the arena (or the text itself, if it is
+            not in the arena), with its metadata.
+        result_slot: The position of the result slot of the chunk in the arena.
+        enabled: The processors to run, if not all.
+        disabled: The processors not to run, if any.
+
+    Returns:
+        For each text, the position of its encoded result in the arena, the encoded
+        result itself if it did not fit, or the exception, along with the processing
+        time of the chunk in seconds.
+    """
+
+    start_time = time.perf_counter()
+    results: list[Union[slice, bytes, Exception]] = []
+
+    arena = _attach_arena(arena_name)
+    pos = result_slot.start
+
+    for text, metadata in items:
+        if isinstance(text, slice):
+            text = str(arena.buf[text], "utf-8")
+
+        result = _deidentify_item(text, metadata, enabled, disabled)
+
+        if isinstance(result, bytes) and pos + len(result) <= result_slot.stop:
+            arena.buf[pos : pos + len(result)] = result
+            result = slice(pos, pos + len(result))
+            pos = result.stop
+
+        results.append(result)
+
+    return results, time.perf_counter() - start_time
+
+
+def _attach_arena(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to the shared memory block of an arena, or reuse the attachment from a
+    previous chunk. Attachments to arenas that are no longer used are closed.
+    """
+
+    arenas = _WORKER_STATE.setdefault("arenas", {})
+
+    if name not in arenas:
+        while len(arenas) >= _ARENAS_IN_USE:
+            arenas.pop(next(iter(arenas))).close()
+
+        arenas[name] = shared_memory.SharedMemory(name=name)
+
+    return arenas[name]
+
+
+def _deidentify_item(
+    text: str,
+    metadata: Optional[dict],
+    enabled: Optional[set[str]],
+    disabled: Optional[set[str]],
+) -> Union[bytes, Exception]:
+    """De-identify a text, and return the encoded result or the exception."""
+
+    try:
+        doc = _WORKER_STATE["model"].deidentify(
+            text, enabled=enabled, disabled=disabled, metadata=metadata
+        )
+    except Exception as exception:  # pylint: disable=W0703
+        return exception
+
+    return serialization.encode(doc.annotations, doc.deidentified_text)
+
+
+class SharedArena:
+    """
+    A block of shared memory, that holds texts for worker processes, followed by a
+    result slot for each chunk of texts, to which the workers write the encoded
+    results. Only the positions of texts and slots are sent to the workers, rather
+    than pickled texts and results. A result slot has room for twice the size of its
+    texts, plus some overhead per text. Results that do not fit are returned to the
+    pool instead. An arena is reused for consecutive windows of texts, so that its
+    memory is only allocated once, and is only replaced by a larger block when
+    needed.
+    """
+
+    def __init__(self) -> None:
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self.texts: list[Any] = []
+        self.result_slots: list[slice] = []
+
+    @property
+    def name(self) -> str:
+        """The name of the shared memory block, used by workers to attach to it."""
+
+        if self._shm is None:
+            raise RuntimeError("Cannot get the name of an empty arena.")
+
+        return self._shm.name
+
+    def load(self, texts: Sequence[Any], chunks: list[list[int]]) -> None:
+        """
+        Put texts in the arena, replacing the previous texts, and reserve a result
+        slot for each chunk of them.
+
+        Args:
+            texts: The texts. Inputs that are not a string (and that will fail to be
+                processed) are not put in the arena.
+            chunks: The indices of the texts in each chunk.
+        """
+
+        encoded_texts = [
+            text.encode("utf-8") if isinstance(text, str) else b"" for text in texts
+        ]
+
+        slot_sizes = [
+            sum(2 * len(encoded_texts[i]) + _RESULT_OVERHEAD for i in chunk)
+            for chunk in chunks
+        ]
+        size = max(1, sum(map(len, encoded_texts)) + sum(slot_sizes))
+
+        if self._shm is None or self._shm.size < size:
+            self.close()
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+
+        self.texts = []
+        self.result_slots = []
+        pos = 0
+
+        for text, encoded_text in zip(texts, encoded_texts):
+            if not isinstance(text, str):
+                self.texts.append(text)
+                continue
+
+            self._shm.buf[pos : pos + len(encoded_text)] = encoded_text
+            self.texts.append(slice(pos, pos + len(encoded_text)))
+            pos += len(encoded_text)
+
+        for slot_size in slot_sizes:
+            self.result_slots.append(slice(pos, pos + slot_size))
+            pos += slot_size
+
+    def read(self, span: slice) -> bytes:
+        """
+        Read bytes from the arena.
+
+        Args:
+            span: The position of the bytes.
+
+        Returns:
+            The bytes.
+        """
+
+        if self._shm is None:
+            raise RuntimeError("Cannot read from an empty arena.")
+
+        return bytes(self._shm.buf[span])
+
+    def close(self) -> None:
+        """Close the arena, and release the shared memory."""
+
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self) -> "SharedArena":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class BatchRunner:  # pylint: disable=R0902,R0903
+    """
+    De-identifies many texts on a pool of worker processes. Texts are read ahead in
+    windows of ``4 * n_jobs * chunksize`` texts, that are packed into chunks of
+    about equal estimated cost (see :mod:`deduce.scheduling`), that are submitted
+    largest first. The next window is submitted before waiting for the chunks of the
+    previous one, so that the workers stay busy. With shared memory, two arenas are
+    used in turn, for the window that is submitted and the window that is collected.
+
+    Args:
+        model: The ``Deduce`` model.
+        n_jobs: The number of worker processes.
+        chunksize: The max number of texts in a chunk.
+        enabled: The processors to run, if not all.
+        disabled: The processors not to run, if any.
+        use_shared_memory: Whether to send texts and results through a
+            :class:`SharedArena`, rather than pickling them.
+        pool: A pool created with :func:`create_pool`, to use rather than starting
+            one for each run. It is not shut down afterwards.
+    """
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        model: Any,
+        n_jobs: int,
+        chunksize: int,
+        enabled: Optional[set[str]] = None,
+        disabled: Optional[set[str]] = None,
+        use_shared_memory: bool = True,
+        pool: Optional[ProcessPoolExecutor] = None,
+    ) -> None:
+        self.model = model
+        self.n_jobs = n_jobs
+        self.chunksize = chunksize
+        self.enabled = enabled
+        self.disabled = disabled
+        self.use_shared_memory = use_shared_memory
+        self.pool = pool
+        self.unit_sizer = scheduling.UnitSizer()
+
+    def run(
+        self, items: Iterator[tuple[Any, Optional[dict]]]
+    ) -> Iterator[tuple[tuple[Any, Optional[dict]], Union[bytes, Exception]]]:
+        """
+        De-identify texts. The arenas (and the pool, if started for this run) are
+        released when done, also when iteration stops early.
+
+        Args:
+            items: The texts, each with its metadata.
+
+        Returns:
+            An iterator over the texts with their metadata, in order, each with its
+            result encoded with :func:`deduce.serialization.encode` (without
+            annotation texts), or the exception.
+        """
+
+        with contextlib.ExitStack() as stack:
+            arenas = itertools.cycle(
+                [stack.enter_context(SharedArena()) for _ in range(_ARENAS_IN_USE)]
+            )
+            pool = self.pool
+
+            if pool is None:
+                pool = stack.enter_context(create_pool(self.model, self.n_jobs))
+
+            submitted = None
+
+            while True:
+                window = list(itertools.islice(items, 4 * self.n_jobs * self.chunksize))
+                arena = next(arenas) if self.use_shared_memory else None
+                next_submitted = self._submit(pool, window, arena)
+
+                if submitted is not None:
+                    yield from self._collect(*submitted)
+
+                if len(window) == 0:
+                    return
+
+                submitted = next_submitted
+
+    def _submit(
+        self,
+        pool: ProcessPoolExecutor,
+        window: list[tuple[Any, Optional[dict]]],
+        arena: Optional[SharedArena],
+    ) -> tuple:
+        """Pack a window of texts into chunks, and submit them to the pool."""
+
+        costs = [scheduling.estimate_cost(text) for text, _ in window]
+
+        target_cost = min(self.unit_sizer.target_cost(), sum(costs) / (2 * self.n_jobs))
+        chunks = scheduling.pack_units(costs, target_cost, self.chunksize)
+
+        if arena is None:
+            futures = [
+                pool.submit(
+                    deidentify_in_worker,
+                    [window[i] for i in chunk],
+                    self.enabled,
+                    self.disabled,
+                )
+                for chunk in chunks
+            ]
+        else:
+            arena.load([text for text, _ in window], chunks)
+
+            futures = [
+                pool.submit(
+                    deidentify_shared_in_worker,
+                    arena.name,
+                    [(arena.texts[i], window[i][1]) for i in chunk],
+                    result_slot,
+                    self.enabled,
+                    self.disabled,
+                )
+                for chunk, result_slot in zip(chunks, arena.result_slots)
+            ]
+
+        return window, costs, chunks, futures, arena
+
+    def _collect(  # pylint: disable=R0913
+        self,
+        window: list[tuple[Any, Optional[dict]]],
+        costs: list[int],
+        chunks: list[list[int]],
+        futures: list[Future],
+        arena: Optional[SharedArena],
+    ) -> Iterator[tuple[tuple[Any, Optional[dict]], Union[bytes, Exception]]]:
+        """
+        Wait for the chunks of a window of texts, record their processing time, and
+        return the results in the order of the texts.
+        """
+
+        results: list = [None] * len(window)
+
+        for chunk, future in zip(chunks, futures):
+            chunk_results, seconds = future.result()
+            self.unit_sizer.record(sum(costs[i] for i in chunk), seconds)
+
+            for i, result in zip(chunk, chunk_results):
+                if isinstance(result, slice):
+                    result = arena.read(result)  # type: ignore[union-attr]
+
+                results[i] = result
+
+        return zip(window, results)
@@ -0,0 +1,520 @@
+# pylint: disable=E1101
+"""Contains logic for skipping regexps that cannot match a document."""
+
+import re
+import string
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Union
+
+import docdeid as dd
+
+try:
+    from re import _constants as sre_constants  # type: ignore[attr-defined]
+    from re import _parser as sre_parse  # type: ignore[attr-defined]
+except ImportError:  # pragma: no cover, python < 3.11
+    import sre_constants  # pylint: disable=W4901
+    import sre_parse  # pylint: disable=W4901
+
+_MAX_FINITE_STRINGS = 64
+"""The max number of strings a pattern element may expand to, before it is no
+longer treated as a finite set of literals."""
+
+_DIGIT = "\\d"
+"""Regexp fragment for the digit character class atom."""
+
+_CASE_FOLDS = str.maketrans(
+    string.ascii_uppercase + "\u0130\u0131\u017f\u212a",
+    string.ascii_lowercase + "iisk",
+)
+"""Folds the case of a text, for finding ASCII literals case insensitively: maps each
+char that ``re.IGNORECASE`` matches to an ASCII letter to that letter in lowercase,
+i.e. also the dotted and dotless i, the long s and the Kelvin sign."""
+
+_REPEAT_OPS = {
+    sre_constants.MAX_REPEAT,
+    sre_constants.MIN_REPEAT,
+    getattr(sre_constants, "POSSESSIVE_REPEAT", sre_constants.MAX_REPEAT),
+}
+
+_ZERO_WIDTH_OPS = {
+    sre_constants.AT,
+    sre_constants.ASSERT,
+    sre_constants.ASSERT_NOT,
+}
+
+
+@dataclass(frozen=True)
+class _Atom:
+    """Something that must be present in a text: a literal or the digit class."""
+
+    text: str
+    ignorecase: bool = False
+    is_digit: bool = False
+
+    def to_regexp(self) -> str:
+        """Get a regexp fragment that matches this atom."""
+
+        if self.is_digit:
+            return _DIGIT
+
+        if self.ignorecase:
+            return f"(?i:{re.escape(self.text)})"
+
+        return re.escape(self.text)
+
+    def implies(self, other: "_Atom") -> bool:
+        """Whether presence of this atom in a text guarantees presence of other."""
+
+        if self == other:
+            return True
+
+        if self.is_digit:
+            return False
+
+        if other.is_digit:
+            return any(ch in "0123456789" for ch in self.text)
+
+        return other.text in self.text and (other.ignorecase or not self.ignorecase)
+
+
+_DIGIT_ATOM = _Atom(text=_DIGIT, is_digit=True)
+
+_Clause = frozenset  # of _Atom, of which at least one must be present
+
+
+@dataclass(frozen=True)
+class _Finite:
+    """A pattern element that matches one of a small, finite set of strings."""
+
+    strings: frozenset
+    ignorecase: bool
+
+    def to_clauses(self) -> list[_Clause]:
+        """Get the clause requiring any of the strings, if none of them is empty."""
+
+        if "" in self.strings:
+            return []
+
+        return [
+            _simplify(_Atom(text=s, ignorecase=self.ignorecase) for s in self.strings)
+        ]
+
+
+def _simplify(atoms: Union[set, frozenset, list, tuple]) -> _Clause:
+    """
+    Drop atoms from a clause that imply another atom of the same clause, e.g. drop
+    ``januari`` when ``jan`` is also present.
+    """
+
+    atoms = set(atoms)
+
+    return _Clause(
+        atom
+        for atom in atoms
+        if not any(
+            atom.implies(other) and not other.implies(atom)
+            for other in atoms
+            if other != atom
+        )
+    )
+
+
+def _clause_score(clause: _Clause) -> int:
+    """Rough selectivity of a clause, used for picking one clause per alternative."""
+
+    return min((1 if atom.is_digit else len(atom.text)) for atom in clause)
+
+
+def _concat(left: _Finite, right: _Finite) -> Optional[_Finite]:
+    if len(left.strings) * len(right.strings) > _MAX_FINITE_STRINGS:
+        return None
+
+    return _Finite(
+        strings=frozenset(a + b for a in left.strings for b in right.strings),
+        ignorecase=left.ignorecase or right.ignorecase,
+    )
+
+
+def _analyze_in(items: list, ignorecase: bool) -> Union[_Finite, list[_Clause]]:
+    """Analyze a character class."""
+
+    if any(op == sre_constants.NEGATE for op, _ in items):
+        return []
+
+    if all(op == sre_constants.LITERAL for op, _ in items):
+        chars = {chr(av) for _, av in items}
+
+        if len({ch.lower() for ch in chars}) == 1 and len(chars) > 1:
+            return _Finite(strings=frozenset({min(chars).lower()}), ignorecase=True)
+
+        return _Finite(strings=frozenset(chars), ignorecase=ignorecase)
+
+    for op, av in items:
+        if op == sre_constants.CATEGORY and av == sre_constants.CATEGORY_DIGIT:
+            continue
+        if op == sre_constants.LITERAL and chr(av) in "0123456789":
+            continue
+        if op == sre_constants.RANGE and ord("0") <= av[0] <= av[1] <= ord("9"):
+            continue
+
+        return []
+
+    return [_Clause({_DIGIT_ATOM})]
+
+
+def _analyze_branch(
+    alternatives: list, ignorecase: bool
+) -> Union[_Finite, list[_Clause]]:
+    """Analyze an alternation, which requires any of its alternatives."""
+
+    results = [_analyze_seq(alternative, ignorecase) for alternative in alternatives]
+
+    if all(isinstance(result, _Finite) for result in results):
+        strings = frozenset().union(*(result.strings for result in results))
+
+        if len(strings) <= _MAX_FINITE_STRINGS:
+            return _Finite(
+                strings=strings,
+                ignorecase=any(result.ignorecase for result in results),
+            )
+
+    atoms: set[_Atom] = set()
+
+    for result in results:
+        clauses = result.to_clauses() if isinstance(result, _Finite) else result
+
+        if len(clauses) == 0:
+            return []
+
+        atoms.update(max(clauses, key=_clause_score))
+
+    return [_simplify(atoms)]
+
+
+def _analyze_node(  # pylint: disable=R0911
+    op: object, av: object, ignorecase: bool
+) -> Union[None, _Finite, list[_Clause]]:
+    """
+    Analyze a single parsed regexp node.
+
+    Returns:
+        ``None`` for zero width nodes, a ``_Finite`` if the node matches one of a small
+        set of strings, or else the list of clauses that any match must satisfy.
+    """
+
+    if op in _ZERO_WIDTH_OPS:
+        return None
+
+    if op == sre_constants.LITERAL:
+        return _Finite(strings=frozenset({chr(av)}), ignorecase=ignorecase)
+
+    if op == sre_constants.IN:
+        return _analyze_in(av, ignorecase)
+
+    if op == sre_constants.BRANCH:
+        return _analyze_branch(av[1], ignorecase)
+
+    if op == sre_constants.SUBPATTERN:
+        _, add_flags, del_flags, subpattern = av
+
+        if add_flags & sre_constants.SRE_FLAG_IGNORECASE:
+            ignorecase = True
+        if del_flags & sre_constants.SRE_FLAG_IGNORECASE:
+            ignorecase = False
+
+        return _analyze_seq(subpattern, ignorecase)
+
+    if op == getattr(sre_constants, "ATOMIC_GROUP", None):
+        return _analyze_seq(av, ignorecase)
+
+    if op in _REPEAT_OPS:
+        min_repeat, max_repeat, item = av
+        result = _analyze_seq(item, ignorecase)
+
+        if isinstance(result, _Finite) and (min_repeat, max_repeat) == (1, 1):
+            return result
+
+        if isinstance(result, _Finite) and (min_repeat, max_repeat) == (0, 1):
+            return _Finite(strings=result.strings | {""}, ignorecase=result.ignorecase)
+
+        if min_repeat == 0:
+            return []
+
+        return result.to_clauses() if isinstance(result, _Finite) else result
+
+    return []
+
+
+def _analyze_seq(subpattern: object, ignorecase: bool) -> Union[_Finite, list[_Clause]]:
+    """
+    Analyze a sequence of parsed regexp nodes.
+
+    Consecutive elements that each match a finite set of strings are combined into a
+    single set of literals, e.g. ``[Pp]ostbus`` into ``postbus``.
+    """
+
+    clauses: list[_Clause] = []
+    current: Optional[_Finite] = _Finite(strings=frozenset({""}), ignorecase=False)
+    is_finite = True
+
+    for op, av in subpattern:
+        result = _analyze_node(op, av, ignorecase)
+
+        if result is None:
+            continue
+
+        if isinstance(result, _Finite):
+            combined = _concat(current, result) if current is not None else None
+
+            if combined is None:
+                is_finite = False
+                if current is not None:
+                    clauses += current.to_clauses()
+
+                current = result
+            else:
+                current = combined
+
+            continue
+
+        is_finite = False
+
+        if current is not None:
+            clauses += current.to_clauses()
+
+        current = None
+        clauses += result
+
+    if is_finite:
+        return current
+
+    if current is not None:
+        clauses += current.to_clauses()
+
+    return clauses
+
+
+def required_clauses(pattern: Union[str, re.Pattern]) -> list[frozenset]:
+    """
+    Derive what must be present in a text for a regexp to match it, e.g. ``@`` for an
+    e-mail address pattern or a month name for a date pattern. The result is a list of
+    clauses, where each clause is a set of atoms (literals or the digit class), of which
+    at least one must be present in the text.
+
+    Args:
+        pattern: The regexp, either as a string or a compiled ``re.Pattern``.
+
+    Returns:
+        The list of clauses, that is empty if nothing useful could be derived.
+    """
+
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern)
+
+    if not isinstance(pattern, re.Pattern) or not isinstance(pattern.pattern, str):
+        return []
+
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:  # pylint: disable=W0703
+        return []
+
+    flags = parsed.state.flags if hasattr(parsed, "state") else parsed.pattern.flags
+    result = _analyze_seq(parsed, bool(flags & sre_constants.SRE_FLAG_IGNORECASE))
+
+    clauses = result.to_clauses() if isinstance(result, _Finite) else result
+
+    return list(dict.fromkeys(clause for clause in clauses if len(clause) > 0))
+
+
+class _AtomScanner:  # pylint: disable=R0903
+    """
+    Finds which atoms are present in a text. The literals are found in a single pass
+    over the case folded text, using an Aho-Corasick automaton of all literals, so that
+    the cost hardly depends on the number of literals. Literals that are matched case
+    sensitively are then checked in the text itself. The digit class, and literals
+    with non-ASCII chars that are matched case insensitively, are searched for with a
+    regexp each.
+
+    Args:
+        atoms: The atoms, of which the index is used as their id.
+    """
+
+    def __init__(self, atoms: list[_Atom]) -> None:
+        self._regexps: list[tuple[int, re.Pattern]] = []
+        self._exact_texts: dict[int, str] = {}
+
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail = [0]
+        self._out: list[tuple[int, ...]] = [()]
+        self._n_literals = 0
+
+        for atom_id, atom in enumerate(atoms):
+            if atom.is_digit or len(atom.text) == 0:
+                self._regexps.append((atom_id, re.compile(atom.to_regexp())))
+            elif atom.ignorecase and not atom.text.isascii():
+                self._regexps.append((atom_id, re.compile(atom.to_regexp())))
+            else:
+                self._add_literal(atom_id, atom.text.translate(_CASE_FOLDS))
+
+                if not atom.ignorecase:
+                    self._exact_texts[atom_id] = atom.text
+
+        self._add_fail_links()
+
+    def _add_literal(self, atom_id: int, literal: str) -> None:
+        """Add a literal to the trie of the automaton."""
+
+        state = 0
+
+        for char in literal:
+            if char not in self._goto[state]:
+                self._goto[state][char] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+
+            state = self._goto[state][char]
+
+        self._out[state] += (atom_id,)
+        self._n_literals += 1
+
+    def _add_fail_links(self) -> None:
+        """Add the fail links, in breadth first order of the trie."""
+
+        queue = deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] += self._out[self._fail[next_state]]
+
+    def scan(self, text: str) -> frozenset:
+        """
+        Find the atoms present in a text.
+
+        Args:
+            text: The text.
+
+        Returns:
+            The ids of the atoms present in the text.
+        """
+
+        goto, fail, out = self._goto, self._fail, self._out
+        found: set[int] = set()
+        state = 0
+
+        if self._n_literals > 0:
+            for char in text.translate(_CASE_FOLDS):
+                while state and char not in goto[state]:
+                    state = fail[state]
+
+                state = goto[state].get(char, 0)
+
+                if out[state]:
+                    found.update(out[state])
+
+                    if len(found) == self._n_literals:
+                        break
+
+        for atom_id, exact_text in self._exact_texts.items():
+            if atom_id in found and exact_text not in text:
+                found.remove(atom_id)
+
+        found.update(
+            atom_id for atom_id, regexp in self._regexps if regexp.search(text)
+        )
+
+        return frozenset(found)
+
+
+class RegexpPrefilter:
+    """
+    Checks whether regexps can possibly match a document, before running them. For each
+    added regexp, the required literals (or digits) are derived automatically (see
+    :func:`required_clauses`). The literals of all regexps are then found in a single
+    pass over the document text, so that regexps without a chance of matching can be
+    skipped. A single instance is typically shared among all regexp annotators.
+    """
+
+    def __init__(self) -> None:
+        self._atoms: dict[_Atom, int] = {}
+        self._scanner: Optional[_AtomScanner] = None
+        self._last_scan: tuple[Optional[weakref.ref], frozenset] = (None, frozenset())
+
+    def add_regexp(self, pattern: Union[str, re.Pattern]) -> tuple[frozenset, ...]:
+        """
+        Add a regexp to this prefilter.
+
+        Args:
+            pattern: The regexp.
+
+        Returns:
+            The requirement of this regexp, to be passed to
+            :meth:`RegexpPrefilter.may_match`.
+        """
+
+        requirement = []
+
+        for clause in required_clauses(pattern):
+            atom_ids = []
+
+            for atom in clause:
+                if atom not in self._atoms:
+                    self._atoms[atom] = len(self._atoms)
+                    self._scanner = None
+
+                atom_ids.append(self._atoms[atom])
+
+            requirement.append(frozenset(atom_ids))
+
+        return tuple(requirement)
+
+    def _scan(self, text: str) -> frozenset:
+        """Find all atoms present in the text, building the scanner when needed."""
+
+        if self._scanner is None:
+            self._scanner = _AtomScanner(list(self._atoms))
+
+        return self._scanner.scan(text)
+
+    def may_match(self, requirement: tuple[frozenset, ...], doc: dd.Document) -> bool:
+        """
+        Check whether a regexp can match the document text. The text is scanned once,
+        and the result is reused for all regexps added to this prefilter.
+
+        Args:
+            requirement: The requirement, as returned by
+                :meth:`RegexpPrefilter.add_regexp`.
+            doc: The document.
+
+        Returns:
+            ``False`` if the regexp cannot match the text, ``True`` otherwise.
+        """
+
+        if len(requirement) == 0:
+            return True
+
+        doc_ref, found = self._last_scan
+
+        if doc_ref is None or doc_ref() is not doc:
+            found = self._scan(doc.text)
+            self._last_scan = (weakref.ref(doc), found)
+
+        return all(not clause.isdisjoint(found) for clause in requirement)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_last_scan"] = (None, frozenset())
+
+        return state
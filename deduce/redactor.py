@@ -1,5 +1,8 @@
+from typing import Any, Callable, Collection, Iterator, TextIO, Union
+
 import docdeid as dd
-from rapidfuzz.distance import DamerauLevenshtein
+
+from deduce.utils import FuzzyStringIndex
 
 
 class DeduceRedactor(dd.process.SimpleRedactor):
@@ -9,15 +12,36 @@ class DeduceRedactor(dd.process.SimpleRedactor):
     - All annotations with "patient" tag are replaced with <PATIENT>
     - All other annotations are replaced with <TAG-n>, with n identifying a group
         of annotations with a similar text (edit_distance <= 1).
+
+    An annotation joins the group of the first preceding annotation with a similar
+    text. The texts seen so far are kept in a ``FuzzyStringIndex``, so that similar
+    texts are found without comparing against each preceding annotation.
+
+    Besides returning the redacted text, the redacted text can be written in segments
+    to a file-like object or callback (see :meth:`DeduceRedactor.redact_to`).
     """
 
-    def redact(self, text: str, annotations: dd.AnnotationSet) -> str:
+    def _get_replacements(
+        self, annotations: Collection[dd.Annotation]
+    ) -> dict[dd.Annotation, str]:
+        """
+        Get the replacement of each annotation.
+
+        Args:
+            annotations: The annotations.
+
+        Returns:
+            A mapping from each annotation to its replacement, e.g. ``[LOCATIE-1]``.
+        """
+
         annotations_to_intext_replacement = {}
 
         for tag, annotation_group in self._group_annotations_by_tag(
             annotations
         ).items():
             annotations_to_replacement_group: dict[dd.Annotation, str] = {}
+            text_to_replacement_group: dict[str, tuple[int, str]] = {}
+            text_index = FuzzyStringIndex([], max_edit_distance=1)
             counter = 1
 
             for annotation in sorted(
@@ -29,25 +53,17 @@ class DeduceRedactor(dd.process.SimpleRedactor):
                     )
 
                 else:
-                    match = False
-
-                    # Check match with any
-                    for (
-                        annotation_match,
-                        replacement,
-                    ) in annotations_to_replacement_group.items():
-                        if (
-                            DamerauLevenshtein.distance(
-                                annotation.text, annotation_match.text, score_cutoff=1
-                            )
-                            <= 1
-                        ):
-                            annotations_to_replacement_group[annotation] = replacement
-                            match = True
-                            break
-
-                    if not match:
-                        annotations_to_replacement_group[annotation] = (
+                    similar_texts = text_index.find(annotation.text, 1)
+
+                    if len(similar_texts) > 0:
+                        # The first text seen is also the first annotation seen
+                        _, replacement = min(
+                            text_to_replacement_group[similar_text]
+                            for similar_text in similar_texts
+                        )
+
+                    else:
+                        replacement = (
                             f"{self.open_char}"
                             f"{annotation.tag.upper()}"
                             f"-"
@@ -57,8 +73,88 @@ class DeduceRedactor(dd.process.SimpleRedactor):
 
                         counter += 1
 
-                annotations_to_intext_replacement |= annotations_to_replacement_group
+                    annotations_to_replacement_group[annotation] = replacement
+
+                    if annotation.text not in text_to_replacement_group:
+                        text_to_replacement_group[annotation.text] = (
+                            len(text_to_replacement_group),
+                            replacement,
+                        )
+                        text_index.add(annotation.text)
+
+            annotations_to_intext_replacement |= annotations_to_replacement_group
+
+        return annotations_to_intext_replacement
 
-        return self._replace_annotations_in_text(
-            text, annotations, annotations_to_intext_replacement
+    def _redacted_segments(
+        self, text: str, annotations: Collection[dd.Annotation]
+    ) -> Iterator[str]:
+        """
+        Get the redacted text in segments, alternating between slices of the original
+        text and replacements. Overlapping annotations cannot be split in segments, in
+        that case the redacted text is produced as a whole.
+
+        Args:
+            text: The input text.
+            annotations: The annotations.
+
+        Returns:
+            An iterator over the segments of the redacted text.
+        """
+
+        replacements = self._get_replacements(annotations)
+        sorted_annotations = sorted(
+            annotations, key=lambda a: (a.start_char, a.end_char)
         )
+
+        if any(
+            annotation.end_char > next_annotation.start_char
+            for annotation, next_annotation in zip(
+                sorted_annotations, sorted_annotations[1:]
+            )
+        ):
+            yield self._replace_annotations_in_text(
+                text, dd.AnnotationSet(annotations), replacements
+            )
+            return
+
+        pos = 0
+
+        for annotation in sorted_annotations:
+            yield text[pos : annotation.start_char]
+            yield replacements[annotation]
+            pos = annotation.end_char
+
+        yield text[pos:]
+
+    def redact(self, text: str, annotations: dd.AnnotationSet) -> str:
+        return "".join(self._redacted_segments(text, annotations))
+
+    def redact_to(
+        self,
+        text: str,
+        annotations: Collection[dd.Annotation],
+        output: Union[TextIO, Callable[[str], Any]],
+    ) -> None:
+        """
+        Redact the text, and write the redacted text in segments to an output, without
+        building the full redacted text in memory. Can for example be used after
+        de-identifying with the redactor disabled:
+
+        >>> doc = deduce.deidentify(text, disabled={"redactor"})
+        >>> redactor = deduce.processors["post_processing"]["redactor"]
+        >>> with open("redacted.txt", "w") as file:
+        ...     redactor.redact_to(doc.text, doc.annotations, file)
+
+        Args:
+            text: The input text.
+            annotations: The annotations, e.g. an ``AnnotationSet`` or a list.
+            output: A file-like object with a ``write`` method, or a callback that is
+                called with each segment.
+        """
+
+        write = output.write if hasattr(output, "write") else output
+
+        for segment in self._redacted_segments(text, annotations):
+            if len(segment) > 0:
+                write(segment)
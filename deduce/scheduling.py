@@ -0,0 +1,127 @@
+"""Contains logic for scheduling texts of different sizes on worker processes."""
+
+import heapq
+import math
+from typing import Any, Sequence
+
+TEXT_OVERHEAD = 1_000
+"""The estimated cost of processing a text apart from its length, in chars."""
+
+
+def estimate_cost(text: Any) -> int:
+    """
+    Estimate the cost of processing a text, in chars.
+
+    Args:
+        text: The text. Other inputs (that will fail to be processed) are only
+            estimated to cost the overhead of a text.
+
+    Returns:
+        The estimated cost.
+    """
+
+    if not isinstance(text, str):
+        return TEXT_OVERHEAD
+
+    return len(text) + TEXT_OVERHEAD
+
+
+class UnitSizer:
+    """
+    Determines the size of work units, i.e. the texts that are sent to a worker at
+    once, so that processing a unit takes about ``unit_seconds``. Units that are much
+    shorter spend relatively much time on sending texts and results between
+    processes, units that are much longer make it harder to balance the work over
+    the workers. The processing time per unit of cost is estimated from the measured
+    processing time of previous units, as an exponential moving average.
+
+    Args:
+        unit_seconds: The target processing time of a unit.
+        seconds_per_cost: The initial estimate of the processing time per unit of
+            cost.
+        smoothing: The weight of a new measurement in the moving average.
+    """
+
+    def __init__(
+        self,
+        unit_seconds: float = 0.25,
+        seconds_per_cost: float = 2e-5,
+        smoothing: float = 0.3,
+    ) -> None:
+        self.unit_seconds = unit_seconds
+        self.seconds_per_cost = seconds_per_cost
+        self.smoothing = smoothing
+
+    def record(self, cost: float, seconds: float) -> None:
+        """
+        Record the measured processing time of a unit.
+
+        Args:
+            cost: The estimated cost of the unit.
+            seconds: The measured processing time of the unit.
+        """
+
+        if cost > 0:
+            self.seconds_per_cost += self.smoothing * (
+                seconds / cost - self.seconds_per_cost
+            )
+
+    def target_cost(self) -> float:
+        """
+        Get the cost of a unit that takes about ``unit_seconds`` to process.
+
+        Returns:
+            The target cost.
+        """
+
+        return self.unit_seconds / self.seconds_per_cost
+
+
+def pack_units(
+    costs: Sequence[float], target_cost: float, max_items: int
+) -> list[list[int]]:
+    """
+    Pack items into work units of about the target cost. Items that cost at least the
+    target cost form a unit on their own. Other items are assigned to the least
+    loaded of just enough units, largest first, so that the units are balanced. Units
+    are returned largest first, so that scheduling them in this order prevents large
+    units from being processed last.
+
+    Args:
+        costs: The estimated cost of each item.
+        target_cost: The target cost of a unit.
+        max_items: The max number of items in a unit.
+
+    Returns:
+        The units, as lists of item indices in increasing order, sorted by
+        decreasing total cost.
+    """
+
+    order = sorted(range(len(costs)), key=lambda i: costs[i], reverse=True)
+
+    large = [i for i in order if costs[i] >= target_cost]
+    small = [i for i in order if costs[i] < target_cost]
+
+    units = [[i] for i in large]
+
+    if len(small) > 0:
+        n_units = max(
+            math.ceil(sum(costs[i] for i in small) / target_cost),
+            math.ceil(len(small) / max_items),
+        )
+
+        heap = [(0.0, unit_index) for unit_index in range(n_units)]
+        small_units: list[list[int]] = [[] for _ in range(n_units)]
+
+        for i in small:
+            load, unit_index = heapq.heappop(heap)
+
+            while len(small_units[unit_index]) >= max_items:
+                load, unit_index = heapq.heappop(heap)
+
+            small_units[unit_index].append(i)
+            heapq.heappush(heap, (load + costs[i], unit_index))
+
+        units.extend(sorted(unit) for unit in small_units if len(unit) > 0)
+
+    return sorted(units, key=lambda unit: sum(costs[i] for i in unit), reverse=True)
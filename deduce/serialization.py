@@ -0,0 +1,267 @@
+"""
+Contains a compact binary format for de-identification results, i.e. annotations and
+the de-identified text, that is used to send results between processes and to store
+them on disk.
+
+A result consists of a header (magic bytes, format version, flags and counts), the
+distinct tags, and arrays with the start char, length, tag id and priority of each
+annotation. Annotation texts are optional, as they can be restored from the text
+when decoding, and so is the de-identified text. All numbers are little-endian.
+"""
+
+import itertools
+import struct
+import sys
+from array import array
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+import docdeid as dd
+
+FORMAT_VERSION = 1
+"""The version of the format, that is increased on incompatible changes."""
+
+_MAGIC = b"DDR"
+_HEADER = struct.Struct("<3sBBIH")
+_LENGTH = struct.Struct("<I")
+
+_FLAG_ANNOTATION_TEXTS = 1
+_FLAG_DEIDENTIFIED_TEXT = 2
+
+
+def _array_to_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":  # pragma: no cover
+        values.byteswap()
+
+    return values.tobytes()
+
+
+def _str_to_bytes(value: str) -> bytes:
+    encoded_value = value.encode("utf-8")
+
+    return _LENGTH.pack(len(encoded_value)) + encoded_value
+
+
+class _Reader:
+    """Reads values from encoded data, from a position that moves along."""
+
+    def __init__(self, data: bytes, pos: int = 0) -> None:
+        self.view = memoryview(data)
+        self.pos = pos
+
+    def read_array(self, typecode: str, n: int) -> array:
+        """Read an array of n numbers."""
+
+        values = array(typecode)
+        end = self.pos + n * values.itemsize
+        values.frombytes(self.view[self.pos : end])
+        self.pos = end
+
+        if sys.byteorder == "big":  # pragma: no cover
+            values.byteswap()
+
+        return values
+
+    def read_str(self) -> str:
+        """Read a string, preceded by its length in bytes."""
+
+        (length,) = _LENGTH.unpack_from(self.view, self.pos)
+        start = self.pos + _LENGTH.size
+        self.pos = start + length
+
+        return str(self.view[start : self.pos], "utf-8")
+
+    def read_texts(self, n: int) -> list[str]:
+        """Read n strings, stored as their lengths in chars and their concatenation."""
+
+        ends = list(itertools.accumulate(self.read_array("I", n)))
+        texts = self.read_str()
+
+        return list(map(texts.__getitem__, map(slice, [0] + ends, ends)))
+
+
+def _read_header(data: bytes) -> tuple[int, int, int]:
+    """Read the header of an encoded result, i.e. its flags and counts."""
+
+    if len(data) < _HEADER.size:
+        raise ValueError("Cannot decode result, data is too short.")
+
+    magic, version, flags, n_annotations, n_tags = _HEADER.unpack_from(data)
+
+    if magic != _MAGIC:
+        raise ValueError("Cannot decode result, data is not an encoded result.")
+
+    if version != FORMAT_VERSION:
+        raise ValueError(
+            f"Cannot decode result of format version {version}, only version "
+            f"{FORMAT_VERSION} is supported."
+        )
+
+    return flags, n_annotations, n_tags
+
+
+def encode(
+    annotations: Iterable[dd.Annotation],
+    deidentified_text: Optional[str] = None,
+    include_texts: bool = False,
+) -> bytes:
+    """
+    Encode a de-identification result.
+
+    Args:
+        annotations: The annotations.
+        deidentified_text: The de-identified text, if any.
+        include_texts: Whether to include the text of each annotation. If not, the
+            text the annotations belong to is needed for decoding.
+
+    Returns:
+        The encoded result.
+    """
+
+    annotations = list(annotations)
+
+    tag_ids: dict[str, int] = {}
+    starts, lengths = array("I"), array("I")
+    tags, priorities = array("H"), array("i")
+
+    for annotation in annotations:
+        starts.append(annotation.start_char)
+        lengths.append(annotation.end_char - annotation.start_char)
+        tags.append(tag_ids.setdefault(annotation.tag, len(tag_ids)))
+        priorities.append(annotation.priority)
+
+    flags = 0
+
+    if include_texts:
+        flags |= _FLAG_ANNOTATION_TEXTS
+
+    if deidentified_text is not None:
+        flags |= _FLAG_DEIDENTIFIED_TEXT
+
+    parts = [
+        _HEADER.pack(_MAGIC, FORMAT_VERSION, flags, len(annotations), len(tag_ids))
+    ]
+
+    parts += [_str_to_bytes(tag) for tag in tag_ids]
+
+    parts += [
+        _array_to_bytes(starts),
+        _array_to_bytes(lengths),
+        _array_to_bytes(tags),
+        _array_to_bytes(priorities),
+    ]
+
+    if include_texts:
+        parts += [
+            _array_to_bytes(array("I", (len(a.text) for a in annotations))),
+            _str_to_bytes("".join(annotation.text for annotation in annotations)),
+        ]
+
+    if deidentified_text is not None:
+        parts.append(_str_to_bytes(deidentified_text))
+
+    return b"".join(parts)
+
+
+def decode(
+    data: bytes, text: Optional[str] = None
+) -> tuple[list[dd.Annotation], Optional[str]]:
+    """
+    Decode a de-identification result.
+
+    Args:
+        data: The encoded result.
+        text: The text the annotations belong to, needed if the annotation texts are
+            not included.
+
+    Returns:
+        The annotations (without tokens) and the de-identified text, if any.
+
+    Raises:
+        ValueError: If the data is not an encoded result of this format version, or
+            if the text is needed but not provided.
+    """
+
+    flags, n_annotations, n_tags = _read_header(data)
+
+    if not flags & _FLAG_ANNOTATION_TEXTS and text is None:
+        raise ValueError(
+            "Cannot decode result without annotation texts, without the text."
+        )
+
+    reader = _Reader(data, pos=_HEADER.size)
+
+    tag_names = [reader.read_str() for _ in range(n_tags)]
+    starts = reader.read_array("I", n_annotations)
+    lengths = reader.read_array("I", n_annotations)
+    tags = reader.read_array("H", n_annotations)
+    priorities = reader.read_array("i", n_annotations)
+
+    if flags & _FLAG_ANNOTATION_TEXTS:
+        texts = reader.read_texts(n_annotations)
+    else:
+        texts = [
+            text[start : start + length]  # type: ignore[index]
+            for start, length in zip(starts, lengths)
+        ]
+
+    deidentified_text = None
+
+    if flags & _FLAG_DEIDENTIFIED_TEXT:
+        deidentified_text = reader.read_str()
+
+    annotations = [
+        dd.Annotation(
+            text=annotation_text,
+            start_char=start,
+            end_char=start + length,
+            tag=tag_names[tag],
+            priority=priority,
+        )
+        for annotation_text, start, length, tag, priority in zip(
+            texts, starts, lengths, tags, priorities
+        )
+    ]
+
+    return annotations, deidentified_text
+
+
+def write_results(results: Iterable[bytes], file: BinaryIO) -> None:
+    """
+    Write encoded results to a (binary) file, each preceded by its length.
+
+    Args:
+        results: The encoded results.
+        file: The file.
+    """
+
+    for result in results:
+        file.write(_LENGTH.pack(len(result)))
+        file.write(result)
+
+
+def read_results(file: BinaryIO) -> Iterator[bytes]:
+    """
+    Read encoded results from a (binary) file, as written with
+    :func:`write_results`.
+
+    Args:
+        file: The file.
+
+    Returns:
+        An iterator over the encoded results.
+
+    Raises:
+        ValueError: If the file ends within a result.
+    """
+
+    while len(prefix := file.read(_LENGTH.size)) > 0:
+        if len(prefix) < _LENGTH.size:
+            raise ValueError("Cannot read result, file ends within a result.")
+
+        (length,) = _LENGTH.unpack(prefix)
+        result = file.read(length)
+
+        if len(result) < length:
+            raise ValueError("Cannot read result, file ends within a result.")
+
+        yield result
@@ -1,10 +1,143 @@
-from typing import Iterable, Optional
+import re
+import sys
+from array import array
+from typing import Iterable, Literal, Optional
 
 import docdeid as dd
 import regex
 
 _TOKENIZER_PATTERN = regex.compile(r"\w+|[\n\r\t]| {4,}|[^ ]", flags=regex.I | regex.M)
 
+_WORD_CHAR_PATTERN = regex.compile(r"\w", flags=regex.I | regex.M)
+
+_CHAR_CLASS_RUNS_PATTERN = re.compile(r"w+|\.| {4,}")
+"""Finds the same tokens as ``_TOKENIZER_PATTERN``, in a text of char class codes."""
+
+
+class _CharClasses(dict):
+    """
+    Maps code points to char class codes, for use with ``str.translate``: ``w`` for
+    word chars, a space for a space, and ``.`` for any other char. The class of a
+    code point is determined with the tokenizer regexp the first time it is seen.
+    """
+
+    def __missing__(self, key: int) -> str:
+        char = chr(key)
+
+        if char == " ":
+            code = " "
+        elif _WORD_CHAR_PATTERN.match(char):
+            code = "w"
+        else:
+            code = "."
+
+        self[key] = code
+
+        return code
+
+
+_CHAR_CLASSES = _CharClasses()
+
+
+class TokenTable:
+    """
+    The tokens of a text, stored as parallel arrays of start and end chars, with a
+    column of (interned) token texts, that is used to scan and merge tokens. Token
+    objects are created from it with :meth:`TokenTable.token` or
+    :meth:`TokenTable.tokens`.
+
+    Args:
+        starts: The start char of each token.
+        ends: The end char of each token.
+        texts: The text of each token.
+    """
+
+    __slots__ = ("starts", "ends", "texts")
+
+    def __init__(
+        self,
+        starts: Optional[array] = None,
+        ends: Optional[array] = None,
+        texts: Optional[list[str]] = None,
+    ) -> None:
+        self.starts = starts if starts is not None else array("l")
+        self.ends = ends if ends is not None else array("l")
+        self.texts = texts if texts is not None else []
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @classmethod
+    def from_spans(cls, text: str, spans: Iterable[tuple[int, int]]) -> "TokenTable":
+        """
+        Create a table from precomputed token spans, e.g. from an upstream tokenizer.
+
+        Args:
+            text: The text.
+            spans: The ``(start_char, end_char)`` of each token, in order.
+
+        Returns:
+            A table with the tokens.
+
+        Raises:
+            ValueError: If a span is empty, exceeds the text, or overlaps the
+            preceding span.
+        """
+
+        table = cls()
+        previous_end = 0
+
+        for start_char, end_char in spans:
+            if not previous_end <= start_char < end_char <= len(text):
+                raise ValueError(
+                    f"Invalid token span ({start_char}, {end_char}), spans must be "
+                    f"non-empty, ordered and non-overlapping, and within the text."
+                )
+
+            table.append(start_char, end_char, sys.intern(text[start_char:end_char]))
+            previous_end = end_char
+
+        return table
+
+    def append(self, start_char: int, end_char: int, text: str) -> None:
+        """
+        Add a token at the end of the table.
+
+        Args:
+            start_char: The start char.
+            end_char: The end char.
+            text: The text.
+        """
+
+        self.starts.append(start_char)
+        self.ends.append(end_char)
+        self.texts.append(text)
+
+    def token(self, i: int) -> dd.Token:
+        """
+        Create the token at an index.
+
+        Args:
+            i: The index.
+
+        Returns:
+            The token.
+        """
+
+        return dd.Token(
+            text=self.texts[i], start_char=self.starts[i], end_char=self.ends[i]
+        )
+
+    def tokens(self) -> list[dd.Token]:
+        """
+        Create all tokens.
+
+        Returns:
+            A list of tokens.
+        """
+
+        return list(map(dd.Token, self.texts, self.starts, self.ends))
+
 
 class DeduceTokenizer(dd.tokenizer.Tokenizer):  # pylint: disable=R0903
     """
@@ -15,12 +148,24 @@ class DeduceTokenizer(dd.tokenizer.Tokenizer):  # pylint: disable=R0903
     Arguments:
         merge_terms: An iterable of strings that should not be split (i.e. always
         returned as tokens).
+        engine: How to find the tokens. With ``regexp`` (default), the tokenizer
+        regexp is matched against the text. With ``table``, the chars of the text
+        are first translated to char class codes using a lookup table, after which
+        the tokens are found as runs of char classes. Both give identical tokens.
     """
 
-    def __init__(self, merge_terms: Optional[Iterable] = None) -> None:
+    def __init__(
+        self,
+        merge_terms: Optional[Iterable] = None,
+        engine: Literal["regexp", "table"] = "regexp",
+    ) -> None:
         super().__init__()
 
+        if engine not in ("regexp", "table"):
+            raise ValueError(f"Unknown tokenizer engine {engine}")
+
         self._pattern = _TOKENIZER_PATTERN
+        self.engine = engine
         self._trie: Optional[dd.ds.LookupTrie] = None
 
         self._start_words: set[str] = set()
@@ -39,79 +184,146 @@ class DeduceTokenizer(dd.tokenizer.Tokenizer):  # pylint: disable=R0903
         trie = dd.ds.LookupTrie()
 
         for term in merge_terms:
-            tokens = [token.text for token in self._split_text(text=term)]
+            tokens = self._scan(text=term).texts
             trie.add_item(tokens)
             self._start_words.add(tokens[0])
 
         self._trie = trie
 
     @staticmethod
-    def _join_tokens(text: str, tokens: list[dd.tokenizer.Token]) -> dd.tokenizer.Token:
+    def _scan_char_classes(text: str) -> TokenTable:
         """
-        Join a list of tokens into a single token. Does this by creating a new token,
-        that ranges from the first token start char to the last token end char.
+        Split text, by translating it to char class codes and finding runs of them.
 
         Args:
-            text: The original text.
-            tokens: The input tokens.
+            text: The input text.
 
         Returns:
-            The output token.
+            A table with the tokens.
         """
 
-        return dd.Token(
-            text=text[tokens[0].start_char : tokens[-1].end_char],
-            start_char=tokens[0].start_char,
-            end_char=tokens[-1].end_char,
+        char_classes = text.translate(_CHAR_CLASSES)
+        matches = _CHAR_CLASS_RUNS_PATTERN.finditer(char_classes)
+        spans = list(map(re.Match.span, matches))  # pylint: disable=E1101
+
+        if len(spans) == 0:
+            return TokenTable()
+
+        starts, ends = zip(*spans)
+
+        return TokenTable(
+            starts=array("l", starts),
+            ends=array("l", ends),
+            texts=list(
+                map(sys.intern, map(text.__getitem__, map(slice, starts, ends)))
+            ),
         )
 
-    def _merge(
-        self, text: str, tokens: list[dd.tokenizer.Token]
-    ) -> list[dd.tokenizer.Token]:
+    def _scan(self, text: str) -> TokenTable:
         """
-        Merge a list of tokens based on the trie.
+        Split text, based on the regexp pattern.
 
         Args:
-            tokens: A list of tokens, with merge_terms split.
+            text: The input text.
 
         Returns:
-            A list of tokens, with merge_terms joined in single tokens.
+            A table with the tokens.
         """
 
-        if self._trie is None:
-            return tokens
+        if self.engine == "table":
+            return self._scan_char_classes(text)
 
-        tokens_text = [token.text for token in tokens]
-        tokens_merged = []
-        i = 0
+        table = TokenTable()
+        starts, ends, texts = table.starts, table.ends, table.texts
 
-        while i < len(tokens):
+        for match in self._pattern.finditer(text):
+            start_char, end_char = match.span()
+            starts.append(start_char)
+            ends.append(end_char)
+            texts.append(sys.intern(match.group()))
 
-            if tokens_text[i] not in self._start_words:
-                tokens_merged.append(tokens[i])
-                i += 1
-                continue
+        return table
 
-            longest_matching_prefix = self._trie.longest_matching_prefix(
-                tokens_text, start_i=i
-            )
+    def _merge(self, text: str, table: TokenTable) -> TokenTable:
+        """
+        Merge tokens based on the trie.
+
+        Args:
+            text: The original text.
+            table: A table of tokens, with merge_terms split.
+
+        Returns:
+            A table of tokens, with merge_terms joined in single tokens.
+        """
 
-            if longest_matching_prefix is None:
-                tokens_merged.append(tokens[i])
-                i += 1
+        if self._trie is None or self._start_words.isdisjoint(table.texts):
+            return table
 
-            else:
-                num_tokens_to_merge = len(longest_matching_prefix)
-                tokens_merged.append(
-                    self._join_tokens(text, tokens[i : i + num_tokens_to_merge])
+        starts, ends, texts = table.starts, table.ends, table.texts
+        merged = TokenTable()
+        i = 0
+
+        while i < len(texts):
+
+            if texts[i] in self._start_words:
+                longest_matching_prefix = self._trie.longest_matching_prefix(
+                    texts, start_i=i
                 )
-                i += num_tokens_to_merge
 
-        return tokens_merged
+                if longest_matching_prefix is not None:
+                    end_i = i + len(longest_matching_prefix) - 1
+                    merged.append(
+                        starts[i],
+                        ends[end_i],
+                        sys.intern(text[starts[i] : ends[end_i]]),
+                    )
+                    i = end_i + 1
+                    continue
+
+            merged.append(starts[i], ends[i], texts[i])
+            i += 1
+
+        return merged
+
+    def split_table(self, text: str) -> TokenTable:
+        """
+        Split text into a table of tokens, without creating token objects.
+
+        Args:
+            text: The input text.
+
+        Returns:
+            A table with the tokens, with merge_terms joined in single tokens.
+        """
+
+        return self._merge(text, self._scan(text))
+
+    def table_from_spans(
+        self, text: str, spans: Iterable[tuple[int, int]], merge: bool = True
+    ) -> TokenTable:
+        """
+        Create a table of tokens from precomputed token spans, rather than by
+        splitting the text.
+
+        Args:
+            text: The input text.
+            spans: The ``(start_char, end_char)`` of each token, in order.
+            merge: Whether to join merge_terms split over multiple tokens in single
+            tokens, as when splitting the text.
+
+        Returns:
+            A table with the tokens.
+        """
+
+        table = TokenTable.from_spans(text, spans)
+
+        return self._merge(text, table) if merge else table
 
     def _split_text(self, text: str) -> list[dd.tokenizer.Token]:
         """
-        Split text, based on the regexp pattern.
+        Split text, based on the regexp pattern. The tokens are scanned and merged in
+        a table, after which a token object is created for each final token, as the
+        ``TokenList`` of a document links all tokens.
 
         Args:
             text: The input text.
@@ -120,18 +332,39 @@ class DeduceTokenizer(dd.tokenizer.Tokenizer):  # pylint: disable=R0903
             A list of tokens.
         """
 
-        tokens = []
+        return self.split_table(text).tokens()
 
-        for match in self._pattern.finditer(text):
-            tokens.append(
-                dd.Token(
-                    text=match.group(0),
-                    start_char=match.span()[0],
-                    end_char=match.span()[1],
-                )
-            )
 
-        if self._trie is not None:
-            tokens = self._merge(text, tokens)
+class PretokenizedTokenizer(dd.tokenizer.Tokenizer):  # pylint: disable=R0903
+    """
+    Returns precomputed tokens of a single text, e.g. as created with
+    :meth:`DeduceTokenizer.table_from_spans`, so that the text is not tokenized again.
+
+    Args:
+        text: The text the tokens belong to.
+        table: A table with the tokens.
+    """
+
+    def __init__(self, text: str, table: TokenTable) -> None:
+        super().__init__()
+        self.text = text
+        self.table = table
+
+    def _split_text(self, text: str) -> list[dd.tokenizer.Token]:
+        """
+        Return the precomputed tokens.
+
+        Args:
+            text: The input text, which should be the text the tokens belong to.
+
+        Returns:
+            A list of tokens.
+
+        Raises:
+            ValueError: If the text is not the text the tokens belong to.
+        """
+
+        if text is not self.text and text != self.text:
+            raise ValueError("Cannot use precomputed tokens for a different text.")
 
-        return tokens
+        return self.table.tokens()
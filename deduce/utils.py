@@ -3,7 +3,7 @@ import inspect
 import json
 import re
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
 import docdeid as dd
 from docdeid import Tokenizer
@@ -32,6 +32,145 @@ def str_match(str_1: str, str_2: str, max_edit_distance: Optional[int] = None) -
     return str_1 == str_2
 
 
+def _deletion_variants(text: str, max_deletions: int) -> set[str]:
+    """Get all strings obtained by deleting at most max_deletions characters."""
+
+    variants = {text}
+    frontier = {text}
+
+    for _ in range(max_deletions):
+        frontier = {
+            variant[:i] + variant[i + 1 :]
+            for variant in frontier
+            for i in range(len(variant))
+        }
+        variants.update(frontier)
+
+    return variants
+
+
+_MAX_MEMO_SIZE = 100_000
+
+
+class FuzzyStringIndex:
+    """
+    Matches a string against a set of strings, either exactly or within a max edit
+    distance, with the same outcome as calling :func:`str_match` for each string. The
+    strings are indexed by their deletion neighbourhood (as in SymSpell): strings within
+    edit distance ``n`` of each other share a variant with at most ``n`` characters
+    deleted, so that only those candidates need an exact edit distance computation.
+    Results are memoized for each string that is matched (up to a max number of
+    strings, after which the memo is cleared).
+
+    Args:
+        strings: The strings to match against.
+        max_edit_distance: The max edit distance that can be used for matching.
+    """
+
+    def __init__(self, strings: Iterable[str], max_edit_distance: int = 1) -> None:
+        self.max_edit_distance = max_edit_distance
+
+        self._strings = set(strings)
+        self._lengths = {len(string) for string in self._strings}
+        self._variants: dict[str, set[str]] = {}
+        self._memo: dict[tuple[str, int], frozenset[str]] = {}
+
+        for string in self._strings:
+            self._index(string)
+
+    def _index(self, string: str) -> None:
+        for variant in _deletion_variants(string, self.max_edit_distance):
+            self._variants.setdefault(variant, set()).add(string)
+
+    def add(self, string: str) -> None:
+        """
+        Add a string to the index.
+
+        Args:
+            string: The string to add.
+        """
+
+        if string in self._strings:
+            return
+
+        self._strings.add(string)
+        self._lengths.add(len(string))
+        self._index(string)
+        self._memo.clear()
+
+    def _candidates(self, text: str, max_edit_distance: int) -> set[str]:
+        if all(abs(len(text) - length) > max_edit_distance for length in self._lengths):
+            return set()
+
+        candidates = set()
+
+        for variant in _deletion_variants(text, max_edit_distance):
+            candidates.update(self._variants.get(variant, ()))
+
+        return candidates
+
+    def find(
+        self, text: str, max_edit_distance: Optional[int] = None
+    ) -> frozenset[str]:
+        """
+        Find the indexed strings that match a string.
+
+        Args:
+            text: The string to match.
+            max_edit_distance: Max edit distance, will use exact matching if not used.
+
+        Returns:
+            The indexed strings that match.
+
+        Raises:
+            ValueError: If the max edit distance exceeds that of the index.
+        """
+
+        if max_edit_distance is None:
+            return frozenset({text}) if text in self._strings else frozenset()
+
+        if max_edit_distance > self.max_edit_distance:
+            raise ValueError(
+                f"Cannot match with max edit distance {max_edit_distance}, index "
+                f"supports up to {self.max_edit_distance}."
+            )
+
+        key = (text, max_edit_distance)
+        result = self._memo.get(key)
+
+        if result is None:
+            if len(self._memo) >= _MAX_MEMO_SIZE:
+                self._memo.clear()
+
+            result = self._memo[key] = frozenset(
+                candidate
+                for candidate in self._candidates(text, max_edit_distance)
+                if str_match(text, candidate, max_edit_distance=max_edit_distance)
+            )
+
+        return result
+
+    def match(self, text: str, max_edit_distance: Optional[int] = None) -> bool:
+        """
+        Match a string against the indexed strings.
+
+        Args:
+            text: The string to match.
+            max_edit_distance: Max edit distance, will use exact matching if not used.
+
+        Returns:
+            ``True`` if any of the indexed strings matches, ``False`` otherwise.
+
+        Raises:
+            ValueError: If the max edit distance exceeds that of the index.
+        """
+
+        if max_edit_distance is None:
+            return text in self._strings
+
+        return len(self.find(text, max_edit_distance)) > 0
+
+
 def class_for_name(module_name: str, class_name: str) -> type:
     """
     Will import and return the class by name.
@@ -111,6 +250,43 @@ def has_overlap(intervals: list[tuple]) -> bool:
     return False
 
 
+_SPLIT_BOUNDARIES = (
+    re.compile(r"\n[ \t]*\n"),
+    re.compile(r"\n"),
+    re.compile(r"[.!?] "),
+    re.compile(r" "),
+)
+"""Boundaries to split texts at, from most to least preferred: blank lines, line
+ends, sentence ends and spaces."""
+
+
+def find_split(text: str, start: int, end: int) -> int:
+    """
+    Find a position between start and end to split a text at, where annotations are
+    unlikely to cross. The last blank line is preferred, then the last line end, the
+    last sentence end and the last space.
+
+    Args:
+        text: The text.
+        start: The first position to consider.
+        end: The last position to consider.
+
+    Returns:
+        The position right after the boundary, or ``end`` if there is no boundary.
+    """
+
+    for pattern in _SPLIT_BOUNDARIES:
+        split = None
+
+        for match in pattern.finditer(text, start, end):
+            split = match.end()
+
+        if split is not None:
+            return split
+
+    return end
+
+
 def repl_segments(s: str, matches: list[tuple]) -> list[list[str]]:
     """
     Segment a string into consecutive substrings, with one or more options for each
@@ -1,5 +1,11 @@
+import pickle
+import re
+
 import docdeid as dd
+import pytest
 
+from deduce.deduce import _DeduceProcessorLoader
+from deduce.parallel import create_pool
 from deduce.person import Person
 
 text = (
@@ -85,3 +91,229 @@ class TestDeduce:
         )
 
         assert dd.utils.annotate_intext(doc) == expected_intext_annotated
+
+    def test_deidentify_offsets(self, model):
+        metadata = {"patient": Person(first_names=["Jan"], surname="Jansen")}
+        doc = model.deidentify(text, metadata=metadata)
+
+        offsets = model.deidentify_offsets(text, metadata=metadata)
+
+        assert offsets == sorted(
+            (annotation.start_char, annotation.end_char, annotation.tag)
+            for annotation in doc.annotations
+        )
+        assert offsets[0] == (9, 19, "patient")
+
+        doc = model.deidentify(text, disabled={"overlap_resolver"})
+
+        assert model.deidentify_offsets(text, disabled={"overlap_resolver"}) == sorted(
+            (annotation.start_char, annotation.end_char, annotation.tag)
+            for annotation in doc.annotations
+        )
+
+    def test_deidentify_text(self, model):
+        metadata = {"patient": Person(first_names=["Jan"], surname="Jansen")}
+        doc = model.deidentify(text, metadata=metadata)
+
+        assert model.deidentify_text(text, metadata=metadata) == doc.deidentified_text
+
+    def test_deidentify_enabled(self, model):
+        email_text = "mail j.jansen@gmail.com"
+        enabled = {"email_addresses", "email"}
+
+        assert model.deidentify_offsets(email_text, enabled=enabled) == [
+            (5, 23, "emailadres")
+        ]
+        assert (
+            model.deidentify_text(
+                email_text, enabled=enabled | {"post_processing", "redactor"}
+            )
+            == "mail [EMAILADRES-1]"
+        )
+
+    def test_deidentify_text_without_redactor(self, model):
+        with pytest.raises(ValueError):
+            model.deidentify_text(text, disabled={"redactor"})
+
+        with pytest.raises(ValueError):
+            model.deidentify_text(text, enabled={"names"})
+
+    def test_prunable_tags(self, model):
+        config = dict(model.config)
+        prunable_tags = _DeduceProcessorLoader._get_prunable_tags(config)
+
+        assert {"locatie", "ziekenhuis"} <= prunable_tags
+        assert "straat" not in prunable_tags
+        assert "achternaam" not in prunable_tags
+
+        config["resolve_overlap_strategy"] = {
+            "attributes": ["length"],
+            "ascending": [True],
+        }
+
+        assert _DeduceProcessorLoader._get_prunable_tags(config) == set()
+
+    def test_prune_nested_matches(self, model):
+        text = "Opgenomen in het Centraal Militair Hospitaal"
+        enabled = {"institutions"} | {
+            name for name, _ in model.processors["institutions"]
+        }
+
+        nested = model.deidentify(text, enabled=enabled).annotations
+        resolved = model.deidentify(text).annotations
+
+        assert len(nested) > len(resolved) == 1
+
+    def test_annotate_stream(self, model):
+        metadata = {"patient": Person(first_names=["Jan"], surname="Jansen")}
+        long_text = "\n\n".join([text] * 5)
+        chunks = (long_text[i : i + 100] for i in range(0, len(long_text), 100))
+
+        expected = model.deidentify_offsets(long_text, metadata=metadata)
+
+        for stream in (
+            model.annotate_stream(long_text, metadata, window_size=500, margin=100),
+            model.annotate_stream(chunks, metadata, window_size=500, margin=100),
+        ):
+            assert [
+                (annotation.start_char, annotation.end_char, annotation.tag)
+                for annotation in stream
+            ] == expected
+
+    def test_deidentify_parallel(self, model):
+        metadata = {"patient": Person(first_names=["Jan"], surname="Jansen")}
+        long_text = "\n\n".join([text] * 5)
+
+        doc = model.deidentify(long_text, metadata=metadata)
+        parallel_doc = model.deidentify(
+            long_text, metadata=metadata, n_jobs=2, window_size=500, margin=100
+        )
+
+        assert parallel_doc.annotations == doc.annotations
+        assert parallel_doc.deidentified_text == doc.deidentified_text
+
+    def test_deidentify_parallel_pool(self, model):
+        long_text = "\n\n".join([text] * 5)
+        doc = model.deidentify(long_text)
+
+        with create_pool(model, n_jobs=2) as pool:
+            for _ in range(2):
+                parallel_doc = model.deidentify(
+                    long_text, n_jobs=2, window_size=500, margin=100, pool=pool
+                )
+
+                assert parallel_doc.annotations == doc.annotations
+                assert parallel_doc.deidentified_text == doc.deidentified_text
+
+    def test_deidentify_tokens(self, model):
+        metadata = {"patient": Person(first_names=["Jan"], surname="Jansen")}
+        token_spans = [
+            (match.start(), match.end()) for match in re.finditer(r"\w+|[^\w\s]", text)
+        ]
+
+        doc = model.deidentify(text, metadata=metadata)
+        pretokenized_doc = model.deidentify_tokens(text, token_spans, metadata=metadata)
+
+        assert pretokenized_doc.annotations == doc.annotations
+        assert pretokenized_doc.deidentified_text == doc.deidentified_text
+
+    def test_deidentify_batch(self, model):
+        metadata = {"patient": Person(first_names=["Jan"], surname="Jansen")}
+        texts = [text, text[:100], text[100:]]
+
+        docs = [model.deidentify(t, metadata=metadata) for t in texts]
+
+        for n_jobs, shared_memory in ((1, False), (2, False), (2, True)):
+            batch_docs = list(
+                model.deidentify_batch(
+                    iter(texts),
+                    metadata=metadata,
+                    n_jobs=n_jobs,
+                    chunksize=2,
+                    shared_memory=shared_memory,
+                )
+            )
+
+            assert [doc.annotations for doc in batch_docs] == [
+                doc.annotations for doc in docs
+            ]
+            assert [doc.deidentified_text for doc in batch_docs] == [
+                doc.deidentified_text for doc in docs
+            ]
+
+    def test_deidentify_batch_pool(self, model):
+        texts = [text, text[:100], text[100:]]
+        docs = [model.deidentify(t) for t in texts]
+
+        with create_pool(model, n_jobs=2) as pool:
+            for shared_memory in (False, True):
+                batch_docs = list(
+                    model.deidentify_batch(
+                        texts, n_jobs=2, shared_memory=shared_memory, pool=pool
+                    )
+                )
+
+                assert [doc.deidentified_text for doc in batch_docs] == [
+                    doc.deidentified_text for doc in docs
+                ]
+
+    def test_deidentify_batch_errors(self, model):
+        texts = [text, None, text]
+
+        for n_jobs in (1, 2):
+            results = list(
+                model.deidentify_batch(texts, n_jobs=n_jobs, on_error="return")
+            )
+
+            assert isinstance(results[0], dd.Document)
+            assert isinstance(results[1], Exception)
+            assert isinstance(results[2], dd.Document)
+
+            batch = model.deidentify_batch(texts, n_jobs=n_jobs)
+
+            assert isinstance(next(batch), dd.Document)
+
+            with pytest.raises(Exception):
+                next(batch)
+
+    def test_deidentify_batch_metadata_length(self, model):
+        for metadata in ([None], [None] * 4):
+            with pytest.raises(ValueError):
+                list(model.deidentify_batch(["a", "b", "c"], metadata=metadata))
+
+    def test_deidentify_batch_invalid_args(self, model):
+        for kwargs in ({"n_jobs": 0}, {"chunksize": 0}, {"on_error": "ignore"}):
+            with pytest.raises(ValueError):
+                list(model.deidentify_batch(["a", "b", "c"], **kwargs))
+
+    def test_deidentify_parallel_invalid_args(self, model):
+        for kwargs in (
+            {"n_jobs": 0},
+            {"n_jobs": 2, "window_size": 0},
+            {"n_jobs": 2, "margin": -1},
+        ):
+            with pytest.raises(ValueError):
+                model.deidentify(text, **kwargs)
+
+    def test_tokenizer_engine(self, model):
+        tokenizer = model._initialize_tokenizer(model.lookup_data_path, engine="table")
+
+        assert model.tokenizers["default"].engine == "regexp"
+        assert tokenizer.engine == "table"
+        assert tokenizer.tokenize(text) == model.tokenizers["default"].tokenize(text)
+
+    def test_pickle(self, model):
+        unpickled_model = pickle.loads(pickle.dumps(model))
+
+        assert unpickled_model.deidentify_text(text) == model.deidentify_text(text)
+
+    def test_pickle_changed_processors(self, model):
+        model.processors["names"].add_processor("extra", dd.process.DocProcessorGroup())
+
+        try:
+            with pytest.raises(pickle.PicklingError):
+                pickle.dumps(model)
+        finally:
+            model.processors["names"].remove_processor("extra")
+
+        assert pickle.loads(pickle.dumps(model)) is not None
@@ -1,8 +1,15 @@
+import operator
+from unittest.mock import patch
+
 import docdeid as dd
+from frozendict import frozendict
 
 from deduce.annotation_processor import (
+    AnnotationListProcessor,
     CleanAnnotationTag,
     DeduceMergeAdjacentAnnotations,
+    DeduceOverlapResolver,
+    DeduceProcessorGroup,
     PersonAnnotationConverter,
     RemoveAnnotations,
 )
@@ -66,6 +73,173 @@ class TestDeduceMergeAdjacent:
         )
 
 
+class TestDeduceProcessorGroup:
+    @staticmethod
+    def _processors(group):
+        group.add_processor("remove", RemoveAnnotations(tags=["straat"]))
+        group.add_processor("clean", CleanAnnotationTag(tag_map={"huisnr": "locatie"}))
+        group.add_processor(
+            "overlap",
+            DeduceOverlapResolver(
+                sort_by=("length",), sort_by_callbacks=frozendict(length=operator.neg)
+            ),
+        )
+        group.add_processor("merge", DeduceMergeAdjacentAnnotations(slack_regexp=r"\s"))
+
+        return group
+
+    def test_process_stage(self):
+        text = "Hoofdstraat 12 Utrecht"
+        annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(
+                    text="Hoofdstraat", start_char=0, end_char=11, tag="straat"
+                ),
+                dd.Annotation(text="12", start_char=12, end_char=14, tag="huisnr"),
+                dd.Annotation(
+                    text="Utrecht", start_char=15, end_char=22, tag="locatie"
+                ),
+                dd.Annotation(text="Utr", start_char=15, end_char=18, tag="locatie"),
+            ]
+        )
+
+        doc = dd.Document(text)
+        doc.annotations = dd.AnnotationSet(annotations)
+        expected_doc = dd.Document(text)
+        expected_doc.annotations = dd.AnnotationSet(annotations)
+
+        with patch.object(
+            AnnotationListProcessor, "process_annotations"
+        ) as process_annotations:
+            self._processors(DeduceProcessorGroup()).process(doc)
+
+        self._processors(dd.process.DocProcessorGroup()).process(expected_doc)
+
+        assert doc.annotations == expected_doc.annotations
+        assert doc.annotations == dd.AnnotationSet(
+            [
+                dd.Annotation(
+                    text="12 Utrecht", start_char=12, end_char=22, tag="locatie"
+                )
+            ]
+        )
+        process_annotations.assert_not_called()
+
+    def test_process_disabled(self):
+        text = "Hoofdstraat 12"
+        annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(
+                    text="Hoofdstraat", start_char=0, end_char=11, tag="straat"
+                ),
+                dd.Annotation(text="12", start_char=12, end_char=14, tag="huisnr"),
+            ]
+        )
+
+        doc = dd.Document(text)
+        doc.annotations = annotations
+        self._processors(DeduceProcessorGroup()).process(doc, disabled={"remove"})
+
+        assert doc.annotations == dd.AnnotationSet(
+            [
+                dd.Annotation(
+                    text="Hoofdstraat", start_char=0, end_char=11, tag="straat"
+                ),
+                dd.Annotation(text="12", start_char=12, end_char=14, tag="locatie"),
+            ]
+        )
+
+    def test_process_to_list(self):
+        text = "Hoofdstraat 12 Utrecht"
+        annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(
+                    text="Hoofdstraat", start_char=0, end_char=11, tag="straat"
+                ),
+                dd.Annotation(text="12", start_char=12, end_char=14, tag="huisnr"),
+                dd.Annotation(
+                    text="Utrecht", start_char=15, end_char=22, tag="locatie"
+                ),
+            ]
+        )
+
+        group = DeduceProcessorGroup()
+        group.add_processor("post_processing", self._processors(DeduceProcessorGroup()))
+
+        doc = dd.Document(text)
+        doc.annotations = annotations
+        expected_doc = dd.Document(text)
+        expected_doc.annotations = annotations
+        group.process(expected_doc)
+
+        assert group.process_to_list(doc) == list(expected_doc.annotations)
+        assert doc.annotations == annotations
+
+
+class TestDeduceOverlapResolver:
+    def test_no_overlap(self):
+        proc = DeduceOverlapResolver(sort_by=("length",))
+        text = "Jan Jansen"
+        annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(text="Jan", start_char=0, end_char=3, tag="naam"),
+                dd.Annotation(text="Jansen", start_char=4, end_char=10, tag="naam"),
+            ]
+        )
+
+        assert proc.process_annotations(annotations, text) == annotations
+
+    def test_overlap(self):
+        proc = DeduceOverlapResolver(
+            sort_by=("length",), sort_by_callbacks=frozendict(length=operator.neg)
+        )
+        text = "Jan Jansen de Vries"
+        annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(text="Jan Jansen", start_char=0, end_char=10, tag="a"),
+                dd.Annotation(text="Jansen", start_char=4, end_char=10, tag="b"),
+                dd.Annotation(text="n de Vries", start_char=9, end_char=19, tag="c"),
+            ]
+        )
+
+        expected_annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(text="Jan Jansen", start_char=0, end_char=10, tag="a"),
+                dd.Annotation(text=" de Vries", start_char=10, end_char=19, tag="c"),
+            ]
+        )
+
+        assert proc.process_annotations(annotations, text) == expected_annotations
+
+    def test_overlap_gaps(self):
+        proc = DeduceOverlapResolver(sort_by=("length",))
+        text = "abcdefghij"
+        annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(text="c", start_char=2, end_char=3, tag="a"),
+                dd.Annotation(text="fg", start_char=5, end_char=7, tag="a"),
+                dd.Annotation(text="bcdefgh", start_char=1, end_char=8, tag="b"),
+            ]
+        )
+
+        expected_annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(text="c", start_char=2, end_char=3, tag="a"),
+                dd.Annotation(text="fg", start_char=5, end_char=7, tag="a"),
+                dd.Annotation(text="b", start_char=1, end_char=2, tag="b"),
+                dd.Annotation(text="de", start_char=3, end_char=5, tag="b"),
+                dd.Annotation(text="h", start_char=7, end_char=8, tag="b"),
+            ]
+        )
+
+        assert proc.process_annotations(annotations, text) == expected_annotations
+        assert proc.process_annotations(
+            annotations, text
+        ) == dd.process.OverlapResolver(sort_by=("length",)).process_annotations(
+            annotations, text
+        )
+
+
 class TestPersonAnnotationConverter:
     def test_patient_no_overlap(self):
         proc = PersonAnnotationConverter()
@@ -1,4 +1,6 @@
+import gc
 import re
+import weakref
 from unittest.mock import patch
 
 import docdeid as dd
@@ -7,13 +9,20 @@ import pytest
 from deduce.annotator import (
     BsnAnnotator,
     ContextAnnotator,
+    DeduceMultiTokenLookupAnnotator,
+    NestedMatchPruning,
     PatientNameAnnotator,
     PhoneNumberAnnotator,
+    RegexpAnnotator,
     RegexpPseudoAnnotator,
     TokenPatternAnnotator,
+    TokenPatternEngine,
+    _ContextTagIndex,
     _PatternPositionMatcher,
+    _TokenFeatures,
 )
 from deduce.person import Person
+from deduce.prefilter import RegexpPrefilter
 from deduce.tokenizer import DeduceTokenizer
 from tests.helpers import linked_tokens
 
@@ -86,6 +95,54 @@ def token(text: str):
     return dd.Token(text=text, start_char=0, end_char=len(text))
 
 
+class TestTokenFeatures:
+    def test_mask(self):
+        features = _TokenFeatures()
+
+        assert (
+            features.mask("A") == _TokenFeatures.IS_INITIAL | _TokenFeatures.IS_INITIALS
+        )
+        assert features.mask("Ch") == _TokenFeatures.IS_INITIAL
+        assert features.mask("Diederik") == _TokenFeatures.LIKE_NAME
+        assert features.mask("diederik") == 0
+
+    def test_casefold(self):
+        assert _TokenFeatures().casefold("Diederik") == "diederik"
+
+    def test_of(self, pattern_doc):
+        features = _TokenFeatures.of(pattern_doc)
+
+        assert _TokenFeatures.of(pattern_doc) is features
+        assert _TokenFeatures.of(dd.Document(text=pattern_doc.text)) is not features
+
+    def test_steps(self, pattern_doc):
+        features = _TokenFeatures.of(pattern_doc)
+        texts = [token.text for token in pattern_doc.get_tokens()]
+        skip = frozenset({"-", ","})
+
+        assert texts[4:8] == ["Meijer", "-", "Heerma", ","]
+        assert features.steps("right", skip)[4] == 6
+        assert features.steps("right", skip)[6] == 8
+        assert features.steps("left", skip)[8] == 6
+        assert features.steps("left", skip)[0] == -1
+        assert features.steps("right", frozenset())[len(texts) - 1] == -1
+
+    def test_chained_token(self, pattern_doc):
+        features = _TokenFeatures.of(pattern_doc)
+        tokens = pattern_doc.get_tokens()
+
+        assert features.token_index(tokens[4]) == 4
+        assert features.chained_token(tokens[4], "right", frozenset("-")) is tokens[6]
+        assert features.chained_token(tokens[0], "left", frozenset()) is None
+
+    def test_chained_token_without_doc(self, pattern_doc):
+        features = _TokenFeatures()
+        tokens = pattern_doc.get_tokens()
+
+        assert features.token_index(tokens[4]) is None
+        assert features.chained_token(tokens[4], "right", frozenset("-")) is tokens[6]
+
+
 class TestPositionMatcher:
     def test_equal(self):
         assert _PatternPositionMatcher.match({"equal": "test"}, token=token("test"))
@@ -205,6 +262,42 @@ class TestPositionMatcher:
             {"or": [{"equal": "b"}, {"like_name": True}]}, token=token("a"), ds=ds
         )
 
+    def test_compile(self, ds):
+        matcher = _PatternPositionMatcher.compile(
+            {"and": [{"lookup": "first_names"}, {"re_match": "[A-Z]"}]}, ds=ds
+        )
+
+        assert matcher(token("Andries"), _TokenFeatures())
+        assert not matcher(token("andries"), _TokenFeatures())
+        assert not matcher(token("Smit"), _TokenFeatures())
+
+    def test_compile_lookup_with_matching_pipeline(self):
+        ds = dd.ds.DsCollection()
+        ds["whitelist"] = dd.ds.LookupSet(matching_pipeline=[dd.str.LowercaseString()])
+        ds["whitelist"].add_items_from_iterable(["patient"])
+
+        lookup = _PatternPositionMatcher.compile({"lookup": "whitelist"}, ds=ds)
+        neg_lookup = _PatternPositionMatcher.compile({"neg_lookup": "whitelist"}, ds=ds)
+
+        assert lookup(token("Patient"), _TokenFeatures())
+        assert not neg_lookup(token("Patient"), _TokenFeatures())
+        assert not lookup(token("Arts"), _TokenFeatures())
+
+    def test_compile_is_initial_warns_once(self):
+        with pytest.warns(DeprecationWarning) as record:
+            matcher = _PatternPositionMatcher.compile({"is_initial": True})
+
+        assert len(record) == 1
+        assert matcher(token("A"), _TokenFeatures())
+        assert matcher(token("Ch"), _TokenFeatures())
+        assert not matcher(token("Abc"), _TokenFeatures())
+
+    def test_compile_unknown(self):
+        matcher = _PatternPositionMatcher.compile({"unknown": True})
+
+        with pytest.raises(NotImplementedError):
+            matcher(token("A"), _TokenFeatures())
+
 
 class TestTokenPatternAnnotator:
     def test_match_sequence(self, pattern_doc, ds):
@@ -267,6 +360,27 @@ class TestTokenPatternAnnotator:
             is None
         )
 
+    def test_match_sequence_indexed(self, pattern_doc, ds):
+        pattern = [{"lookup": "surnames"}, {"like_name": True}]
+        tpa = TokenPatternAnnotator(pattern=[{}], ds=ds, tag="_")
+        features = _TokenFeatures.of(pattern_doc)
+
+        for direction, start_token in (("right", 4), ("left", 6)):
+            assert tpa._match_compiled_sequence(
+                pattern_doc.text,
+                tpa._compile_pattern(pattern),
+                pattern_doc.get_tokens()[start_token],
+                direction=direction,
+                skip={"-"},
+                features=features,
+            ) == tpa._match_sequence(
+                pattern_doc.text,
+                pattern=pattern,
+                start_token=pattern_doc.get_tokens()[start_token],
+                direction=direction,
+                skip={"-"},
+            )
+
     def test_annotate(self, pattern_doc, ds):
         pattern = [{"lookup": "first_names"}, {"like_name": True}]
 
@@ -276,6 +390,44 @@ class TestTokenPatternAnnotator:
             dd.Annotation(text="Andries Meijer", start_char=12, end_char=26, tag="_")
         ]
 
+    def test_annotate_pattern_engine(self, pattern_doc, ds):
+        engine = TokenPatternEngine()
+
+        first_name = TokenPatternAnnotator(
+            pattern=[{"lookup": "first_names"}, {"like_name": True}],
+            ds=ds,
+            tag="first",
+            pattern_engine=engine,
+        )
+        surname = TokenPatternAnnotator(
+            pattern=[{"lookup": "surnames"}, {"equal": "-"}],
+            ds=ds,
+            tag="sur",
+            pattern_engine=engine,
+        )
+        name = TokenPatternAnnotator(
+            pattern=[{"lookup": "first_names"}],
+            ds=ds,
+            tag="name",
+            pattern_engine=engine,
+        )
+
+        with patch.object(engine, "_sweep", wraps=engine._sweep) as sweep:
+            assert first_name.annotate(pattern_doc) == [
+                dd.Annotation(
+                    text="Andries Meijer", start_char=12, end_char=26, tag="first"
+                )
+            ]
+            assert surname.annotate(pattern_doc) == [
+                dd.Annotation(text="Meijer-", start_char=20, end_char=27, tag="sur")
+            ]
+            assert name.annotate(pattern_doc) == [
+                dd.Annotation(text="Andries", start_char=12, end_char=19, tag="name"),
+                dd.Annotation(text="Andries", start_char=44, end_char=51, tag="name"),
+            ]
+
+        assert sweep.call_count == 1
+
 
 class TestContextAnnotator:
     def test_apply_context_pattern(self, pattern_doc):
@@ -467,6 +619,92 @@ class TestContextAnnotator:
             }
         )
 
+    def test_annotate_visits_matching_tags(self, pattern_doc):
+        pattern = [
+            {
+                "pattern": [{"like_name": True}],
+                "direction": "right",
+                "skip": ["-"],
+                "pre_tag": ["naam", "voornaam"],
+                "tag": "{tag}+naam",
+            }
+        ]
+
+        annotator = ContextAnnotator(pattern=pattern, iterative=True)
+
+        annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(
+                    text="Andries",
+                    start_char=12,
+                    end_char=19,
+                    tag="voornaam",
+                    start_token=pattern_doc.get_tokens()[3],
+                    end_token=pattern_doc.get_tokens()[3],
+                ),
+                dd.Annotation(
+                    text="Andries",
+                    start_char=44,
+                    end_char=51,
+                    tag="locatie",
+                    start_token=pattern_doc.get_tokens()[9],
+                    end_token=pattern_doc.get_tokens()[9],
+                ),
+            ]
+        )
+
+        with patch.object(
+            annotator,
+            "_match_compiled_sequence",
+            wraps=annotator._match_compiled_sequence,
+        ) as match:
+            result = annotator._annotate(pattern_doc.text, annotations)
+
+        assert match.call_count == 3
+        assert {annotation.tag for annotation in result} == {
+            "voornaam+naam+naam",
+            "locatie",
+        }
+
+
+class TestContextTagIndex:
+    def test_candidates(self):
+        index = _ContextTagIndex(
+            [
+                dd.Annotation(text="A", start_char=0, end_char=1, tag="initiaal+naam"),
+                dd.Annotation(text="B", start_char=2, end_char=3, tag="naam"),
+                dd.Annotation(text="C", start_char=4, end_char=5, tag="locatie"),
+            ]
+        )
+
+        assert {a.text for a in index.candidates("right", ["naam"])} == {"A", "B"}
+        assert {a.text for a in index.candidates("left", ["naam"])} == {"B"}
+        assert index.candidates("left", ["persoon"]) == []
+
+    def test_replace(self):
+        annotation = dd.Annotation(text="A", start_char=0, end_char=1, tag="naam")
+        extended = dd.Annotation(text="A B", start_char=0, end_char=3, tag="naam+naam")
+        index = _ContextTagIndex([annotation])
+
+        index.replace(annotation, extended)
+
+        assert index.annotations() == [extended]
+        assert index.annotations(added=True) == [extended]
+        assert index.annotations(added=False) == []
+        assert index.candidates("right", ["naam"]) == [extended]
+
+    def test_replace_with_initial_annotation(self):
+        first = dd.Annotation(text="A", start_char=0, end_char=1, tag="naam")
+        second = dd.Annotation(text="A B", start_char=0, end_char=3, tag="naam")
+        index = _ContextTagIndex([first, second])
+
+        index.replace(
+            second, dd.Annotation(text="A B C", start_char=0, end_char=5, tag="naam")
+        )
+        index.replace(first, second)
+
+        assert index.annotations(added=False) == [second]
+
 
 class TestPatientNameAnnotator:
     def test_match_first_name_multiple(self, tokenizer):
@@ -636,6 +874,38 @@ class TestPatientNameAnnotator:
                 tokens[3],
             )
 
+    def test_person_matcher_reused(self, tokenizer):
+        ann = PatientNameAnnotator(tokenizer=tokenizer, tag="_")
+
+        def doc(surname):
+            patient = Person(first_names=["Jan"], initials="J", surname=surname)
+            return dd.Document(text="_", metadata={"patient": patient})
+
+        with patch.object(tokenizer, "tokenize", wraps=tokenizer.tokenize) as tokenize:
+            matcher = ann._get_person_matcher(doc("Jansen"))
+
+            assert ann._get_person_matcher(doc("Jansen")) is matcher
+            assert ann._get_person_matcher(doc("Janssen")) is not matcher
+            assert tokenize.call_count == 2
+
+    def test_person_matcher_per_annotator(self):
+        tokenizer = DeduceTokenizer()
+        ann = PatientNameAnnotator(tokenizer=tokenizer, tag="_")
+        doc = dd.Document(text="_", metadata={"patient": Person(surname="Jansen")})
+
+        matcher = ann._get_person_matcher(doc)
+
+        assert (
+            PatientNameAnnotator(tokenizer=tokenizer, tag="_")._get_person_matcher(doc)
+            is not matcher
+        )
+
+        tokenizer_ref = weakref.ref(tokenizer)
+        del ann, matcher, tokenizer
+        gc.collect()
+
+        assert tokenizer_ref() is None
+
     def test_annotate_first_name(self, tokenizer):
 
         metadata = {
@@ -748,6 +1018,169 @@ class TestPatientNameAnnotator:
             )
         ]
 
+    def test_annotate_persons(self, tokenizer):
+
+        metadata = {
+            "patient": Person(first_names=["Jan"], surname="Jansen"),
+            "persons": [
+                Person(first_names=["Annemarie"], initials="AJ", surname="de Vries"),
+                Person(surname="Pietersen"),
+            ]
+            + [Person(surname=f"Achternaam{i}") for i in range(100)],
+        }
+        text = "Jan Jansen, Annemarie, AJ, de Vriez en Pieterse."
+
+        ann = PatientNameAnnotator(tokenizer=tokenizer, tag="_")
+        doc = dd.Document(
+            text=text, metadata=metadata, tokenizers={"default": tokenizer}
+        )
+
+        annotations = ann.annotate(doc)
+
+        assert {(a.text, a.tag) for a in annotations} == {
+            ("Jan", "voornaam_patient"),
+            ("Jansen", "achternaam_patient"),
+            ("Annemarie", "voornaam_persoon"),
+            ("AJ", "initiaal_persoon"),
+            ("de Vriez", "achternaam_persoon"),
+            ("Pieterse", "achternaam_persoon"),
+        }
+
+    def test_annotate_persons_without_patient(self, tokenizer):
+
+        metadata = {"persons": [Person(first_names=["Jan"])]}
+        text = "Jan is er, J. niet."
+
+        ann = PatientNameAnnotator(tokenizer=tokenizer, tag="_")
+        doc = dd.Document(
+            text=text, metadata=metadata, tokenizers={"default": tokenizer}
+        )
+
+        assert [(a.text, a.tag) for a in ann.annotate(doc)] == [
+            ("Jan", "voornaam_persoon")
+        ]
+
+    def test_annotate_persons_short_surnames(self, tokenizer):
+
+        metadata = {
+            "persons": [
+                Person(surname=surname)
+                for surname in ["Bos", "Vos", "Kok", "Dam", "Ros"]
+            ]
+            + [Person(surname=f"Achternaam{i}") for i in range(1000)]
+        }
+        text = "Hij kan ook dan nog eens goed zo los op dat bed, met Bos."
+
+        ann = PatientNameAnnotator(tokenizer=tokenizer, tag="_")
+        doc = dd.Document(
+            text=text, metadata=metadata, tokenizers={"default": tokenizer}
+        )
+
+        assert [(a.text, a.tag) for a in ann.annotate(doc)] == [
+            ("Bos", "achternaam_persoon")
+        ]
+
+    def test_persons_matcher_multiple_surnames(self, tokenizer):
+
+        ann = PatientNameAnnotator(tokenizer=tokenizer, tag="_")
+        doc = dd.Document(
+            text="_",
+            metadata={
+                "persons": [Person(surname="Heide"), Person(surname="Heide-Ginkel")]
+            },
+        )
+        tokens = linked_tokens(["Heide", "-", "Ginkle", "is", "de", "naam"])
+
+        assert ann._get_persons_matcher(doc).match_surnames(
+            tokens[0], ann.next_with_skip
+        ) == [(tokens[0], tokens[0]), (tokens[0], tokens[2])]
+
+    def test_persons_matcher_reused(self, tokenizer):
+
+        ann = PatientNameAnnotator(tokenizer=tokenizer, tag="_")
+        persons = [Person(surname="Heide")]
+        doc = dd.Document(text="_", metadata={"persons": persons})
+
+        matcher = ann._get_persons_matcher(doc)
+
+        assert ann._get_persons_matcher(doc) is matcher
+
+        persons.append(Person(surname="Ginkel"))
+
+        assert ann._get_persons_matcher(doc) is not matcher
+
+
+class TestDeduceMultiTokenLookupAnnotator:
+    def test_prune_nested(self, tokenizer):
+        text = "Het Oude Academisch Ziekenhuis Utrecht"
+        doc = dd.Document(text=text, tokenizers={"default": tokenizer})
+        lookup_values = [
+            "Academisch Ziekenhuis",
+            "Academisch Ziekenhuis Utrecht",
+            "Ziekenhuis",
+            "Oude Academisch",
+        ]
+
+        def annotated_texts(prune_nested, nested_match_pruning=None):
+            ann = DeduceMultiTokenLookupAnnotator(
+                lookup_values=lookup_values,
+                tokenizer=tokenizer,
+                overlapping=True,
+                prune_nested=prune_nested,
+                nested_match_pruning=nested_match_pruning,
+                tag="ziekenhuis",
+            )
+
+            return [annotation.text for annotation in ann.annotate(doc)]
+
+        assert annotated_texts(prune_nested=False) == [
+            "Oude Academisch",
+            "Academisch Ziekenhuis Utrecht",
+            "Ziekenhuis",
+        ]
+        assert annotated_texts(prune_nested=True) == [
+            "Oude Academisch",
+            "Academisch Ziekenhuis Utrecht",
+        ]
+
+        nested_match_pruning = NestedMatchPruning()
+
+        assert len(annotated_texts(True, nested_match_pruning)) == 3
+
+        nested_match_pruning.enable(doc)
+
+        assert len(annotated_texts(True, nested_match_pruning)) == 2
+
+
+class TestRegexpAnnotator:
+    def test_annotate(self, regexp_pseudo_doc):
+        annotator = RegexpAnnotator(regexp_pattern=r"\d+ jaar", tag="leeftijd")
+
+        assert annotator.annotate(regexp_pseudo_doc) == [
+            dd.Annotation(text="12 jaar", start_char=17, end_char=24, tag="leeftijd")
+        ]
+
+    def test_annotate_prefiltered(self, regexp_pseudo_doc):
+        annotator = RegexpAnnotator(regexp_pattern=r"[Pp]ostbus \d+", tag="locatie")
+
+        with patch.object(dd.process.RegexpAnnotator, "annotate") as annotate:
+            assert annotator.annotate(regexp_pseudo_doc) == []
+            annotate.assert_not_called()
+
+    def test_shared_prefilter(self, regexp_pseudo_doc):
+        prefilter = RegexpPrefilter()
+        age = RegexpAnnotator(
+            regexp_pattern=r"\d+ jaar", tag="leeftijd", regexp_prefilter=prefilter
+        )
+        email = RegexpAnnotator(
+            regexp_pattern=r"\w+@\w+", tag="email", regexp_prefilter=prefilter
+        )
+
+        with patch.object(prefilter, "_scan", wraps=prefilter._scan) as scan:
+            assert len(age.annotate(regexp_pseudo_doc)) == 1
+            assert len(email.annotate(regexp_pseudo_doc)) == 0
+            scan.assert_called_once()
+
 
 class TestRegexpPseudoAnnotator:
     def test_is_word_char(self):
@@ -768,6 +1201,7 @@ class TestRegexpPseudoAnnotator:
         assert r._get_previous_word(8, "patient 12 jaar") == "patient"
         assert r._get_previous_word(7, "(sinds 12 jaar)") == "sinds"
         assert r._get_previous_word(11, "patient is 12 jaar)") == "is"
+        assert r._get_previous_word(7, "sinds\n\t 12 jaar") == "sinds"
 
     def test_get_next(self):
 
@@ -777,6 +1211,7 @@ class TestRegexpPseudoAnnotator:
         assert r._get_next_word(7, "12 jaar, geleden") == ""
         assert r._get_next_word(7, "12 jaar geleden") == "geleden"
         assert r._get_next_word(7, "12 jaar geleden geopereerd") == "geleden"
+        assert r._get_next_word(7, "12 jaar \n geleden") == "geleden"
 
     def test_validate_match(self, regexp_pseudo_doc):
 
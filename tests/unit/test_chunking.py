@@ -0,0 +1,70 @@
+import docdeid as dd
+import pytest
+
+from deduce.chunking import TextWindow, stitch_annotations, text_windows
+
+
+class TestTextWindows:
+    def test_single_window(self):
+        windows = list(text_windows("korte tekst", window_size=100, margin=10))
+
+        assert windows == [
+            TextWindow(text="korte tekst", context_start=0, start=0, end=11)
+        ]
+
+    def test_split_at_blank_line(self):
+        text = "regel 1\n\nregel 2\n\nregel 3"
+        windows = list(text_windows(text, window_size=12, margin=2))
+
+        assert [(window.start, window.end) for window in windows] == [
+            (0, 9),
+            (9, 18),
+            (18, 25),
+        ]
+        assert windows[1].text == "\n\nregel 2\n\nre"
+        assert windows[1].context_start == 7
+
+    def test_chunks(self):
+        text = "regel 1\nregel 2\nregel 3\nregel 4"
+        chunks = (text[i : i + 3] for i in range(0, len(text), 3))
+
+        assert list(text_windows(chunks, window_size=10, margin=3)) == list(
+            text_windows(text, window_size=10, margin=3)
+        )
+
+    @pytest.mark.parametrize("window_size, margin", [(0, 0), (-1, 3), (10, -1)])
+    def test_invalid_args(self, window_size, margin):
+        with pytest.raises(ValueError):
+            next(text_windows("abc def", window_size=window_size, margin=margin))
+
+    def test_empty(self):
+        assert list(text_windows("", window_size=10, margin=3)) == [
+            TextWindow(text="", context_start=0, start=0, end=0)
+        ]
+
+
+class TestStitchAnnotations:
+    def test_stitch(self):
+        windows = [
+            (
+                TextWindow(text="Jan Jansen en", context_start=0, start=0, end=11),
+                [
+                    dd.Annotation(text="Jan", start_char=0, end_char=3, tag="naam"),
+                    dd.Annotation(text="Jansen en", start_char=4, end_char=13, tag="x"),
+                ],
+            ),
+            (
+                TextWindow(text="Jansen en Piet", context_start=4, start=11, end=18),
+                [
+                    dd.Annotation(text="Jansen", start_char=0, end_char=6, tag="naam"),
+                    dd.Annotation(text="en", start_char=7, end_char=9, tag="x"),
+                    dd.Annotation(text="Piet", start_char=10, end_char=14, tag="naam"),
+                ],
+            ),
+        ]
+
+        assert list(stitch_annotations(windows)) == [
+            dd.Annotation(text="Jan", start_char=0, end_char=3, tag="naam"),
+            dd.Annotation(text="Jansen en", start_char=4, end_char=13, tag="x"),
+            dd.Annotation(text="Piet", start_char=14, end_char=18, tag="naam"),
+        ]
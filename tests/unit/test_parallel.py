@@ -0,0 +1,108 @@
+import docdeid as dd
+import pytest
+
+from deduce import parallel
+from deduce.parallel import SharedArena, deidentify_shared_in_worker
+from deduce.serialization import decode
+
+
+class _Model:
+    def deidentify(self, text, enabled=None, disabled=None, metadata=None):
+        if not isinstance(text, str):
+            raise TypeError("Text should be a string.")
+
+        doc = dd.Document(text)
+        doc.annotations = dd.AnnotationSet(
+            [dd.Annotation(text=text[:3], start_char=0, end_char=3, tag="naam")]
+        )
+        doc.set_deidentified_text("[NAAM]" + text[3:])
+
+        return doc
+
+
+@pytest.fixture
+def worker_model():
+    parallel._WORKER_STATE["model"] = _Model()
+    yield
+
+    for arena in parallel._WORKER_STATE.get("arenas", {}).values():
+        arena.close()
+
+    parallel._WORKER_STATE.clear()
+
+
+class TestSharedArena:
+    def test_load_read(self):
+        texts = ["Jan woont hier", "Zoë", None]
+
+        with SharedArena() as arena:
+            arena.load(texts, [[0, 2], [1]])
+
+            assert arena.read(arena.texts[0]) == "Jan woont hier".encode("utf-8")
+            assert arena.read(arena.texts[1]) == "Zoë".encode("utf-8")
+            assert arena.texts[2] is None
+            assert len(arena.result_slots) == 2
+            assert arena.result_slots[0].start == arena.texts[1].stop
+
+    def test_reuse(self):
+        with SharedArena() as arena:
+            arena.load(["a" * 100], [[0]])
+            name = arena.name
+
+            arena.load(["b" * 10], [[0]])
+            assert arena.name == name
+
+            arena.load(["c" * 10_000], [[0]])
+            assert arena.name != name
+            assert arena.read(arena.texts[0]) == b"c" * 10_000
+
+    def test_closed(self):
+        arena = SharedArena()
+        arena.load(["tekst"], [[0]])
+        arena.close()
+        arena.close()
+
+        with pytest.raises(RuntimeError):
+            arena.read(slice(0, 1))
+
+        with pytest.raises(RuntimeError):
+            _ = arena.name
+
+
+class TestDeidentifySharedInWorker:
+    def test_results_in_arena(self, worker_model):
+        texts = ["Jan woont hier", "Piet", 5]
+
+        with SharedArena() as arena:
+            arena.load(texts, [[0, 1, 2]])
+
+            results, _ = deidentify_shared_in_worker(
+                arena.name,
+                [(text, None) for text in arena.texts],
+                arena.result_slots[0],
+                None,
+                None,
+            )
+
+            assert isinstance(results[0], slice)
+            assert isinstance(results[2], TypeError)
+
+            annotations, deidentified_text = decode(arena.read(results[1]), "Piet")
+
+            assert annotations[0].text == "Pie"
+            assert deidentified_text == "[NAAM]t"
+
+    def test_result_overflow(self, worker_model):
+        with SharedArena() as arena:
+            arena.load(["Jan"], [[0]])
+
+            results, _ = deidentify_shared_in_worker(
+                arena.name,
+                [(arena.texts[0], None)],
+                slice(arena.result_slots[0].start, arena.result_slots[0].start + 4),
+                None,
+                None,
+            )
+
+            assert isinstance(results[0], bytes)
+            assert decode(results[0], "Jan")[1] == "[NAAM]"
@@ -0,0 +1,139 @@
+import random
+import re
+import sys
+
+import docdeid as dd
+
+from deduce.prefilter import (
+    _CASE_FOLDS,
+    RegexpPrefilter,
+    _Atom,
+    _AtomScanner,
+    required_clauses,
+)
+
+
+def clause_texts(pattern):
+    return [{atom.text for atom in clause} for clause in required_clauses(pattern)]
+
+
+class TestRequiredClauses:
+    def test_literal(self):
+        assert clause_texts("@") == [{"@"}]
+
+    def test_case_pair(self):
+        clauses = required_clauses("[Pp]ostbus")
+
+        assert [{atom.text for atom in clause} for clause in clauses] == [{"postbus"}]
+        assert all(atom.ignorecase for clause in clauses for atom in clause)
+
+    def test_ignorecase(self):
+        clauses = required_clauses("(?i)postbus")
+
+        assert all(atom.ignorecase for clause in clauses for atom in clause)
+
+    def test_branch_simplified(self):
+        assert clause_texts("(januari|jan|feb)") == [{"jan", "feb"}]
+
+    def test_digits(self):
+        assert clause_texts(r"\d{7,}") == [{r"\d"}]
+        assert clause_texts("[0-9]+") == [{r"\d"}]
+
+    def test_multiple_clauses(self):
+        assert clause_texts(r"[Pp]ostbus\s\d{1,5}") == [{"postbus"}, {r"\d"}]
+
+    def test_optional(self):
+        assert clause_texts("(ab)?") == []
+        assert clause_texts("(ab)?cd") == [{"cd"}]
+
+    def test_branch_without_requirement(self):
+        assert clause_texts(r"abc|\w+") == []
+
+    def test_lookaround_ignored(self):
+        assert clause_texts(r"(?<!\d)ab(?!c)") == [{"ab"}]
+
+    def test_compiled(self):
+        assert clause_texts(re.compile("abc", flags=re.I)) == [{"abc"}]
+
+
+class TestRegexpPrefilter:
+    def test_may_match(self):
+        prefilter = RegexpPrefilter()
+        email = prefilter.add_regexp(r"\w+@\w+\.(com|nl)")
+        postbus = prefilter.add_regexp(r"[Pp]ostbus\s\d+")
+
+        doc = dd.Document(text="Mail naar jan@example.nl")
+
+        assert prefilter.may_match(email, doc)
+        assert not prefilter.may_match(postbus, doc)
+
+    def test_may_match_overlapping_literals(self):
+        prefilter = RegexpPrefilter()
+        month = prefilter.add_regexp("januari")
+        short_month = prefilter.add_regexp("jan")
+        doc = dd.Document(text="1 januari")
+
+        assert prefilter.may_match(month, doc)
+        assert prefilter.may_match(short_month, doc)
+
+    def test_may_match_no_requirement(self):
+        prefilter = RegexpPrefilter()
+        requirement = prefilter.add_regexp(r"\w+")
+
+        assert requirement == ()
+        assert prefilter.may_match(requirement, dd.Document(text=""))
+
+    def test_may_match_new_doc(self):
+        prefilter = RegexpPrefilter()
+        requirement = prefilter.add_regexp(r"\d+")
+
+        assert not prefilter.may_match(requirement, dd.Document(text="geen getallen"))
+        assert prefilter.may_match(requirement, dd.Document(text="wel 1 getal"))
+
+    def test_may_match_case(self):
+        prefilter = RegexpPrefilter()
+        ignorecase = prefilter.add_regexp(r"(?i)postbus\s\d+")
+        exact = prefilter.add_regexp(r"Postbus\s\d+")
+        non_ascii = prefilter.add_regexp(r"(?i)één")
+
+        for text in ("POSTBUS 12", "poſtbus 12"):
+            doc = dd.Document(text=text)
+
+            assert prefilter.may_match(ignorecase, doc)
+            assert not prefilter.may_match(exact, doc)
+
+        assert prefilter.may_match(exact, dd.Document(text="Postbus 12"))
+        assert prefilter.may_match(non_ascii, dd.Document(text="ÉÉN"))
+        assert not prefilter.may_match(non_ascii, dd.Document(text="een"))
+
+
+class TestAtomScanner:
+    def test_case_folds(self):
+        chars = "".join(
+            map(chr, [*range(0x80, 0xD800), *range(0xE000, sys.maxunicode + 1)])
+        )
+
+        for char in re.findall("(?i)[a-z]", chars):
+            assert re.fullmatch(f"(?i){char.translate(_CASE_FOLDS)}", char)
+
+    def test_scan(self):
+        atoms = [
+            _Atom(text="jan", ignorecase=True),
+            _Atom(text="januari"),
+            _Atom(text="an"),
+            _Atom(text="@"),
+            _Atom(text="Ki", ignorecase=True),
+            _Atom(text="één", ignorecase=True),
+            _Atom(text="\\d", is_digit=True),
+        ]
+        scanner = _AtomScanner(atoms)
+        regexps = [re.compile(atom.to_regexp()) for atom in atoms]
+        chars = "jJaAnNuUrRiIkK@1 éÉıİſK"
+        rng = random.Random(0)
+
+        for _ in range(1_000):
+            text = "".join(rng.choices(chars, k=rng.randint(0, 12)))
+
+            assert scanner.scan(text) == {
+                atom_id for atom_id, regexp in enumerate(regexps) if regexp.search(text)
+            }
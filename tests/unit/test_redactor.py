@@ -1,3 +1,5 @@
+import io
+
 import docdeid as dd
 
 from deduce.redactor import DeduceRedactor
@@ -79,3 +81,71 @@ class TestDeduceRedactor:
         )
 
         assert proc.redact(text, annotations) == expected_text
+
+    def test_redact_count_multiple_fuzzy_chained(self):
+        proc = DeduceRedactor()
+        text = "Ommen, Emmen, Emmer, Ommer"
+
+        annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(text="Ommen", start_char=0, end_char=5, tag="locatie"),
+                dd.Annotation(text="Emmen", start_char=7, end_char=12, tag="locatie"),
+                dd.Annotation(text="Emmer", start_char=14, end_char=19, tag="locatie"),
+                dd.Annotation(text="Ommer", start_char=21, end_char=26, tag="locatie"),
+            ]
+        )
+
+        expected_text = "[LOCATIE-1], [LOCATIE-1], [LOCATIE-1], [LOCATIE-1]"
+
+        assert proc.redact(text, annotations) == expected_text
+
+    def test_redact_to(self):
+        proc = DeduceRedactor()
+        text = "Jan Jansen, wonende in Rotterdam."
+
+        annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(
+                    text="Jan Jansen", start_char=0, end_char=10, tag="patient"
+                ),
+                dd.Annotation(
+                    text="Rotterdam", start_char=23, end_char=32, tag="woonplaats"
+                ),
+            ]
+        )
+
+        segments = []
+        proc.redact_to(text, annotations, segments.append)
+
+        assert segments == ["[PATIENT]", ", wonende in ", "[WOONPLAATS-1]", "."]
+
+    def test_redact_to_file(self):
+        proc = DeduceRedactor()
+        text = "Jan Jansen, wonende in Rotterdam."
+
+        annotations = dd.AnnotationSet(
+            [
+                dd.Annotation(
+                    text="Rotterdam", start_char=23, end_char=32, tag="woonplaats"
+                ),
+            ]
+        )
+
+        output = io.StringIO()
+        proc.redact_to(text, annotations, output)
+
+        assert output.getvalue() == "Jan Jansen, wonende in [WOONPLAATS-1]."
+
+    def test_redact_to_list_overlapping(self):
+        proc = DeduceRedactor()
+        text = "Jan Jansen, wonende in Rotterdam."
+
+        annotations = [
+            dd.Annotation(text="Jan Jansen", start_char=0, end_char=10, tag="patient"),
+            dd.Annotation(text="Jansen", start_char=4, end_char=10, tag="achternaam"),
+        ]
+
+        segments = []
+        proc.redact_to(text, annotations, segments.append)
+
+        assert "".join(segments) == proc.redact(text, dd.AnnotationSet(annotations))
@@ -0,0 +1,51 @@
+import pytest
+
+from deduce.scheduling import TEXT_OVERHEAD, UnitSizer, estimate_cost, pack_units
+
+
+class TestEstimateCost:
+    def test_estimate_cost(self):
+        assert estimate_cost("tekst") == 5 + TEXT_OVERHEAD
+
+
+class TestUnitSizer:
+    def test_target_cost(self):
+        sizer = UnitSizer(unit_seconds=0.5, seconds_per_cost=1e-4)
+
+        assert sizer.target_cost() == pytest.approx(5_000)
+
+    def test_record(self):
+        sizer = UnitSizer(unit_seconds=0.5, seconds_per_cost=1e-4, smoothing=0.5)
+        sizer.record(cost=1_000, seconds=0.3)
+
+        assert sizer.seconds_per_cost == pytest.approx(2e-4)
+        assert sizer.target_cost() == pytest.approx(2_500)
+
+    def test_record_zero_cost(self):
+        sizer = UnitSizer(seconds_per_cost=1e-4)
+        sizer.record(cost=0, seconds=0.3)
+
+        assert sizer.seconds_per_cost == 1e-4
+
+
+class TestPackUnits:
+    def test_large_first(self):
+        units = pack_units([10, 500, 20, 300], target_cost=100, max_items=10)
+
+        assert units == [[1], [3], [0, 2]]
+
+    def test_balanced(self):
+        costs = [40, 30, 30, 20, 10, 10, 10, 10]
+        units = pack_units(costs, target_cost=60, max_items=10)
+
+        assert sorted(i for unit in units for i in unit) == list(range(len(costs)))
+        assert [sum(costs[i] for i in unit) for unit in units] == [60, 50, 50]
+
+    def test_max_items(self):
+        units = pack_units([1] * 10, target_cost=100, max_items=3)
+
+        assert len(units) == 4
+        assert all(len(unit) <= 3 for unit in units)
+
+    def test_empty(self):
+        assert pack_units([], target_cost=100, max_items=3) == []
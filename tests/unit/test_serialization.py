@@ -0,0 +1,84 @@
+import io
+
+import docdeid as dd
+import pytest
+
+from deduce.serialization import (
+    FORMAT_VERSION,
+    decode,
+    encode,
+    read_results,
+    write_results,
+)
+
+text = "Patiënt Jan Jansen woont in Zürich."
+
+
+@pytest.fixture
+def annotations():
+    return [
+        dd.Annotation(text="Jan Jansen", start_char=8, end_char=18, tag="patient"),
+        dd.Annotation(text="Jansen", start_char=12, end_char=18, tag="achternaam"),
+        dd.Annotation(
+            text="Zürich", start_char=28, end_char=34, tag="locatie", priority=-1
+        ),
+    ]
+
+
+class TestEncodeDecode:
+    def test_with_text(self, annotations):
+        decoded, deidentified_text = decode(encode(annotations), text)
+
+        assert decoded == annotations
+        assert deidentified_text is None
+
+    def test_include_texts(self, annotations):
+        decoded, _ = decode(encode(annotations, include_texts=True))
+
+        assert decoded == annotations
+
+    def test_deidentified_text(self, annotations):
+        data = encode(annotations, deidentified_text="Patiënt [PATIENT] woont in ...")
+
+        assert decode(data, text)[1] == "Patiënt [PATIENT] woont in ..."
+
+    def test_empty(self):
+        assert decode(encode([], deidentified_text=""), "") == ([], "")
+
+    def test_compact(self, annotations):
+        assert len(encode(annotations)) < 100
+
+    def test_no_text(self, annotations):
+        with pytest.raises(ValueError):
+            decode(encode(annotations))
+
+    def test_invalid(self, annotations):
+        data = encode(annotations)
+
+        with pytest.raises(ValueError):
+            decode(b"DD", text)
+
+        with pytest.raises(ValueError):
+            decode(b"XXX" + data[3:], text)
+
+        with pytest.raises(ValueError):
+            decode(data[:3] + bytes([FORMAT_VERSION + 1]) + data[4:], text)
+
+
+class TestResultsFile:
+    def test_write_read(self, annotations):
+        results = [encode(annotations), encode([]), encode(annotations[:1])]
+        file = io.BytesIO()
+
+        write_results(results, file)
+        file.seek(0)
+
+        assert list(read_results(file)) == results
+
+    def test_read_truncated(self, annotations):
+        file = io.BytesIO()
+        write_results([encode(annotations)], file)
+
+        for data in (file.getvalue()[:-1], file.getvalue()[:2]):
+            with pytest.raises(ValueError):
+                list(read_results(io.BytesIO(data)))
@@ -1,7 +1,11 @@
+import glob
+import json
+import random
+
 import docdeid as dd
 import pytest
 
-from deduce.tokenizer import DeduceTokenizer
+from deduce.tokenizer import DeduceTokenizer, PretokenizedTokenizer, TokenTable
 
 
 @pytest.fixture
@@ -80,11 +84,12 @@ class TestTokenizer:
         assert tokenizer._split_text(text=text) == expected_tokens
 
     def test_join_tokens(self, tokens):
-        text = "Patient was eerder opgenomen"
-        joined_token = DeduceTokenizer()._join_tokens(text, tokens[0:4])
-        expected_token = dd.Token(text=text, start_char=0, end_char=28)
+        text = "Patient was eerder opgenomen (vorig jaar) alhier."
+        tokenizer = DeduceTokenizer(merge_terms=["Patient was eerder opgenomen"])
+        joined_tokens = tokenizer.split_table(text).tokens()
+        expected_token = dd.Token(text=text[0:28], start_char=0, end_char=28)
 
-        assert joined_token == expected_token
+        assert joined_tokens == [expected_token] + tokens[4:]
 
     def test_split_with_merge(self):
         tokenizer = DeduceTokenizer(merge_terms=["van der"])
@@ -96,3 +101,144 @@ class TestTokenizer:
         ]
 
         assert tokenizer._split_text(text=text) == expected_tokens
+
+    def test_split_table(self):
+        tokenizer = DeduceTokenizer(merge_terms=["van der"])
+        text = "Pieter van der Zee"
+        table = tokenizer.split_table(text)
+
+        assert len(table) == 3
+        assert list(table.starts) == [0, 7, 15]
+        assert list(table.ends) == [6, 14, 18]
+        assert table.texts == ["Pieter", "van der", "Zee"]
+        assert table.tokens() == tokenizer._split_text(text)
+
+    def test_split_table_interned(self):
+        table = DeduceTokenizer().split_table("patient en patient")
+
+        assert table.texts[0] is table.texts[2]
+
+    def test_table_from_spans(self):
+        tokenizer = DeduceTokenizer(merge_terms=["van der"])
+        text = "Pieter van der Zee"
+        spans = [(0, 6), (7, 10), (11, 14), (15, 18)]
+
+        assert tokenizer.table_from_spans(text, spans).texts == [
+            "Pieter",
+            "van der",
+            "Zee",
+        ]
+        assert tokenizer.table_from_spans(text, spans, merge=False).texts == [
+            "Pieter",
+            "van",
+            "der",
+            "Zee",
+        ]
+
+
+class TestTokenTable:
+    def test_append(self):
+        table = TokenTable()
+        table.append(0, 7, "Patient")
+        table.append(8, 11, "was")
+
+        assert len(table) == 2
+        assert table.token(1) == dd.Token(text="was", start_char=8, end_char=11)
+        assert table.tokens() == [
+            dd.Token(text="Patient", start_char=0, end_char=7),
+            dd.Token(text="was", start_char=8, end_char=11),
+        ]
+
+    def test_from_spans(self):
+        table = TokenTable.from_spans("Patient was", [(0, 7), (8, 11)])
+
+        assert table.texts == ["Patient", "was"]
+        assert list(table.starts) == [0, 8]
+        assert list(table.ends) == [7, 11]
+
+    @pytest.mark.parametrize(
+        "spans", [[(0, 0)], [(0, 7), (6, 11)], [(8, 11), (0, 7)], [(8, 12)]]
+    )
+    def test_from_spans_invalid(self, spans):
+        with pytest.raises(ValueError):
+            TokenTable.from_spans("Patient was", spans)
+
+
+class TestPretokenizedTokenizer:
+    def test_tokenize(self):
+        text = "Patient was"
+        table = TokenTable.from_spans(text, [(0, 7), (8, 11)])
+        tokens = PretokenizedTokenizer(text, table).tokenize(text)
+
+        assert list(tokens) == table.tokens()
+        assert tokens[0].next() == tokens[1]
+
+    def test_tokenize_other_text(self):
+        table = TokenTable.from_spans("Patient was", [(0, 7), (8, 11)])
+
+        with pytest.raises(ValueError):
+            PretokenizedTokenizer("Patient was", table).tokenize("Patient is")
+
+
+class TestTableEngine:
+    """Conformance of the table engine with the (default) regexp engine."""
+
+    @staticmethod
+    def assert_conforms(text, merge_terms=None):
+        regexp_tokenizer = DeduceTokenizer(merge_terms=merge_terms)
+        table_tokenizer = DeduceTokenizer(merge_terms=merge_terms, engine="table")
+
+        expected = regexp_tokenizer.split_table(text)
+        table = table_tokenizer.split_table(text)
+
+        assert list(table.starts) == list(expected.starts)
+        assert list(table.ends) == list(expected.ends)
+        assert table.texts == expected.texts
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "",
+            " ",
+            "   ",
+            "    ",
+            "Pieter van der Zee",
+            "  voorloop en naloop  ",
+            "a b  c   d    e     f",
+            "regel 1\r\nregel 2\tkolom\n\n",
+            "prematuur (<p3), 12.5 mg/kg!",
+            "snake_case en x_1",
+            "Café Müller, Ærø, Łódź en Ĳsselmeer",
+            "e\u0301en combining accent",
+            "non\xa0breaking\u2009space\u3000wide",
+            "Ω, ß, 中文 en ١٢٣",
+            "emoji 😀 en \U0001f1f3\U0001f1f1",
+            "\x0c\x0b\x00 control chars",
+        ],
+    )
+    def test_texts(self, text):
+        self.assert_conforms(text)
+
+    def test_merge_terms(self):
+        merge_terms = ["van der", "van  den", "v.d.", "'t"]
+
+        self.assert_conforms("Pieter van der Zee en Jan v.d. Berg", merge_terms)
+        self.assert_conforms("Jan van  den Berg, 't Hoen, van der", merge_terms)
+
+    def test_random_texts(self):
+        rng = random.Random(0)
+        chars = "aZ9_é   \n\r\t.,-'()\xa0\u0301中😀"
+
+        for _ in range(200):
+            text = "".join(rng.choice(chars) for _ in range(rng.randint(0, 60)))
+            self.assert_conforms(text, merge_terms=["a a", "Z -"])
+
+    def test_regression_cases(self):
+        for examples_file in glob.glob("tests/data/regression_cases/*.json"):
+            with open(examples_file, "rb") as file:
+                for example in json.load(file)["examples"]:
+                    self.assert_conforms(example["text"], merge_terms=["van der"])
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError):
+            DeduceTokenizer(engine="unknown")
@@ -27,6 +27,63 @@ class TestStrMatch:
         assert not utils.str_match("willem", "klaas", max_edit_distance=1)
 
 
+class TestFuzzyStringIndex:
+    def test_match(self):
+        index = utils.FuzzyStringIndex(["willem", "jan"])
+
+        assert index.match("willem")
+        assert index.match("jan")
+        assert not index.match("willme")
+
+    def test_match_fuzzy(self):
+        index = utils.FuzzyStringIndex(["willem", "jan"])
+
+        assert index.match("willem", max_edit_distance=1)
+        assert index.match("illem", max_edit_distance=1)
+        assert index.match("qwillem", max_edit_distance=1)
+        assert index.match("willme", max_edit_distance=1)
+        assert index.match("Willem", max_edit_distance=1)
+        assert index.match("jn", max_edit_distance=1)
+
+        assert not index.match("wilhelm", max_edit_distance=1)
+        assert not index.match("klaas", max_edit_distance=1)
+        assert not index.match("", max_edit_distance=1)
+
+    def test_match_same_as_str_match(self):
+        strings = ["ab", "abc", "bca", "cab", "a"]
+        index = utils.FuzzyStringIndex(strings, max_edit_distance=2)
+
+        for text in ["", "a", "b", "ba", "acb", "abcd", "cba", "bbbb"]:
+            for max_edit_distance in [None, 0, 1, 2]:
+                assert index.match(text, max_edit_distance) == any(
+                    utils.str_match(text, string, max_edit_distance)
+                    for string in strings
+                )
+
+    def test_find(self):
+        index = utils.FuzzyStringIndex(["willem", "willen", "jan"])
+
+        assert index.find("willem") == {"willem"}
+        assert index.find("willem", max_edit_distance=1) == {"willem", "willen"}
+        assert index.find("klaas", max_edit_distance=1) == frozenset()
+
+    def test_add(self):
+        index = utils.FuzzyStringIndex([])
+
+        assert not index.match("willem", max_edit_distance=1)
+
+        index.add("willem")
+
+        assert index.match("willem")
+        assert index.find("willme", max_edit_distance=1) == {"willem"}
+
+    def test_match_max_edit_distance_too_large(self):
+        index = utils.FuzzyStringIndex(["willem"], max_edit_distance=1)
+
+        with pytest.raises(ValueError):
+            index.match("willem", max_edit_distance=2)
+
+
 class TestClassForName:
     def test_class_for_name(self):
         assert (
@@ -103,6 +160,26 @@ class TestHasOverlap:
         assert not utils.has_overlap([(15, 25), (0, 10)])
 
 
+class TestFindSplit:
+    def test_blank_line(self):
+        text = "regel 1\nregel 2\n\nregel 3. regel 4\nregel 5"
+
+        assert utils.find_split(text, 0, len(text)) == text.index("regel 3")
+
+    def test_line_end(self):
+        text = "zin 1. zin 2\nzin 3. zin 4"
+
+        assert utils.find_split(text, 0, len(text)) == text.index("zin 3")
+
+    def test_sentence_end(self):
+        text = "zin 1. zin 2. zin 3"
+
+        assert utils.find_split(text, 0, 10) == text.index("zin 2")
+
+    def test_no_boundary(self):
+        assert utils.find_split("abcdef", 1, 4) == 4
+
+
 class TestStrVariations:
     def test_has_overlap(self):
 